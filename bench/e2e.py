@@ -0,0 +1,110 @@
+"""
+End-to-end benchmark, fully offline: stubs + the Django app + the load scenarios.
+
+    python bench/e2e.py --latency sf=80,llm=1200,smtp=20 --errors sf=0.01 -c 8 -n 300
+    python bench/e2e.py ... --save bench/baseline.json
+    python bench/e2e.py ... --baseline bench/baseline.json   # exit 1 on regression
+
+Starts bench/stubs.py in-process, runs ``manage.py runserver --noreload`` (or
+any command given with ``--server``, e.g. a gunicorn / uvicorn line using
+``{port}``) with the environment pointing Service Fusion, the OAuth endpoint,
+the LLM and SMTP at the stubs and a throw-away FUSION_RUNTIME_DIR, then drives
+the scenarios of bench/load.py. The outbound rate limit is off by default so
+the numbers show the app, not the bucket (``--rate-limit`` to keep it).
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import load  # noqa: E402
+from stubs import Stubs, parse_faults  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url: str, proc: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"Server exited with {proc.returncode}")
+        try:
+            requests.get(url, timeout=2)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise SystemExit(f"Server not ready after {timeout:.0f}s")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark.")
+    parser.add_argument("--latency", default="sf=80,llm=1200,smtp=20", help="ms per service (oauth, sf, llm, smtp).")
+    parser.add_argument("--errors", default="", help="Error fraction per service, e.g. sf=0.01.")
+    parser.add_argument("--customers", type=int, default=500, help="Customers seeded in the Service Fusion stub.")
+    parser.add_argument("--server", default="", help="Server command ({port} is substituted); default runserver.")
+    parser.add_argument("--rate-limit", default="0", help="FUSION_RATE_LIMIT for the app (default 0 = off).")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="Extra app setting; repeatable.")
+    parser.add_argument("--log", help="Write the server output here (default: discarded).")
+    load.add_arguments(parser)
+    args = parser.parse_args()
+
+    stubs = Stubs(customers=args.customers)
+    stubs.configure(parse_faults(args.latency), parse_faults(args.errors))
+    stubs.start()
+
+    port = free_port()
+    runtime = tempfile.mkdtemp(prefix="fusion-bench-")
+    env = dict(os.environ, **stubs.env())
+    env.update({
+        "DEBUG": "False",
+        "ALLOWED_HOSTS": "127.0.0.1,localhost",
+        "FUSION_RUNTIME_DIR": runtime,
+        "FUSION_RATE_LIMIT": args.rate_limit,
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+        "PYTHONUNBUFFERED": "1",
+    })
+    for item in args.env:
+        name, _, value = item.partition("=")
+        env[name] = value
+    if args.server:
+        cmd = shlex.split(args.server.format(port=port))
+    else:
+        cmd = [sys.executable, "manage.py", "runserver", "--noreload", f"127.0.0.1:{port}"]
+    out = open(args.log, "w") if args.log else subprocess.DEVNULL
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=out, stderr=subprocess.STDOUT)
+    target = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(f"{target}/", proc)
+        print(f"App on {target} ({' '.join(cmd[:3])}...), stubs on {stubs.base_url}, runtime {runtime}")
+        results = [load.run(target, s, args.concurrency, args.requests, args.duration)
+                   for s in args.scenario or sorted(load.SCENARIOS)]
+        print(f"Stub calls: {requests.get(f'{stubs.base_url}/_stats', timeout=5).json()}")
+        return load.finish(results, args.save, args.baseline, args.tolerance)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        stubs.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
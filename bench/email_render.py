@@ -0,0 +1,85 @@
+"""
+Micro-benchmark: notification email rendering.
+
+    python bench/email_render.py [-n 2000]
+
+Compares ``render_to_string("send_mail.html")`` with fusion/email_render.py
+(compiled once, CSS inlined), one by one and in batch / digest form. The
+baseline is timed twice: with the project's loaders (cached only when DEBUG is
+off) and with plain, uncached loaders (lookup + parse on every call, as with
+DEBUG on).
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.template import Context, Engine  # noqa: E402
+from django.template.loader import render_to_string  # noqa: E402
+
+from fusion.email_render import EmailRenderer  # noqa: E402
+
+
+def contexts(n: int):
+    for i in range(n):
+        if i % 2:
+            yield {
+                "type": "job_created", "brand": {"name": "BlueCollar AI"},
+                "job": {"id": 1000 + i, "number": f"J-{i}", "status": "Unscheduled", "priority": "High",
+                        "category": "Refrigeration", "description": "Walk-in cooler not cooling " * 3},
+                "customer": {"name": f"Customer {i}"},
+                "location": {"name": "Main", "address": f"{i} Market St"},
+                "links": {"docx": f"https://example.com/{i}.docx"},
+            }
+        else:
+            yield {
+                "type": "customer_created", "brand": {"name": "BlueCollar AI"},
+                "customer": {"id": i, "name": f"Customer {i}",
+                             "contact": {"name": "Jane Doe", "email": "jane@example.com", "phone": "555-0100"}},
+                "location": {"name": "Primary", "address": f"{i} Main St", "city": "Austin", "state": "TX", "zip": "73301"},
+                "links": {},
+            }
+
+
+def timed(label: str, n: int, fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    dt = time.perf_counter() - t0
+    print(f"{label:<28} {dt * 1000:9.1f} ms   {dt / n * 1e6:8.1f} µs/email")
+    return dt
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=2000)
+    n = parser.parse_args().n
+    ctxs = list(contexts(n))
+    renderer = EmailRenderer()
+
+    t0 = time.perf_counter()
+    renderer.compiled()
+    print(f"{'build (once per process)':<28} {(time.perf_counter() - t0) * 1000:9.1f} ms")
+    base = timed("render_to_string", n, lambda: [render_to_string("send_mail.html", c) for c in ctxs])
+    uncached = Engine(dirs=[str(d) for d in settings.TEMPLATES[0]["DIRS"]], loaders=[
+        "django.template.loaders.filesystem.Loader", "django.template.loaders.app_directories.Loader",
+    ])
+    slow = timed("uncached loader", n, lambda: [uncached.get_template("send_mail.html").render(Context(c)) for c in ctxs])
+    one = timed("EmailRenderer.render", n, lambda: [renderer.render(c) for c in ctxs])
+    batch = timed("EmailRenderer.render_batch", n, lambda: renderer.render_batch(ctxs))
+    timed("EmailRenderer.render_digest", n, lambda: renderer.render_digest(ctxs))
+    print(f"speed-up: render x{base / one:.1f} (x{slow / one:.1f} vs uncached), render_batch x{base / batch:.1f}")
+
+
+if __name__ == "__main__":
+    main()
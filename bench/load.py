@@ -0,0 +1,180 @@
+"""
+Load scenarios against a running server (see bench/e2e.py for the all-local setup).
+
+    python bench/load.py --target http://127.0.0.1:8000 --scenario search -c 16 -n 2000
+    python bench/load.py ... --save base.json           # keep a baseline
+    python bench/load.py ... --baseline base.json       # exit 1 on regression
+
+Reports p50 / p95 / p99 / max latency (ms), throughput and errors (status >= 500
+or transport error) per scenario.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+SEARCH_TERMS = ["acme", "garcia", "north", "blue diner", "golden", "metro ca", "harbor", "summit", "pioneer", "cedar"]
+
+
+def _search(session: requests.Session, target: str) -> requests.Response:
+    return session.get(f"{target}/sf/customers/search", params={"q": random.choice(SEARCH_TERMS)}, timeout=60)
+
+
+def _job(session: requests.Session, target: str) -> requests.Response:
+    payload = {
+        "customer_name": f"Acme Foods {random.randint(1, 50)}",
+        "category": "Refrigeration",
+        "priority": random.choice(["Normal", "High"]),
+        "problem_details": random.choice(["Walk-in cooler not cooling", "Ice machine leaking", "Fryer won't heat"]),
+        "service_location": {"name": "Main", "address": "1 Main St"},
+    }
+    return session.post(f"{target}/sf/jobs", json=payload, timeout=120)
+
+
+SCENARIOS: Dict[str, Callable[[requests.Session, str], requests.Response]] = {"search": _search, "jobs": _job}
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def run(target: str, scenario: str, concurrency: int, requests_total: int = 0, duration: float = 0.0,
+        warmup: int = 5) -> Dict[str, Any]:
+    """
+    ``requests_total`` calls (or as many as fit in ``duration`` seconds) over ``concurrency`` threads.
+    """
+    call = SCENARIOS[scenario]
+    target = target.rstrip("/")
+    with requests.Session() as s:
+        for _ in range(warmup):
+            try:
+                call(s, target)
+            except requests.RequestException:
+                pass
+
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    lock = threading.Lock()
+    remaining = [requests_total]
+    deadline = time.monotonic() + duration if duration else None
+
+    def worker() -> None:
+        with requests.Session() as session:
+            while True:
+                with lock:
+                    if deadline is None:
+                        if remaining[0] <= 0:
+                            return
+                        remaining[0] -= 1
+                if deadline is not None and time.monotonic() >= deadline:
+                    return
+                t0 = time.perf_counter()
+                try:
+                    status = str(call(session, target).status_code)
+                except requests.RequestException as e:
+                    status = type(e).__name__
+                ms = (time.perf_counter() - t0) * 1000
+                with lock:
+                    latencies.append(ms)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(n for code, n in statuses.items() if not code.isdigit() or int(code) >= 500)
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "seconds": round(elapsed, 2),
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50": round(percentile(latencies, 50), 1),
+        "p95": round(percentile(latencies, 95), 1),
+        "p99": round(percentile(latencies, 99), 1),
+        "max": round(latencies[-1], 1) if latencies else 0.0,
+    }
+
+
+def report(results: List[Dict[str, Any]], out: Any = sys.stdout) -> None:
+    out.write(f"{'scenario':<10}{'conc':>6}{'reqs':>8}{'err':>6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}\n")
+    for r in results:
+        out.write(f"{r['scenario']:<10}{r['concurrency']:>6}{r['requests']:>8}{r['errors']:>6}{r['throughput']:>9}"
+                  f"{r['p50']:>9}{r['p95']:>9}{r['p99']:>9}{r['max']:>9}\n")
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    """
+    Regressions: p95 / p99 above the baseline, or throughput below it, by more than ``tolerance``.
+    """
+    base = {(b["scenario"], b["concurrency"]): b for b in baseline}
+    problems = []
+    for r in results:
+        b = base.get((r["scenario"], r["concurrency"]))
+        if b is None:
+            continue
+        for key in ("p95", "p99"):
+            if b[key] and r[key] > b[key] * (1 + tolerance):
+                problems.append(f"{r['scenario']} {key}: {r[key]} ms vs {b[key]} ms")
+        if b["throughput"] and r["throughput"] < b["throughput"] * (1 - tolerance):
+            problems.append(f"{r['scenario']} throughput: {r['throughput']} vs {b['throughput']} req/s")
+        if r["errors"] > b["errors"]:
+            problems.append(f"{r['scenario']} errors: {r['errors']} vs {b['errors']}")
+    return problems
+
+
+def finish(results: List[Dict[str, Any]], save: Optional[str], baseline: Optional[str], tolerance: float) -> int:
+    report(results)
+    if save:
+        with open(save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            problems = compare(results, json.load(f), tolerance)
+        for p in problems:
+            print(f"REGRESSION {p}")
+        if problems:
+            return 1
+        print(f"No regression beyond {tolerance:.0%} of {baseline}.")
+    return 0
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Repeatable; default: all.")
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("-n", "--requests", type=int, default=500, help="Requests per scenario.")
+    parser.add_argument("-d", "--duration", type=float, default=0, help="Seconds per scenario (overrides -n).")
+    parser.add_argument("--save", help="Write the results (JSON) for later comparison.")
+    parser.add_argument("--baseline", help="Compare with saved results; exit 1 on regression.")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression (default 15%%).")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load scenarios for /sf/customers/search and /sf/jobs.")
+    parser.add_argument("--target", default="http://127.0.0.1:8000")
+    add_arguments(parser)
+    args = parser.parse_args()
+    results = [run(args.target, s, args.concurrency, args.requests, args.duration) for s in args.scenario or sorted(SCENARIOS)]
+    return finish(results, args.save, args.baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+"""
+Local stand-ins for the external services, with latency and error injection.
+
+    python bench/stubs.py --latency sf=80,llm=1200,smtp=20 --errors sf=0.02
+
+- HTTP (one port): ``POST /oauth/access_token``, ``/v1/customers`` (search with
+  ``filters[name]``, paging with ``page`` / ``per-page`` / ``sort``, GET by id,
+  POST), ``/v1/jobs`` (POST, GET / PATCH / PUT by id, POST notes),
+  ``POST /v1/locations``, ``POST /llm`` (the summarizer) and the artifacts it
+  links (``/artifacts/<n>.docx`` / ``.json``). ``GET /_stats`` returns the
+  request counters.
+- SMTP sink (second port): accepts and counts messages (EHLO, MAIL, RCPT,
+  DATA, RSET, NOOP, QUIT); nothing is delivered.
+
+Faults are per service (oauth, sf, llm, smtp): ``latency`` (ms, +/- 20%
+jitter) and ``errors`` (fraction of calls answered with 503 / SMTP 451).
+``--env`` prints the settings that point the Django app at the stubs.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import random
+import socketserver
+import threading
+import time
+import zipfile
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+SERVICES = ("oauth", "sf", "llm", "smtp")
+
+FIRST = ["Acme", "Garcia", "Northside", "Blue", "Golden", "Metro", "Harbor", "Summit", "Pioneer", "Cedar"]
+SECOND = ["Foods", "Diner", "Bakery", "Grill", "Market", "Cafe", "Kitchen", "Pizza", "Deli", "Bistro"]
+
+
+@dataclass
+class Fault:
+    latency_ms: float = 0.0
+    error_rate: float = 0.0
+
+    def delay(self) -> None:
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms * random.uniform(0.8, 1.2) / 1000)
+
+    def fails(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+@dataclass
+class StubState:
+    faults: Dict[str, Fault] = field(default_factory=lambda: {s: Fault() for s in SERVICES})
+    customers: List[Dict[str, Any]] = field(default_factory=list)
+    jobs: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    counters: Counter = field(default_factory=Counter)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    base_url: str = ""
+
+    def seed(self, n: int) -> None:
+        for i in range(1, n + 1):
+            name = f"{FIRST[i % len(FIRST)]} {SECOND[(i // len(FIRST)) % len(SECOND)]} {i}"
+            self.customers.append({
+                "id": i, "customer_name": name, "updated_at": f"2024-01-01T00:{i % 60:02d}:00+00:00",
+                "contacts": [{"fname": "Pat", "lname": f"Owner{i}", "phones": [{"phone": f"555{i:07d}"}],
+                              "emails": [{"email": f"owner{i}@example.com"}]}],
+                "locations": [{"nickname": "Main", "street_1": f"{i} Main St", "city": "Austin"}],
+            })
+
+
+def docx_bytes(paragraphs: List[str]) -> bytes:
+    ns = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    body = "".join(f"<w:p><w:r><w:t>{p}</w:t></w:r></w:p>" for p in paragraphs)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("word/document.xml", f'<?xml version="1.0"?><w:document xmlns:w="{ns}"><w:body>{body}</w:body></w:document>')
+    return buf.getvalue()
+
+
+# ===================== HTTP =====================
+class Handler(BaseHTTPRequestHandler):
+    server_version = "fusion-stub/1"
+    protocol_version = "HTTP/1.1"
+    state: StubState
+
+    def log_message(self, fmt: str, *args: Any) -> None:  # quiet
+        pass
+
+    def _body(self) -> Any:
+        n = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(n) if n else b""
+        if "json" in (self.headers.get("Content-Type") or ""):
+            return json.loads(raw or b"{}")
+        return {k: v[0] for k, v in parse_qs(raw.decode()).items()}
+
+    def _send(self, status: int, data: Any = None, raw: Optional[bytes] = None, ctype: str = "application/json") -> None:
+        body = raw if raw is not None else json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 503:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _service(self, path: str) -> str:
+        if path.startswith("/oauth"):
+            return "oauth"
+        if path.startswith("/llm") or path.startswith("/artifacts"):
+            return "llm"
+        return "sf"
+
+    def _handle(self, method: str) -> None:
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        body = self._body() if method in ("POST", "PUT", "PATCH") else None
+        if url.path == "/_stats":
+            with self.state.lock:
+                return self._send(200, dict(self.state.counters))
+        service = self._service(url.path)
+        fault = self.state.faults[service]
+        with self.state.lock:
+            self.state.counters[f"{service} {method}"] += 1
+        fault.delay()
+        if fault.fails():
+            with self.state.lock:
+                self.state.counters[f"{service} errors"] += 1
+            return self._send(503, {"message": "injected failure"})
+        status, data, raw, ctype = self._route(method, url.path, q, body)
+        self._send(status, data, raw, ctype)
+
+    def _route(self, method: str, path: str, q: Dict[str, str], body: Any) -> Tuple[int, Any, Optional[bytes], str]:
+        st = self.state
+        parts = [p for p in path.split("/") if p]
+        if path == "/oauth/access_token":
+            return 200, {"access_token": f"stub-{random.getrandbits(32):x}", "expires_in": 3600}, None, "application/json"
+        if path == "/llm":
+            n = random.randint(1, 10 ** 6)
+            links = {"docx": f"{st.base_url}/artifacts/{n}.docx", "json": f"{st.base_url}/artifacts/{n}.json"}
+            return 200, {"links": links}, None, "application/json"
+        if parts[:1] == ["artifacts"]:
+            text = ["Check the condenser fan and clean the coils."] * 20
+            if path.endswith(".docx"):
+                return 200, None, docx_bytes(text), "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+            return 200, {"reply": " ".join(text)}, None, "application/json"
+        if parts[:1] != ["v1"]:
+            return 404, {"message": "not found"}, None, "application/json"
+        parts = parts[1:]
+        if parts == ["customers"] and method == "GET":
+            items = st.customers
+            name = (q.get("filters[name]") or "").lower()
+            if name:
+                items = [c for c in items if name in c["customer_name"].lower()]
+            if q.get("sort") == "-updated_at":
+                items = sorted(items, key=lambda c: c["updated_at"], reverse=True)
+            per_page, page = int(q.get("per-page") or 10), int(q.get("page") or 1)
+            meta = {"totalCount": len(items), "pageCount": max(1, -(-len(items) // per_page)), "currentPage": page, "perPage": per_page}
+            return 200, {"items": items[(page - 1) * per_page:page * per_page], "_meta": meta}, None, "application/json"
+        if parts == ["customers"] and method == "POST":
+            with st.lock:
+                c = {"id": len(st.customers) + 1, "customer_name": body.get("customer_name"), "contacts": [], "locations": []}
+                st.customers.append(c)
+            return 201, c, None, "application/json"
+        if len(parts) == 2 and parts[0] == "customers":
+            c = next((c for c in st.customers if str(c["id"]) == parts[1]), None)
+            return (200, c, None, "application/json") if c else (404, {"message": "no customer"}, None, "application/json")
+        if parts == ["locations"] and method == "POST":
+            return 201, dict(body, id=random.randint(1, 10 ** 6)), None, "application/json"
+        if parts == ["jobs"] and method == "POST":
+            with st.lock:
+                jid = 1000 + len(st.jobs)
+                job = dict(body, id=jid, number=f"J{jid}", status=body.get("status") or "Unscheduled", notes=[])
+                st.jobs[jid] = job
+            return 201, job, None, "application/json"
+        if len(parts) >= 2 and parts[0] == "jobs" and parts[1].isdigit():
+            job = st.jobs.get(int(parts[1]))
+            if job is None:
+                return 404, {"message": "no job"}, None, "application/json"
+            if parts[2:] == ["notes"]:
+                job["notes"].append(body)
+                return 201, body, None, "application/json"
+            if method in ("PUT", "PATCH"):
+                job.update(body or {})
+            return 200, job, None, "application/json"
+        return 404, {"message": "not found"}, None, "application/json"
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def do_PUT(self) -> None:
+        self._handle("PUT")
+
+    def do_PATCH(self) -> None:
+        self._handle("PATCH")
+
+
+# ===================== SMTP sink =====================
+class SMTPHandler(socketserver.StreamRequestHandler):
+    state: StubState
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self) -> None:
+        fault = self.state.faults["smtp"]
+        self._reply("220 fusion-stub ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.decode(errors="replace").strip().split(" ", 1)[0].upper()
+            if cmd == "EHLO":
+                self.wfile.write(b"250-fusion-stub\r\n250 SIZE 10485760\r\n")
+            elif cmd == "MAIL":
+                fault.delay()
+                if fault.fails():
+                    with self.state.lock:
+                        self.state.counters["smtp errors"] += 1
+                    self._reply("451 injected failure")
+                else:
+                    self._reply("250 OK")
+            elif cmd == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                with self.state.lock:
+                    self.state.counters["smtp messages"] += 1
+                self._reply("250 OK queued")
+            elif cmd == "QUIT":
+                self._reply("221 Bye")
+                return
+            elif cmd in ("HELO", "RCPT", "RSET", "NOOP"):
+                self._reply("250 OK")
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _ThreadingSMTP(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+# ===================== Lifecycle =====================
+class Stubs:
+    def __init__(self, host: str = "127.0.0.1", http_port: int = 0, smtp_port: int = 0, customers: int = 500) -> None:
+        self.state = StubState()
+        self.state.seed(customers)
+        handler = type("BoundHandler", (Handler,), {"state": self.state})
+        smtp = type("BoundSMTPHandler", (SMTPHandler,), {"state": self.state})
+        self.http = ThreadingHTTPServer((host, http_port), handler)
+        self.http.daemon_threads = True
+        self.smtp = _ThreadingSMTP((host, smtp_port), smtp)
+        self.base_url = self.state.base_url = f"http://{host}:{self.http.server_address[1]}"
+        self.smtp_address = self.smtp.server_address
+
+    def configure(self, latency: Dict[str, float], errors: Dict[str, float]) -> None:
+        for name, ms in latency.items():
+            self.state.faults[name].latency_ms = ms
+        for name, rate in errors.items():
+            self.state.faults[name].error_rate = rate
+
+    def start(self) -> "Stubs":
+        for server in (self.http, self.smtp):
+            threading.Thread(target=server.serve_forever, name=f"stub-{type(server).__name__}", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        for server in (self.http, self.smtp):
+            server.shutdown()
+            server.server_close()
+
+    def env(self) -> Dict[str, str]:
+        """
+        Settings pointing the Django app at the stubs.
+        """
+        return {
+            "SERVICE_FUSION_BASE_URL": self.base_url,
+            "SERVICE_FUSION_TOKEN_URL": f"{self.base_url}/oauth/access_token",
+            "SERVICE_FUSION_CLIENT_ID": "bench",
+            "SERVICE_FUSION_CLIENT_SECRET": "bench",
+            "LLM_API_URL": f"{self.base_url}/llm",
+            "EMAIL_BACKEND": "django.core.mail.backends.smtp.EmailBackend",
+            "EMAIL_HOST": self.smtp_address[0],
+            "EMAIL_PORT": str(self.smtp_address[1]),
+            "EMAIL_HOST_USER": "",
+            "EMAIL_HOST_PASSWORD": "",
+            "EMAIL_USE_TLS": "False",
+            "EMAIL_USE_SSL": "False",
+            "WORKORDER_RECIPIENT": "bench@example.com",
+        }
+
+
+def parse_faults(spec: str) -> Dict[str, float]:
+    """
+    ``"sf=80,llm=1200"`` -> ``{"sf": 80.0, "llm": 1200.0}``.
+    """
+    out = {}
+    for item in filter(None, (spec or "").split(",")):
+        name, _, value = item.partition("=")
+        if name.strip() not in SERVICES:
+            raise ValueError(f"Unknown service {name!r} (expected one of {', '.join(SERVICES)})")
+        out[name.strip()] = float(value)
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Service Fusion / LLM / SMTP stubs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--http-port", type=int, default=8900)
+    parser.add_argument("--smtp-port", type=int, default=8925)
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--latency", default="", help="ms per service, e.g. sf=80,llm=1200,smtp=20")
+    parser.add_argument("--errors", default="", help="error fraction per service, e.g. sf=0.02")
+    parser.add_argument("--env", action="store_true", help="Print the matching environment and exit.")
+    args = parser.parse_args()
+    stubs = Stubs(args.host, args.http_port, args.smtp_port, args.customers)
+    stubs.configure(parse_faults(args.latency), parse_faults(args.errors))
+    if args.env:
+        print("\n".join(f"{k}={v}" for k, v in stubs.env().items()))
+        return
+    stubs.start()
+    print(f"HTTP stubs on {stubs.base_url}, SMTP sink on {stubs.smtp_address[0]}:{stubs.smtp_address[1]} (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stubs.stop()
+
+
+if __name__ == "__main__":
+    main()
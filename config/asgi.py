@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Serve the Service Fusion endpoints with the native async views (fusion/async_views.py).
+os.environ.setdefault('FUSION_ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
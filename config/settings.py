@@ -10,6 +10,8 @@ from pathlib import Path
 import os
 from dotenv import load_dotenv
 
+from fusion.log import build_logging
+
 # -----------------------------------------------------------------------------
 # Paths / .env
 # -----------------------------------------------------------------------------
@@ -45,6 +47,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "fusion.log.RequestIdMiddleware",
+    "fusion.metrics.MetricsMiddleware",
+    "fusion.profiling.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.middleware.common.CommonMiddleware",
 ]
@@ -56,11 +61,17 @@ TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
-        "APP_DIRS": True,
         "OPTIONS": {
             "context_processors": [
                 "django.template.context_processors.request",
             ],
+            # Parsed templates kept in memory (also with DEBUG on; the dev autoreloader resets them)
+            "loaders": [
+                ("django.template.loaders.cached.Loader", [
+                    "django.template.loaders.filesystem.Loader",
+                    "django.template.loaders.app_directories.Loader",
+                ]),
+            ],
         },
     },
 ]
@@ -90,9 +101,23 @@ _static_dir = BASE_DIR / "static"
 if DEBUG and _static_dir.exists():
     STATICFILES_DIRS = [ _static_dir ]  # noqa: F405
 
+# Page bundles (fusion/assets.py): built by `manage.py build_assets`, served from /assets/
+FUSION_ASSETS_DIR     = Path(os.getenv("FUSION_ASSETS_DIR", str(BASE_DIR / "build" / "assets")))
+FUSION_ASSETS_ENABLED = os.getenv("FUSION_ASSETS_ENABLED", "True").lower() in ("1", "true", "yes")
+FUSION_ASSETS_MAX_AGE = int(os.getenv("FUSION_ASSETS_MAX_AGE", str(365 * 86400)))   # hashed names: immutable
+TEMPLATES[0]["DIRS"].append(FUSION_ASSETS_DIR / "templates")
+
+# Rendered-page cache (fusion/page_cache.py) for home / platform pages; FUSION_RELEASE changes per deploy
+FUSION_PAGE_CACHE_ENABLED     = os.getenv("FUSION_PAGE_CACHE_ENABLED", "True").lower() in ("1", "true", "yes")
+FUSION_PAGE_CACHE_MAX_ENTRIES = int(os.getenv("FUSION_PAGE_CACHE_MAX_ENTRIES", "32"))
+FUSION_RELEASE                = os.getenv("FUSION_RELEASE", "")   # e.g. the git sha of the deploy
+
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Local runtime state of the fusion app (SQLite task queue, caches...); not served
+FUSION_RUNTIME_DIR = Path(os.getenv("FUSION_RUNTIME_DIR", str(BASE_DIR / "var")))
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # -----------------------------------------------------------------------------
@@ -122,40 +147,11 @@ if not DEBUG:
 # -----------------------------------------------------------------------------
 # Logging (console + file; level configurable)
 # -----------------------------------------------------------------------------
-LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
-LOGGING = {
-    "version": 1,
-    "disable_existing_loggers": False,
-    "formatters": {
-        "verbose": {
-            "format": "{levelname} {asctime} {module} {process:d} {thread:d} {message}",
-            "style": "{",
-        },
-        "simple": {
-            "format": "{levelname} {message}",
-            "style": "{",
-        },
-    },
-    "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
-            "formatter": "simple",
-        },
-        "file": {
-            "level": "DEBUG",
-            "class": "logging.FileHandler",
-            "filename": BASE_DIR / "django_debug.log",
-            "formatter": "verbose",
-        },
-    },
-    "root": {"handlers": ["console", "file"], "level": LOG_LEVEL},
-    "loggers": {
-        "django.server": {"handlers": ["console", "file"], "level": LOG_LEVEL, "propagate": False},
-        "django.security": {"handlers": ["console", "file"], "level": LOG_LEVEL, "propagate": False},
-        "fusion": {"handlers": ["console", "file"], "level": "DEBUG", "propagate": False},
-        "fusion.views": {"handlers": ["console", "file"], "level": "DEBUG", "propagate": False},
-    },
-}
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Records are handed to a background listener thread (fusion/log.py); LOG_ASYNC=False writes inline.
+LOG_ASYNC = os.getenv("LOG_ASYNC", "True").lower() in ("1", "true", "yes")
+LOGGING_CONFIG = "fusion.log.configure"
+LOGGING = build_logging(LOG_LEVEL, BASE_DIR / "django_debug.log")
 
 # -----------------------------------------------------------------------------
 # Project integrations
@@ -169,6 +165,9 @@ SERVICE_FUSION_API_KEY    = os.getenv("SERVICE_FUSION_API_KEY", "")
 SERVICE_FUSION_CLIENT_ID     = os.getenv("SERVICE_FUSION_CLIENT_ID", "")
 SERVICE_FUSION_CLIENT_SECRET = os.getenv("SERVICE_FUSION_CLIENT_SECRET", "")
 SERVICE_FUSION_TOKEN_URL     = os.getenv("SERVICE_FUSION_TOKEN_URL", f"{SERVICE_FUSION_BASE_URL}/oauth/access_token")
+# Token shared by all workers (fusion/oauth.py): file | memory | dotted.path.Store
+FUSION_OAUTH_STORE          = os.getenv("FUSION_OAUTH_STORE", "file")
+FUSION_OAUTH_REFRESH_MARGIN = int(os.getenv("FUSION_OAUTH_REFRESH_MARGIN", "300"))  # refresh-ahead, seconds before exp
 
 # (legacy; not used when OAuth works)
 SERVICE_FUSION_COMPANY_ID = os.getenv("SERVICE_FUSION_COMPANY_ID", "")
@@ -180,6 +179,18 @@ SERVICE_FUSION_LOGIN_URL  = os.getenv("SERVICE_FUSION_LOGIN_URL", f"{SERVICE_FUS
 LLM_API_URL = os.getenv("LLM_API_URL", "")
 LLM_API_KEY = os.getenv("LLM_API_KEY", "")
 
+# LLM summary cache (fusion/llm_cache.py): SQLite under FUSION_RUNTIME_DIR
+FUSION_LLM_CACHE_ENABLED     = os.getenv("FUSION_LLM_CACHE_ENABLED", "True").lower() in ("1", "true", "yes")
+FUSION_LLM_CACHE_TTL         = int(os.getenv("FUSION_LLM_CACHE_TTL", str(7 * 86400)))
+FUSION_LLM_CACHE_MAX_ENTRIES = int(os.getenv("FUSION_LLM_CACHE_MAX_ENTRIES", "5000"))
+FUSION_LLM_CACHE_NEAR_DUP    = os.getenv("FUSION_LLM_CACHE_NEAR_DUP", "False").lower() in ("1", "true", "yes")  # match on problem text only
+
+# RAG document extraction (fusion/rag.py): characters kept, download size cap
+FUSION_RAG_CHAR_BUDGET = int(os.getenv("FUSION_RAG_CHAR_BUDGET", "2000"))
+FUSION_RAG_MAX_BYTES   = int(os.getenv("FUSION_RAG_MAX_BYTES", str(20 * 1024 * 1024)))
+FUSION_ARTIFACT_MAX_BYTES = int(os.getenv("FUSION_ARTIFACT_MAX_BYTES", str(200 * 1024 * 1024)))   # on-disk artifact cache
+FUSION_ARTIFACT_FRESH_FOR = int(os.getenv("FUSION_ARTIFACT_FRESH_FOR", "3600"))   # seconds before a conditional GET
+
 # Email (SMTP)
 EMAIL_BACKEND       = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
 EMAIL_HOST          = os.getenv("EMAIL_HOST", "")
@@ -193,5 +204,98 @@ EMAIL_TIMEOUT       = int(os.getenv("EMAIL_TIMEOUT", "30"))
 DEFAULT_FROM_EMAIL  = os.getenv("DEFAULT_FROM_EMAIL", "no-reply@works-service.us")
 WORKORDER_RECIPIENT = os.getenv("WORKORDER_RECIPIENT", "AI_Workorder@works-service.us")
 
+# Outbound email queue (fusion/outbox.py): persisted messages, pooled SMTP connections, retries
+FUSION_OUTBOX_STORE          = os.getenv("FUSION_OUTBOX_STORE", "sqlite")   # sqlite | memory
+FUSION_OUTBOX_BATCH          = int(os.getenv("FUSION_OUTBOX_BATCH", "20"))   # messages per claim / connection use
+FUSION_OUTBOX_MAX_ATTEMPTS   = int(os.getenv("FUSION_OUTBOX_MAX_ATTEMPTS", "5"))
+FUSION_OUTBOX_IDLE_TIMEOUT   = int(os.getenv("FUSION_OUTBOX_IDLE_TIMEOUT", "60"))   # seconds before an idle connection is reopened
+FUSION_OUTBOX_WAIT           = float(os.getenv("FUSION_OUTBOX_WAIT", "10"))   # seconds a request waits for delivery
+FUSION_OUTBOX_RETENTION_DAYS = int(os.getenv("FUSION_OUTBOX_RETENTION_DAYS", "7"))
+
+# Customer search / detail response cache (fusion/cache.py): local LRU or a Django cache alias
+FUSION_CACHE_BACKEND      = os.getenv("FUSION_CACHE_BACKEND", "local")   # local | django
+FUSION_CACHE_ALIAS        = os.getenv("FUSION_CACHE_ALIAS", "default")
+FUSION_CACHE_MAXSIZE      = int(os.getenv("FUSION_CACHE_MAXSIZE", "2048"))
+FUSION_CACHE_TTL_SEARCH   = int(os.getenv("FUSION_CACHE_TTL_SEARCH", "120"))
+FUSION_CACHE_TTL_CUSTOMER = int(os.getenv("FUSION_CACHE_TTL_CUSTOMER", "300"))
+FUSION_CACHE_TTL_NEGATIVE = int(os.getenv("FUSION_CACHE_TTL_NEGATIVE", "30"))
+
+# Local customer index (type-ahead search); load it with `manage.py sf_index_customers --full`
+FUSION_INDEX_ENABLED       = os.getenv("FUSION_INDEX_ENABLED", "True").lower() in ("1", "true", "yes")
+FUSION_INDEX_SYNC_INTERVAL = int(os.getenv("FUSION_INDEX_SYNC_INTERVAL", "300"))   # seconds, 0 = no periodic sync
+FUSION_INDEX_PAGE_SIZE     = int(os.getenv("FUSION_INDEX_PAGE_SIZE", "50"))
+
 # HTTP client timeout (requests)
 HTTP_TIMEOUT = int(os.getenv("HTTP_TIMEOUT", "25"))
+
+# Pooled Service Fusion client (fusion/http_client.py): one keep-alive session per worker
+HTTP_CONNECT_TIMEOUT  = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT     = float(os.getenv("HTTP_READ_TIMEOUT", str(HTTP_TIMEOUT)))
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))    # per-host pools kept alive
+HTTP_POOL_MAXSIZE     = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))       # max connections per host
+HTTP_POOL_BLOCK       = os.getenv("HTTP_POOL_BLOCK", "False").lower() in ("1", "true", "yes")
+
+# Async views (fusion/async_views.py) — config/asgi.py turns this on by default
+FUSION_ASYNC_VIEWS = os.getenv("FUSION_ASYNC_VIEWS", "False").lower() in ("1", "true", "yes")
+
+# Streamed type-ahead (fusion/typeahead.py): wait before calling Service Fusion; a newer query cancels it
+FUSION_TYPEAHEAD_DEBOUNCE = float(os.getenv("FUSION_TYPEAHEAD_DEBOUNCE", "0.15"))   # seconds
+FUSION_TYPEAHEAD_WORKERS  = int(os.getenv("FUSION_TYPEAHEAD_WORKERS", "8"))        # sync views: upstream calls in flight
+
+# Duplicate-submission suppression for /sf/jobs and /sf/customers (fusion/idempotency.py)
+FUSION_IDEMPOTENCY_ENABLED     = os.getenv("FUSION_IDEMPOTENCY_ENABLED", "True").lower() in ("1", "true", "yes")
+FUSION_IDEMPOTENCY_STORE       = os.getenv("FUSION_IDEMPOTENCY_STORE", "sqlite")   # sqlite | memory
+FUSION_IDEMPOTENCY_TTL         = int(os.getenv("FUSION_IDEMPOTENCY_TTL", "86400"))   # seconds an Idempotency-Key response is replayed
+FUSION_IDEMPOTENCY_AUTO_WINDOW = int(os.getenv("FUSION_IDEMPOTENCY_AUTO_WINDOW", "60"))   # same payload without a key; 0 disables
+FUSION_IDEMPOTENCY_WAIT        = float(os.getenv("FUSION_IDEMPOTENCY_WAIT", "30"))   # seconds a duplicate waits for the original
+FUSION_IDEMPOTENCY_LEASE       = int(os.getenv("FUSION_IDEMPOTENCY_LEASE", "300"))   # seconds before an abandoned original is taken over
+
+# Bulk job intake (fusion/bulk.py, POST /sf/jobs/bulk)
+FUSION_BULK_CONCURRENCY = int(os.getenv("FUSION_BULK_CONCURRENCY", "8"))     # items processed at once
+FUSION_BULK_MAX_ITEMS   = int(os.getenv("FUSION_BULK_MAX_ITEMS", "200"))     # larger batches get a 413
+
+# Outbound Service Fusion pacing (fusion/ratelimit.py); FUSION_RATE_LIMIT=0 disables the bucket
+FUSION_RATE_LIMIT                = float(os.getenv("FUSION_RATE_LIMIT", "5"))      # requests / second
+FUSION_RATE_BURST                = int(os.getenv("FUSION_RATE_BURST", "10"))
+FUSION_RATE_SHARED               = os.getenv("FUSION_RATE_SHARED", "False").lower() in ("1", "true", "yes")  # one budget per host
+FUSION_RATE_INTERACTIVE_RESERVE  = int(os.getenv("FUSION_RATE_INTERACTIVE_RESERVE", "2"))
+FUSION_RATE_MAX_WAIT             = float(os.getenv("FUSION_RATE_MAX_WAIT", "30"))
+FUSION_RATE_MAX_RETRIES          = int(os.getenv("FUSION_RATE_MAX_RETRIES", "3"))
+FUSION_RATE_MAX_RETRY_DELAY      = float(os.getenv("FUSION_RATE_MAX_RETRY_DELAY", "30"))
+
+# Circuit breakers (fusion/breaker.py): consecutive failures before opening, seconds before a probe.
+# A critical breaker (Service Fusion) makes /healthz answer 503 while it is open.
+FUSION_BREAKERS = {
+    "servicefusion": {
+        "failure_threshold": int(os.getenv("FUSION_BREAKER_SF_FAILURES", "5")),
+        "reset_timeout": float(os.getenv("FUSION_BREAKER_SF_RESET", "30")),
+    },
+    "llm": {
+        "failure_threshold": int(os.getenv("FUSION_BREAKER_LLM_FAILURES", "3")),
+        "reset_timeout": float(os.getenv("FUSION_BREAKER_LLM_RESET", "60")),
+    },
+    "smtp": {
+        "failure_threshold": int(os.getenv("FUSION_BREAKER_SMTP_FAILURES", "3")),
+        "reset_timeout": float(os.getenv("FUSION_BREAKER_SMTP_RESET", "120")),
+    },
+}
+
+# Background task queue (fusion/tasks.py): /sf/jobs answers 202 and enriches the job in the background
+FUSION_BACKGROUND_ENRICHMENT = os.getenv("FUSION_BACKGROUND_ENRICHMENT", "True").lower() in ("1", "true", "yes")
+FUSION_TASK_STORE          = os.getenv("FUSION_TASK_STORE", "sqlite")   # sqlite | memory | dotted.path.Store
+FUSION_TASK_WORKERS        = int(os.getenv("FUSION_TASK_WORKERS", "4"))
+FUSION_TASK_MAX_PENDING    = int(os.getenv("FUSION_TASK_MAX_PENDING", "500"))
+FUSION_TASK_LEASE          = int(os.getenv("FUSION_TASK_LEASE", "300"))  # seconds before a dead worker's task is reclaimed
+FUSION_TASK_MAX_ATTEMPTS   = int(os.getenv("FUSION_TASK_MAX_ATTEMPTS", "3"))
+FUSION_TASK_RETENTION_DAYS = int(os.getenv("FUSION_TASK_RETENTION_DAYS", "7"))
+
+# Sampling profiler (fusion/profiling.py); aggregate the dumps with `manage.py sf_profiles`
+FUSION_PROFILE_ENABLED     = os.getenv("FUSION_PROFILE_ENABLED", "False").lower() in ("1", "true", "yes")
+FUSION_PROFILE_SAMPLE_RATE = float(os.getenv("FUSION_PROFILE_SAMPLE_RATE", "0"))   # fraction of requests, e.g. 0.01
+FUSION_PROFILE_TOKEN       = os.getenv("FUSION_PROFILE_TOKEN", "")   # X-Fusion-Profile value; empty = no header trigger
+FUSION_PROFILE_INTERVAL    = float(os.getenv("FUSION_PROFILE_INTERVAL", "0.005"))   # seconds between samples
+FUSION_PROFILE_MAX_SECONDS = float(os.getenv("FUSION_PROFILE_MAX_SECONDS", "60"))
+FUSION_PROFILE_MAX_FILES   = int(os.getenv("FUSION_PROFILE_MAX_FILES", "500"))
+FUSION_PROFILE_ENDPOINTS   = [e.strip() for e in os.getenv(
+    "FUSION_PROFILE_ENDPOINTS", "sf_create_job,sf_search_customers,sf_create_customer,sf_get_customer,sf_get_job"
+).split(",") if e.strip()]
@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class FusionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fusion'
+
+    def ready(self):
+        # Start the background task workers (and recover persisted work) on the
+        # first request of each server process, never in management commands.
+        from .customer_index import start_index_sync
+        from .oauth import warm_token
+        from .outbox import start_outbox
+        from .tasks import start_task_queue
+        request_started.connect(start_task_queue, dispatch_uid="fusion.start_task_queue")
+        request_started.connect(warm_token, dispatch_uid="fusion.warm_token")
+        request_started.connect(start_index_sync, dispatch_uid="fusion.start_index_sync")
+        request_started.connect(start_outbox, dispatch_uid="fusion.start_outbox")
@@ -0,0 +1,184 @@
+"""
+Local store for the artifacts linked by the LLM service (RAG .docx / .json).
+
+- Downloads are keyed by URL and kept on disk under FUSION_RUNTIME_DIR/artifacts
+  (LRU eviction above FUSION_ARTIFACT_MAX_BYTES; per-file cap FUSION_RAG_MAX_BYTES).
+- A cached copy younger than FUSION_ARTIFACT_FRESH_FOR is used as is; older
+  copies are revalidated with If-None-Match / If-Modified-Since (304 = reuse).
+- Concurrent fetches of one URL share a single download (single-flight).
+- ``text(url, kind, extract)`` memoizes what was extracted from a given
+  version of the artifact (JSON ``reply``, docx head...), so each version is
+  parsed at most once, across restarts.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from django.conf import settings
+
+from .rag import iter_capped
+from .singleflight import SingleFlight
+from .storage import runtime_path, sqlite_connect
+
+
+class ArtifactStore:
+    def __init__(self, root: Optional[Path] = None, *, max_bytes: int = 200 * 1024 * 1024,
+                 max_file_bytes: int = 20 * 1024 * 1024, fresh_for: float = 3600, timeout: float = 30) -> None:
+        self.root = Path(root or runtime_path("artifacts", "index.sqlite3").parent)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.fresh_for = fresh_for
+        self.timeout = timeout
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._pid: Optional[int] = None
+        self._conn = sqlite_connect(self.root / "index.sqlite3")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts (url TEXT PRIMARY KEY, file TEXT NOT NULL, etag TEXT, "
+            "last_modified TEXT, encoding TEXT, size INTEGER NOT NULL, version TEXT NOT NULL, "
+            "checked REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extracts (url TEXT NOT NULL, kind TEXT NOT NULL, version TEXT NOT NULL, "
+            "text TEXT NOT NULL, PRIMARY KEY (url, kind))"
+        )
+        self.counters = {"fresh": 0, "revalidated": 0, "downloaded": 0, "extracted": 0, "memo_hits": 0, "evicted": 0}
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None or self._pid != os.getpid():
+            self._session, self._pid = requests.Session(), os.getpid()
+        return self._session
+
+    def _row(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM artifacts WHERE url = ?", (url,)).fetchone()
+        if row is None or not (self.root / row["file"]).exists():
+            return None
+        return dict(row)
+
+    # ---------- download ----------
+    def fetch(self, url: str) -> Dict[str, Any]:
+        """
+        Returns the artifact record (``path``, ``version``, ``encoding``...), downloading
+        or revalidating it when needed.
+        """
+        row = self._row(url)
+        if row is not None and time.time() - row["checked"] < self.fresh_for:
+            self.counters["fresh"] += 1
+            self._touch(url)
+        else:
+            row = self._flight.do(url, lambda: self._download(url, self._row(url)))
+        row["path"] = self.root / row["file"]
+        return row
+
+    def _download(self, url: str, row: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        headers = {}
+        if row is not None:
+            if row["etag"]:
+                headers["If-None-Match"] = row["etag"]
+            if row["last_modified"]:
+                headers["If-Modified-Since"] = row["last_modified"]
+        now = time.time()
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as r:
+            if r.status_code == 304 and row is not None:
+                self.counters["revalidated"] += 1
+                with self._lock:
+                    self._conn.execute("UPDATE artifacts SET checked = ?, accessed = ? WHERE url = ?", (now, now, url))
+                return row
+            r.raise_for_status()
+            name = hashlib.sha256(url.encode()).hexdigest()
+            tmp = self.root / f"{name}.{os.getpid()}.{threading.get_ident()}.part"
+            digest, size = hashlib.sha256(), 0
+            try:
+                with open(tmp, "wb") as f:
+                    for chunk in iter_capped(r, self.max_file_bytes):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                os.replace(tmp, self.root / name)
+            finally:
+                if tmp.exists():
+                    tmp.unlink()
+            row = {
+                "url": url, "file": name, "etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified"),
+                "encoding": r.encoding, "size": size, "version": digest.hexdigest(), "checked": now, "accessed": now,
+            }
+        self.counters["downloaded"] += 1
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (:url, :file, :etag, :last_modified, :encoding, :size, "
+                ":version, :checked, :accessed)", row,
+            )
+        self._evict()
+        return row
+
+    def _touch(self, url: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE artifacts SET accessed = ? WHERE url = ?", (time.time(), url))
+
+    def _evict(self) -> None:
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for row in self._conn.execute("SELECT url, file, size FROM artifacts ORDER BY accessed").fetchall():
+                if total <= self.max_bytes:
+                    break
+                (self.root / row["file"]).unlink(missing_ok=True)
+                self._conn.execute("DELETE FROM artifacts WHERE url = ?", (row["url"],))
+                self._conn.execute("DELETE FROM extracts WHERE url = ?", (row["url"],))
+                total -= row["size"]
+                self.counters["evicted"] += 1
+
+    # ---------- memoized extraction ----------
+    def text(self, url: str, kind: str, extract: Callable[[Dict[str, Any]], str]) -> str:
+        """
+        ``extract(record)`` runs once per (url, kind, artifact version).
+        """
+        row = self.fetch(url)
+        with self._lock:
+            memo = self._conn.execute(
+                "SELECT text FROM extracts WHERE url = ? AND kind = ? AND version = ?", (url, kind, row["version"])
+            ).fetchone()
+        if memo is not None:
+            self.counters["memo_hits"] += 1
+            return memo["text"]
+        def run() -> str:
+            self.counters["extracted"] += 1
+            return extract(row)
+        text = self._flight.do((url, kind, row["version"]), run)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO extracts VALUES (?, ?, ?, ?)", (url, kind, row["version"], text))
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts").fetchone()
+        return {"artifacts": n, "bytes": total, **self.counters}
+
+
+# ===================== Per-process singleton =====================
+_STORE: Optional[ArtifactStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def artifact_store() -> ArtifactStore:
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = ArtifactStore(
+                    max_bytes=int(getattr(settings, "FUSION_ARTIFACT_MAX_BYTES", 200 * 1024 * 1024)),
+                    max_file_bytes=int(getattr(settings, "FUSION_RAG_MAX_BYTES", 20 * 1024 * 1024)),
+                    fresh_for=float(getattr(settings, "FUSION_ARTIFACT_FRESH_FOR", 3600)),
+                )
+    return _STORE
@@ -0,0 +1,406 @@
+"""
+Fingerprinted, precompressed bundles for the inline CSS / JS of the page templates.
+
+``manage.py build_assets`` reads each page template, moves its top-level
+``<style>`` / ``<script>`` blocks (plain ones: no ``src``, no ``type``, no
+template tags inside; JSON-LD and small blocks stay inline) into
+``<template>.<n>.<hash>.css|js`` files, minified, with ``.gz`` / ``.br``
+variants (brotli when the ``brotli`` package is installed), and writes a copy
+of the template referencing them in place (same position, so execution order
+is unchanged) plus ``manifest.json``, all under FUSION_ASSETS_DIR.
+
+At runtime:
+- ``page_template(name)`` returns the built copy while it matches the source
+  template (mtime / size recorded in the manifest), the source otherwise: an
+  edited template is served as-is until the next build.
+- ``serve_asset`` (``/assets/<name>``) returns a bundle listed in the manifest,
+  negotiating ``br`` / ``gzip`` from Accept-Encoding, with
+  ``Cache-Control: public, max-age=..., immutable`` (the name changes with the
+  content) and an ETag.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.http import Http404, HttpRequest, HttpResponse, HttpResponseNotModified
+from django.urls import reverse
+from django.utils.http import parse_etags
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+PAGE_TEMPLATES = ("bluecollar_main_platform.html", "bluecollar_website_connected.html")
+BUILT_PREFIX = "built"
+MIN_BLOCK_BYTES = 1024   # smaller blocks stay inline: not worth a request
+CONTENT_TYPES = {"css": "text/css; charset=utf-8", "js": "text/javascript; charset=utf-8"}
+
+_BLOCK = re.compile(r"<(script|style)\b([^>]*)>(.*?)</\1\s*>", re.S | re.I)
+
+
+def assets_dir() -> Path:
+    return Path(getattr(settings, "FUSION_ASSETS_DIR", Path(settings.BASE_DIR) / "build" / "assets"))
+
+
+# ===================== Minifiers =====================
+def minify_css(src: str) -> str:
+    """
+    Drops comments and collapses whitespace (none kept around ``{ } ; , >``); strings are left intact.
+    """
+    out: List[str] = []
+    i, n = 0, len(src)
+    space = False
+    while i < n:
+        c = src[i]
+        if c == "/" and src.startswith("/*", i):
+            end = src.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            space = True
+            continue
+        if c in "\"'":
+            j = i + 1
+            while j < n and src[j] != c:
+                j += 2 if src[j] == "\\" else 1
+            if space and out and out[-1] not in "{};,>":
+                out.append(" ")
+            space = False
+            out.append(src[i:j + 1])
+            i = j + 1
+            continue
+        if c.isspace():
+            space = True
+            i += 1
+            continue
+        if c in "{};,>":
+            if c == "}" and out and out[-1] == ";":
+                out.pop()
+        elif space and out and out[-1][-1] not in "{};,>":
+            out.append(" ")
+        space = False
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+
+_REGEX_AFTER = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void", "throw",
+                   "yield", "await", "instanceof"}
+
+
+def _word(c: str) -> bool:
+    return c.isalnum() or c in "_$\\" or ord(c) > 127
+
+
+def minify_js(src: str) -> str:
+    """
+    Conservative: removes comments, indentation and blank lines and collapses
+    spaces. Strings, template literals and regex literals are copied verbatim,
+    and a line break is kept wherever automatic semicolon insertion could
+    depend on it. Identifiers are not renamed.
+    """
+    out: List[str] = []
+    i, n = 0, len(src)
+    pending = ""          # "", " " or "\n"
+    last = ""             # last significant character emitted
+    word = ""             # identifier being / last emitted
+    braces: List[int] = []  # open "{" per enclosing template literal substitution
+
+    def emit(text: str, nxt: str) -> None:
+        nonlocal pending, last
+        if pending and out:
+            if pending == "\n" and last not in "{;,([" and nxt not in ")]},;.":
+                out.append("\n")
+            elif (_word(last) and _word(nxt)) or (last == nxt and last in "+-") or (last + nxt in ("//", "/*", "<!", "->")):
+                out.append(" ")
+        pending = ""
+        out.append(text)
+        last = text[-1]
+
+    def template(j: int) -> Tuple[int, bool]:
+        # From just after "`" (or a substitution's "}"): index after the literal part, True if a "${" opened.
+        while j < n:
+            ch = src[j]
+            if ch == "\\":
+                j += 2
+            elif ch == "`":
+                return j + 1, False
+            elif ch == "$" and src.startswith("${", j):
+                return j + 2, True
+            else:
+                j += 1
+        return n, False
+
+    while i < n:
+        c = src[i]
+        if c.isspace():
+            pending = "\n" if (c == "\n" or pending == "\n") else " "
+            i += 1
+            continue
+        if c == "/" and src.startswith("//", i):
+            end = src.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        if c == "/" and src.startswith("/*", i):
+            end = src.find("*/", i + 2)
+            chunk = src[i:n if end < 0 else end]
+            if "\n" in chunk:
+                pending = "\n"
+            elif not pending:
+                pending = " "
+            i = n if end < 0 else end + 2
+            continue
+        if c in "\"'":
+            j = i + 1
+            while j < n and src[j] != c and src[j] != "\n":
+                j += 2 if src[j] == "\\" else 1
+            emit(src[i:j + 1], c)
+            word = ""
+            i = j + 1
+            continue
+        if c == "`" or (c == "}" and braces and braces[-1] == 0):
+            if c == "}":
+                braces.pop()
+            j, opened = template(i + 1)
+            emit(src[i:j], c)
+            if opened:
+                braces.append(0)
+            word = ""
+            i = j
+            continue
+        if c == "/" and (last in _REGEX_AFTER or not last or word in _REGEX_KEYWORDS):
+            j, klass = i + 1, False
+            while j < n and src[j] != "\n":
+                ch = src[j]
+                if ch == "\\":
+                    j += 2
+                    continue
+                if ch == "[":
+                    klass = True
+                elif ch == "]":
+                    klass = False
+                elif ch == "/" and not klass:
+                    break
+                j += 1
+            emit(src[i:j + 1], c)
+            word = ""
+            i = j + 1
+            continue
+        if braces and c in "{}":
+            braces[-1] += 1 if c == "{" else -1
+        word = (word if _word(last) and not pending else "") + c if _word(c) else ""
+        emit(c, c)
+        i += 1
+    return "".join(out).strip()
+
+
+# ===================== Build =====================
+def _compress(data: bytes) -> Dict[str, bytes]:
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    return variants
+
+
+def _extractable(attrs: str, body: str) -> bool:
+    return not attrs.strip() and len(body) >= MIN_BLOCK_BYTES and "{%" not in body and "{{" not in body
+
+
+def build(template_dirs: List[Path], names: Tuple[str, ...] = PAGE_TEMPLATES) -> Dict[str, Any]:
+    """
+    Builds the bundles and template copies of ``names``; returns the new manifest.
+    """
+    root = assets_dir()
+    (root / "files").mkdir(parents=True, exist_ok=True)
+    previous = _read_manifest(root)
+    manifest: Dict[str, Any] = {"templates": {}, "files": {}}
+
+    for name in names:
+        source = next((d / name for d in template_dirs if (d / name).exists()), None)
+        if source is None:
+            raise FileNotFoundError(f"Template not found: {name}")
+        text = source.read_text(encoding="utf-8")
+        stem = Path(name).stem
+        index = 0
+
+        def extract(m: re.Match) -> str:
+            nonlocal index
+            tag, attrs, body = m.group(1).lower(), m.group(2), m.group(3)
+            if not _extractable(attrs, body):
+                return m.group(0)
+            ext = "css" if tag == "style" else "js"
+            data = (minify_css(body) if ext == "css" else minify_js(body)).encode("utf-8")
+            digest = hashlib.sha256(data).hexdigest()
+            fname = f"{stem}.{index}.{digest[:12]}.{ext}"
+            index += 1
+            (root / "files" / fname).write_bytes(data)
+            entry = {"sha256": digest, "content_type": CONTENT_TYPES[ext], "size": len(data), "source_size": len(body.encode("utf-8"))}
+            for enc, blob in _compress(data).items():
+                (root / "files" / f"{fname}.{'gz' if enc == 'gzip' else enc}").write_bytes(blob)
+                entry[enc] = len(blob)
+            manifest["files"][fname] = entry
+            url = reverse("fusion_asset", args=[fname])
+            if ext == "css":
+                return f'<link rel="stylesheet" href="{url}">'
+            return f'<script src="{url}"></script>'
+
+        built = _BLOCK.sub(extract, text)
+        target = root / "templates" / BUILT_PREFIX / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(built, encoding="utf-8")
+        st = source.stat()
+        manifest["templates"][name] = {
+            "source": str(source), "mtime_ns": st.st_mtime_ns, "size": st.st_size,
+            "template": f"{BUILT_PREFIX}/{name}", "bytes": len(built.encode("utf-8")), "source_bytes": st.st_size,
+        }
+
+    # Keep the previous generation: pages rendered just before a deploy still reference it.
+    keep = set(manifest["files"]) | set(previous.get("files", {}))
+    for path in (root / "files").iterdir():
+        if path.name.removesuffix(".gz").removesuffix(".br") not in keep:
+            path.unlink(missing_ok=True)
+    manifest["previous"] = {k: v for k, v in previous.get("files", {}).items() if k not in manifest["files"]}
+    tmp = root / "manifest.json.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    tmp.replace(root / "manifest.json")
+    _ASSETS.reset()
+    return manifest
+
+
+def _read_manifest(root: Path) -> Dict[str, Any]:
+    try:
+        return json.loads((root / "manifest.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+# ===================== Runtime =====================
+class Assets:
+    """
+    Manifest (reloaded when the file changes) and a small cache of served bodies.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stamp: Optional[int] = None
+        self._manifest: Dict[str, Any] = {}
+        self._bodies: Dict[Tuple[str, str], bytes] = {}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stamp = None
+            self._bodies.clear()
+
+    def manifest(self) -> Dict[str, Any]:
+        path = assets_dir() / "manifest.json"
+        try:
+            stamp = path.stat().st_mtime_ns
+        except OSError:
+            stamp = 0
+        with self._lock:
+            if stamp != self._stamp:
+                self._manifest = _read_manifest(path.parent) if stamp else {}
+                self._bodies.clear()
+                self._stamp = stamp
+            return self._manifest
+
+    def file(self, name: str) -> Optional[Dict[str, Any]]:
+        m = self.manifest()
+        return m.get("files", {}).get(name) or m.get("previous", {}).get(name)
+
+    def body(self, name: str, encoding: str) -> bytes:
+        key = (name, encoding)
+        with self._lock:
+            data = self._bodies.get(key)
+        if data is None:
+            suffix = {"gzip": ".gz", "br": ".br"}.get(encoding, "")
+            data = (assets_dir() / "files" / f"{name}{suffix}").read_bytes()
+            with self._lock:
+                self._bodies[key] = data
+        return data
+
+
+_ASSETS = Assets()
+
+
+def page_template(name: str) -> str:
+    """
+    Template to render for page ``name``: the built copy when it is current.
+    """
+    if not getattr(settings, "FUSION_ASSETS_ENABLED", True):
+        return name
+    entry = _ASSETS.manifest().get("templates", {}).get(name)
+    if not entry:
+        return name
+    try:
+        st = Path(entry["source"]).stat()
+    except OSError:
+        return name
+    if (st.st_mtime_ns, st.st_size) != (entry["mtime_ns"], entry["size"]):
+        return name
+    return entry["template"]
+
+
+def negotiate(accept_encoding: str, available: Tuple[str, ...]) -> str:
+    """
+    Best of ``available`` ("br" before "gzip") accepted with q > 0, or "" (identity).
+    """
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token.strip().lower()] = q
+    for enc in ("br", "gzip"):
+        if enc in available and accepted.get(enc, accepted.get("*", 0.0)) > 0:
+            return enc
+    return ""
+
+
+def etag_matches(if_none_match: Optional[str], *etags: str) -> bool:
+    """
+    ``If-None-Match`` check with weak comparison: the header is a list (or
+    ``*``), and a ``W/`` prefix (nginx weakens ETags when it compresses) is ignored.
+    """
+    sent = parse_etags(if_none_match or "")
+    if sent == ["*"]:
+        return True
+    ours = {t.removeprefix("W/") for t in etags}
+    return any(t.removeprefix("W/") in ours for t in sent)
+
+
+def serve_asset(request: HttpRequest, name: str) -> HttpResponse:
+    entry = _ASSETS.file(name)
+    if entry is None:
+        raise Http404("Unknown asset")
+    encoding = negotiate(request.headers.get("Accept-Encoding", ""), tuple(e for e in ("br", "gzip") if e in entry))
+    etag = f'"{entry["sha256"][:16]}{"-" + encoding if encoding else ""}"'
+    max_age = int(getattr(settings, "FUSION_ASSETS_MAX_AGE", 365 * 86400))
+    headers = {"Cache-Control": f"public, max-age={max_age}, immutable", "Vary": "Accept-Encoding", "ETag": etag}
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        response = HttpResponseNotModified()
+    else:
+        try:
+            response = HttpResponse(_ASSETS.body(name, encoding), content_type=entry["content_type"])
+        except OSError:
+            log.warning("Asset %s listed in the manifest but missing on disk", name)
+            raise Http404("Unknown asset")
+        if encoding:
+            response["Content-Encoding"] = encoding
+    for k, v in headers.items():
+        response[k] = v
+    return response
@@ -0,0 +1,117 @@
+"""
+Non-blocking twin of fusion/http_client.py, built on ``httpx.AsyncClient``.
+
+Used by fusion/async_views.py when the project is served through config/asgi.py:
+a single event loop can then keep hundreds of Service Fusion calls in flight.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import weakref
+from typing import Any, Optional
+
+import httpx
+from django.conf import settings
+
+from .metrics import timed
+from .ratelimit import get_limiter
+
+
+class AsyncServiceFusionClient:
+    """
+    Pooled ``httpx.AsyncClient`` per event loop (an AsyncClient must not be shared
+    across loops). Pool sizing and timeouts mirror ServiceFusionClient.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_version: str = "v1",
+        *,
+        pool_connections: int = 4,
+        pool_maxsize: int = 20,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 25.0,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.api_version = api_version.strip("/")
+        self.limits = httpx.Limits(
+            max_connections=pool_connections * pool_maxsize,
+            max_keepalive_connections=pool_maxsize,
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        c = self._clients.get(loop)
+        if c is None or c.is_closed:
+            with self._lock:
+                c = self._clients.get(loop)
+                if c is None or c.is_closed:
+                    c = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+                    self._clients[loop] = c
+        return c
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{self.api_version}{path if path.startswith('/') else '/' + path}"
+
+    async def request(self, method: str, url: str, *, paced: bool = True, **kwargs: Any) -> httpx.Response:
+        """
+        Same contract as ServiceFusionClient.request (``paced=False``: OAuth / LLM, outside the SF budget).
+        """
+        if not url.startswith(("http://", "https://")):
+            url = self.url(url)
+        if not paced:
+            return await self.client.request(method, url, **kwargs)
+        bucket, policy = get_limiter()
+        attempt = 0
+        while True:
+            if bucket is not None:
+                with timed("ratelimit"):
+                    await bucket.aacquire()
+            with timed("servicefusion") as t:
+                r = await self.client.request(method, url, **kwargs)
+                t.failed = r.status_code >= 400
+            wait = policy.delay(r.status_code, r.headers, attempt)
+            if wait is None:
+                return r
+            if bucket is not None:
+                bucket.pause(wait)
+            if not policy.retryable(method, attempt):
+                return r
+            await r.aclose()
+            if bucket is None:
+                with timed("ratelimit"):
+                    await asyncio.sleep(wait)
+            attempt += 1
+
+    async def aclose(self) -> None:
+        loop = asyncio.get_running_loop()
+        c = self._clients.pop(loop, None)
+        if c is not None:
+            await c.aclose()
+
+
+# ===================== Per-process singleton =====================
+_CLIENT: Optional[AsyncServiceFusionClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_async_client() -> AsyncServiceFusionClient:
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = AsyncServiceFusionClient(
+                    getattr(settings, "SERVICE_FUSION_BASE_URL", "") or "https://api.servicefusion.com",
+                    (getattr(settings, "SERVICE_FUSION_API_PREFIX", "") or "/v1"),
+                    pool_connections=int(getattr(settings, "HTTP_POOL_CONNECTIONS", 4)),
+                    pool_maxsize=int(getattr(settings, "HTTP_POOL_MAXSIZE", 20)),
+                    connect_timeout=float(getattr(settings, "HTTP_CONNECT_TIMEOUT", 5)),
+                    read_timeout=float(getattr(settings, "HTTP_READ_TIMEOUT", getattr(settings, "HTTP_TIMEOUT", 25))),
+                )
+    return _CLIENT
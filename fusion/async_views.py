@@ -0,0 +1,349 @@
+"""
+Async versions of the Service Fusion JSON endpoints.
+
+Same contracts as fusion/views.py, but every Service Fusion / LLM round trip is
+awaited on fusion/async_client.py instead of blocking a worker thread. Blocking
+pieces that have no async equivalent (RAG artifacts, SMTP, template render)
+run in a thread through ``sync_to_async``. Routed by fusion/urls.py when
+FUSION_ASYNC_VIEWS is on (default under config/asgi.py).
+"""
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpRequest, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from .async_client import get_async_client
+from .breaker import CircuitOpenError, breaker
+from .cache import MISS, response_cache
+from .idempotency import idempotent
+from .llm_cache import llm_cache
+from .metrics import timed
+from .oauth import get_token_provider
+from .pipeline import Pipeline
+from . import bulk, typeahead
+from .sf_models import CUSTOMER_DETAIL, CUSTOMER_SEARCH, JOB_CREATED, JOB_DETAIL, Customer, Job, dumps, json_response, loads
+from .views import (
+    _INFLIGHT_GETS, _bulk_items, _bulk_lines, _customer_email_ctx, _enrichment_data, _enrichment_pipeline, _get_key,
+    _get_oauth_token, _headers_json, _index_customers, _index_search, _invalidate_customer, _job_response, _json_error,
+    _llm_headers, _merge_timings, _norm, _prepare_tech_notes, _render_email, _safe_get, _schedule_enrichment,
+    _search_key, _send_html_email, _url, build_sf_job_payload,
+)
+
+log = logging.getLogger(__name__)
+
+# ===================== HTTP layer (async) =====================
+async def _atoken() -> str:
+    # In-memory token read on the loop; only a missing / expiring one (store read, refresh) goes to a thread.
+    tok = get_token_provider().cached_token()
+    if tok is not None:
+        return tok
+    return await sync_to_async(_get_oauth_token, thread_sensitive=False)()
+
+async def _asf_request(method: str, path: str, **kwargs: Any) -> httpx.Response:
+    with breaker("servicefusion").guard():  # spans as in views._sf_request
+        tok = await _atoken()
+        r = await get_async_client().request(method, _url(path), headers=_headers_json(tok), **kwargs)
+        if r.status_code == 401:
+            # Same as views._sf_request: revoked token, refreshed once for every worker.
+            log.warning("Service Fusion 401 on %s %s: refreshing the OAuth token", method, path)
+            await r.aclose()
+            await sync_to_async(get_token_provider().invalidate, thread_sensitive=False)(tok)
+            r = await get_async_client().request(method, _url(path), headers=_headers_json(await _atoken()), **kwargs)
+        r.raise_for_status()
+    return r
+
+async def _aget(path: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+    return await _asf_request("GET", path, params=params or {})
+
+async def _aget_json(path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+    # Coalesced with identical in-flight GETs of the same event loop (see views._get_json).
+    async def fetch():
+        r = await _aget(path, params)
+        return loads(r.content) if r.content else {}
+    return await _INFLIGHT_GETS.ado(_get_key(path, params), fetch)
+
+async def _apost(path: str, json_body: Dict[str, Any], params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+    return await _asf_request("POST", path, content=dumps(json_body), params=params or {})
+
+async def _apatch(path: str, json_body: Dict[str, Any]) -> httpx.Response:
+    return await _asf_request("PATCH", path, content=dumps(json_body))
+
+async def _aput(path: str, json_body: Dict[str, Any]) -> httpx.Response:
+    return await _asf_request("PUT", path, content=dumps(json_body))
+
+# ===================== API (async) =====================
+async def aapi_customers_search(q: str) -> list[dict]:
+    # In-memory index lookup: cheap enough to run on the event loop.
+    hits = _index_search(q, full_only=True)
+    if hits:
+        return hits
+    cache = response_cache()
+    key = cache.key("customers_search", _search_key(q))  # one generation read (see ResponseCache.store)
+    items = cache.lookup("customers_search", key=key)
+    if items is MISS:
+        items = await _afetch_customers_search(q)
+        cache.store("customers_search", items, key=key)
+        await sync_to_async(_index_customers, thread_sensitive=False)(items)
+    return items
+
+async def _afetch_customers_search(q: str) -> list[dict]:
+    data = await _aget_json("/customers", params=CUSTOMER_SEARCH.params(**{"filters[name]": q, "per-page": 25}))
+    return [c.to_dict() for c in CUSTOMER_SEARCH.parse_items(data)]
+
+async def _atypeahead_local(q: str) -> tuple:
+    cached = response_cache().lookup("customers_search", _search_key(q))
+    if cached is not MISS:
+        return cached, True
+    return _index_search(q), False
+
+async def _atypeahead_remote(q: str) -> list[dict]:
+    cache = response_cache()
+    key = cache.key("customers_search", _search_key(q))
+    items = await _afetch_customers_search(q)
+    cache.store("customers_search", items, key=key)
+    await sync_to_async(_index_customers, thread_sensitive=False)(items)
+    return items
+
+async def aapi_customer_by_id(cid: int | str) -> Customer:
+    cache = response_cache()
+    key = cache.key("customer", str(cid))
+    data = cache.lookup("customer", key=key)
+    if data is MISS:
+        data = await _afetch_customer_by_id(cid)
+        cache.store("customer", data, key=key)
+    return data
+
+async def _afetch_customer_by_id(cid: int | str) -> Customer:
+    return CUSTOMER_DETAIL.parse(await _aget_json(f"/customers/{cid}", params=CUSTOMER_DETAIL.params()))
+
+async def aapi_job_by_id(jid: int | str) -> Job:
+    return JOB_DETAIL.parse(await _aget_json(f"/jobs/{jid}", params=JOB_DETAIL.params()))
+
+async def aapi_customer_create_minimal(customer_name: str) -> dict:
+    r = await _apost("/customers", {"customer_name": _norm(customer_name)})
+    _invalidate_customer()
+    return r.json() if r.content else {}
+
+async def aapi_location_create_for_customer(customer_id: Any, loc: Dict[str, Any]) -> Optional[dict]:
+    body = {
+        "customer_id": customer_id,
+        "nickname": _norm(loc.get("name") or "Primary"),
+        "street_1": _norm(loc.get("address") or loc.get("street_1")),
+        "city": _norm(loc.get("city")),
+        "state_prov": _norm(loc.get("state")),
+        "postal_code": _norm(loc.get("zip")),
+        "is_primary": True,
+        "is_bill_to": True,
+    }
+    body = {k: v for k, v in body.items() if v not in (None, "", [])}
+    if "customer_id" not in body:
+        return None
+    try:
+        r = await _apost("/locations", body)
+        _invalidate_customer(customer_id)
+        return r.json() if r.content else {}
+    except Exception:
+        # Same best-effort contract as the sync version.
+        return None
+
+async def aapi_job_create_strict(form_payload: Dict[str, Any], tech_notes: str = None) -> Dict[str, Any]:
+    payload = build_sf_job_payload(form_payload, tech_notes)
+    r = await _apost("/jobs", payload, params=JOB_CREATED.params())
+    return r.json() if r.content else {}
+
+async def aapi_job_patch_description(job_id: Any, description: str) -> None:
+    try:
+        await _apatch(f"/jobs/{job_id}", {"description": description})
+    except Exception:
+        pass
+
+async def aapi_job_add_note(job_id: Any, text: str) -> None:
+    try:
+        await _apost(f"/jobs/{job_id}/notes", {"note": text, "visibility": "internal"})
+    except Exception:
+        pass
+
+# ===================== LLM (async) =====================
+@timed("llm")
+async def acall_llm(name: str, title: str, description: str) -> Dict[str, Any]:
+    url = getattr(settings, "LLM_API_URL", "")
+    if not url:
+        return {}
+    cache = llm_cache()
+    hit = await sync_to_async(cache.get, thread_sensitive=False)(name, title, description) if cache else None
+    if hit is not None:
+        return hit
+    try:
+        with breaker("llm").guard():
+            # Pooled client, outside the Service Fusion rate limit: same as call_llm.
+            r = await get_async_client().request("POST", url, paced=False, headers=_llm_headers(), json={
+                "name": name or "Client",
+                "title": title or "Note",
+                "description": description or "",
+            })
+            r.raise_for_status()
+    except CircuitOpenError as e:
+        log.warning("%s; job created without LLM notes.", e)
+        return {}
+    data = r.json() if r.content else {}
+    links = data.get("links") or {}
+    rag_url = links.get("docx") or links.get("json")
+    result = {"links": links, "rag_url": rag_url, "raw": data}
+    if cache:
+        await sync_to_async(cache.put, thread_sensitive=False)(name, title, description, result)
+    return result
+
+async def _atech_notes(links: Dict[str, Any], rag: Optional[str]) -> Optional[str]:
+    # Artifact downloads go through the on-disk ArtifactStore (fusion/artifacts.py).
+    return await sync_to_async(_prepare_tech_notes, thread_sensitive=False)(links, rag)
+
+async def _asend_html_email(subject: str, html: str, to_email: str) -> bool:
+    return await sync_to_async(_send_html_email, thread_sensitive=False)(subject, html, to_email)
+
+# ===================== API JSON (front, async) =====================
+async def sf_search_customers(request: HttpRequest):
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    q = (request.GET.get("q") or "").strip()
+    if not q:
+        return JsonResponse([], safe=False)
+    try:
+        items = await aapi_customers_search(q)
+        items = [dict(it, name=it["customer_name"]) if "name" not in it and "customer_name" in it else it for it in items]
+        return json_response(items)
+    except httpx.HTTPStatusError as he:
+        return _json_error(he, "customers", he.response)
+    except Exception as e:
+        return _json_error(e, "customers")
+
+async def sf_typeahead_customers(request: HttpRequest):
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    q = (request.GET.get("q") or "").strip()
+    return typeahead.response(typeahead.astream(q, typeahead.session_key(request), _atypeahead_local, _atypeahead_remote))
+
+async def sf_get_customer(request: HttpRequest, cid: str):
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    try:
+        return json_response(await aapi_customer_by_id(cid))
+    except httpx.HTTPStatusError as he:
+        return _json_error(he, "customers", he.response)
+    except Exception as e:
+        return _json_error(e, "customers")
+
+async def sf_get_job(request: HttpRequest, jid: str):
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    try:
+        return json_response(await aapi_job_by_id(jid))
+    except httpx.HTTPStatusError as he:
+        return _json_error(he, "jobs", he.response)
+    except Exception as e:
+        return _json_error(e, "jobs")
+
+@csrf_exempt
+@idempotent("sf_create_customer")
+async def sf_create_customer(request: HttpRequest):
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    try:
+        payload = json.loads(request.body.decode("utf-8") or "{}")
+    except Exception:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    try:
+        cname = _norm(payload.get("customer_name"))
+        if not cname:
+            return JsonResponse({"error": "customer_name is required"}, status=400)
+
+        cust = await aapi_customer_create_minimal(cname)
+        cust_id = _safe_get(cust, "id") or _safe_get(cust, "customer_id")
+        if not cust_id:
+            return JsonResponse({"error": "Create customer failed", "raw": cust}, status=502)
+
+        loc = payload.get("service_location") or {}
+        if loc:
+            await aapi_location_create_for_customer(cust_id, loc)
+
+        try:
+            full = (await aapi_customer_by_id(cust_id)).to_dict()
+        except Exception:
+            full = {"id": cust_id, "customer_name": cname}
+        await sync_to_async(_index_customers, thread_sensitive=False)([full])
+
+        to_email = _safe_get(payload, "email", "to")
+        html = await sync_to_async(_render_email)(_customer_email_ctx(payload, full, cname))
+        await _asend_html_email(f"[Customer Created] {cname}", html, to_email or getattr(settings, "WORKORDER_RECIPIENT", ""))
+
+        return json_response(full)
+
+    except httpx.HTTPStatusError as he:
+        return _json_error(he, "customers", he.response)
+    except Exception as e:
+        return _json_error(e, "customers")
+
+@csrf_exempt
+@idempotent("sf_create_job")
+async def sf_create_job(request: HttpRequest):
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    try:
+        payload = json.loads(request.body.decode("utf-8") or "{}")
+    except Exception:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    customer_name = _norm(payload.get("customer_name"))
+    category = payload.get("category") or payload.get("category_ui") or ""
+    priority = payload.get("priority") or "Normal"
+    problem = payload.get("problem_details") or ""
+
+    async def _llm(r):
+        return await acall_llm(customer_name or "Client", f"{category}/{priority}", problem)
+
+    async def _notes(r):
+        return await _atech_notes(r["llm"].get("links", {}), r["llm"].get("rag_url"))
+
+    async def _job(r):
+        return await aapi_job_create_strict(payload, r["tech_notes"])
+
+    # Same graph as the sync view; the token refresh runs in a thread.
+    p = Pipeline()
+    p.stage("oauth", lambda r: _get_oauth_token())
+    p.stage("llm", _llm)
+    p.stage("tech_notes", _notes, after=("llm",))
+    p.stage("job", _job, after=("oauth", "tech_notes"))
+
+    try:
+        r = await p.arun()
+    except httpx.HTTPStatusError as he:
+        return _json_error(he, "jobs", he.response)
+    except Exception as e:
+        return _json_error(e, "jobs")
+
+    data = _enrichment_data(payload, r, category, priority)
+    task_id = await sync_to_async(_schedule_enrichment, thread_sensitive=False)(data)
+    if task_id:
+        return _job_response(data, p.timings, task_id=task_id)
+
+    # Inline fallback (background queue disabled or full): blocking steps in a thread.
+    e = _enrichment_pipeline(data)
+    await sync_to_async(e.run, thread_sensitive=False)()
+    return _job_response(data, _merge_timings(p.timings, e.timings), email_ok=bool(e.results.get("email")))
+
+@csrf_exempt
+async def sf_create_jobs_bulk(request: HttpRequest):
+    """
+    Same batch as the sync view; its blocking iterator is consumed off the event loop, line by line.
+    """
+    items, error = _bulk_items(request)
+    if error is not None:
+        return error
+    return bulk.response(bulk.aiter_lines(_bulk_lines(items)))
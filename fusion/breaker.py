@@ -0,0 +1,192 @@
+"""
+Circuit breakers for the external dependencies (Service Fusion, LLM, SMTP).
+
+closed ──(N consecutive failures)──▶ open ──(reset_timeout)──▶ half-open
+half-open: a single probe call goes through; success closes the circuit,
+failure re-opens it. While open, calls fail immediately with
+CircuitOpenError instead of waiting for the dependency's timeout.
+
+    with breaker("servicefusion").guard():
+        r = get_client().request(...)
+        r.raise_for_status()
+
+Only outages count as failures (connection errors, timeouts, 5xx); 4xx
+responses are the caller's problem and leave the breaker alone. State is per
+worker process and is published by ``/healthz``.
+"""
+from __future__ import annotations
+
+import contextlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator
+
+from django.conf import settings
+
+from .ratelimit import RateLimitExceeded
+
+log = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "servicefusion": {"failure_threshold": 5, "reset_timeout": 30, "critical": True},
+    "llm": {"failure_threshold": 3, "reset_timeout": 60, "critical": False},
+    "smtp": {"failure_threshold": 3, "reset_timeout": 120, "critical": False},
+}
+
+
+class CircuitOpenError(RuntimeError):
+    def __init__(self, name: str, retry_in: float) -> None:
+        super().__init__(f"{name} unavailable (circuit open, retry in {retry_in:.0f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def is_outage(exc: BaseException) -> bool:
+    """
+    Connection / timeout errors and 5xx count; client errors (4xx) do not.
+    """
+    if not isinstance(exc, Exception):
+        return False  # cancellation, KeyboardInterrupt...
+    resp = getattr(exc, "response", None)
+    status = getattr(resp, "status_code", None)
+    if status is not None:
+        return status >= 500
+    # Local throttling and parsing errors say nothing about the dependency's health.
+    return not isinstance(exc, (RateLimitExceeded, ValueError, KeyError, TypeError))
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, *, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 critical: bool = False, is_failure: Callable[[BaseException], bool] = is_outage) -> None:
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.critical = critical
+        self.is_failure = is_failure
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    # ---------- transitions ----------
+    def before(self) -> None:
+        """
+        Raises CircuitOpenError when the call must not be attempted.
+        """
+        with self._lock:
+            self.counters["calls"] += 1
+            if self.state == OPEN:
+                left = self.opened_at + self.reset_timeout - time.monotonic()
+                if left > 0:
+                    self.counters["rejected"] += 1
+                    raise CircuitOpenError(self.name, left)
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    self.counters["rejected"] += 1
+                    raise CircuitOpenError(self.name, 1.0)
+                self._probing = True
+
+    def success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                log.info("Circuit %s: closed", self.name)
+            self.state, self.failures, self._probing = CLOSED, 0, False
+
+    def failure(self) -> None:
+        with self._lock:
+            self.counters["failures"] += 1
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.counters["opened"] += 1
+                    log.error("Circuit %s: open for %.0fs after %d failure(s)", self.name, self.reset_timeout, self.failures)
+                self.state, self.opened_at, self._probing = OPEN, time.monotonic(), False
+
+    def release(self) -> None:
+        # The probe ended with a non-outage error: let the next call probe again.
+        with self._lock:
+            self._probing = False
+
+    @contextlib.contextmanager
+    def guard(self) -> Iterator[None]:
+        self.before()
+        try:
+            yield
+        except CircuitOpenError:
+            self.release()
+            raise
+        except BaseException as e:
+            if self.is_failure(e):
+                self.failure()
+            else:
+                self.release()
+            raise
+        else:
+            self.success()
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        with self.guard():
+            return fn(*args, **kwargs)
+
+    # ---------- state ----------
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == OPEN and time.monotonic() < self.opened_at + self.reset_timeout
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {
+                "state": self.state,
+                "critical": self.critical,
+                "consecutive_failures": self.failures,
+                **self.counters,
+            }
+            if self.state == OPEN:
+                out["retry_in"] = round(max(0.0, self.opened_at + self.reset_timeout - time.monotonic()), 1)
+            return out
+
+
+# ===================== Registry =====================
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def _config(name: str) -> Dict[str, Any]:
+    cfg = dict(DEFAULTS.get(name, {}))
+    cfg.update((getattr(settings, "FUSION_BREAKERS", {}) or {}).get(name, {}))
+    return cfg
+
+
+def breaker(name: str) -> CircuitBreaker:
+    b = _BREAKERS.get(name)
+    if b is None:
+        with _BREAKERS_LOCK:
+            b = _BREAKERS.get(name)
+            if b is None:
+                b = _BREAKERS[name] = CircuitBreaker(name, **_config(name))
+    return b
+
+
+def health() -> Dict[str, Any]:
+    """
+    ``{"status": "ok" | "degraded" | "down", "breakers": {...}}``;
+    "down" when a critical dependency's circuit is open.
+    """
+    for name in DEFAULTS:
+        breaker(name)
+    snaps = {name: b.snapshot() for name, b in sorted(_BREAKERS.items())}
+    is_open = {name: b.is_open for name, b in _BREAKERS.items()}
+    if any(is_open[n] and s["critical"] for n, s in snaps.items()):
+        status = "down"
+    elif any(is_open.values()):
+        status = "degraded"
+    else:
+        status = "ok"
+    return {"status": status, "breakers": snaps}
@@ -0,0 +1,212 @@
+"""
+Batch work-order intake (``POST /sf/jobs/bulk``).
+
+The body is a JSON array of ``/sf/jobs`` payloads, or NDJSON (one payload
+per line, ``Content-Type: application/x-ndjson``). Items run on a
+per-request pool of FUSION_BULK_CONCURRENCY threads, in the ``background``
+rate-limit lane so interactive requests keep their share of the Service
+Fusion budget. One NDJSON line is streamed back per item as it completes
+(completion order, ``index`` is the position in the batch), then a summary:
+
+    {"index": 3, "ok": true, "job_id": 812, "job_number": "1042", ...}
+    {"index": 0, "ok": false, "error": "customer_name is required"}
+    {"summary": {"total": 40, "ok": 39, "failed": 1, "customers": {...}, "emails": [...], "ms": 5120.4}}
+
+``Once`` runs a keyed call a single time per batch (customer lookup /
+creation per distinct name); concurrent items asking for the same key wait
+for the first one. If the client disconnects, items not started yet are
+dropped; the running ones finish, and ``finish`` still runs over every
+completed item (from a settle thread) so their digest emails go out. Under ASGI, ``aiter_lines`` hands the
+lines over one by one from a worker thread, so they are not buffered.
+"""
+from __future__ import annotations
+
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from .ratelimit import BACKGROUND, lane
+from .sf_models import dumps, loads
+from . import typeahead
+
+log = logging.getLogger(__name__)
+
+Item = Tuple[int, Optional[Dict[str, Any]], Optional[str]]  # (index, payload, parse error)
+
+
+class BatchTooLarge(ValueError):
+    pass
+
+
+def max_items() -> int:
+    return int(getattr(settings, "FUSION_BULK_MAX_ITEMS", 200))
+
+
+# ===================== Input =====================
+def parse(body: bytes, content_type: str = "") -> List[Item]:
+    """
+    JSON array, or NDJSON when the content type says so or the body is not an
+    array. A malformed NDJSON line only fails its own item; a malformed array
+    raises ``ValueError``.
+    """
+    text = body.strip()
+    if text.startswith(b"[") and "ndjson" not in content_type:
+        data = loads(text)
+        items: List[Item] = [(i, p, None) if isinstance(p, dict) else (i, None, "item must be a JSON object")
+                             for i, p in enumerate(data)]
+    else:
+        items = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            i = len(items)
+            try:
+                p = loads(line)
+            except ValueError as e:
+                items.append((i, None, f"invalid JSON: {e}"))
+                continue
+            items.append((i, p, None) if isinstance(p, dict) else (i, None, "item must be a JSON object"))
+    if len(items) > max_items():
+        raise BatchTooLarge(f"{len(items)} items (max {max_items()})")
+    return items
+
+
+# ===================== Once per key =====================
+class Once:
+    """
+    ``get(key, fn)``: the first caller runs ``fn``, the others wait for and
+    share its result (or its exception).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._slots: Dict[Any, Tuple[threading.Event, List[Any]]] = {}
+
+    def get(self, key: Any, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            slot = self._slots.get(key)
+            owner = slot is None
+            if owner:
+                slot = self._slots[key] = (threading.Event(), [])
+        done, box = slot
+        if owner:
+            try:
+                box[:] = [True, fn()]
+            except Exception as e:
+                box[:] = [False, e]
+            finally:
+                done.set()
+        else:
+            done.wait()
+        ok, value = box
+        if not ok:
+            raise value
+        return value
+
+    def results(self) -> Dict[Any, Any]:
+        with self._lock:
+            return {k: box[1] for k, (done, box) in self._slots.items() if done.is_set() and box[0]}
+
+
+# ===================== Run =====================
+def _line(obj: Dict[str, Any]) -> bytes:
+    return dumps(obj) + b"\n"
+
+
+def response(lines: Iterator[bytes]) -> StreamingHttpResponse:
+    return typeahead.response(lines)  # same NDJSON framing: no-store, unbuffered
+
+
+def _guarded(worker: Callable[[Dict[str, Any]], Dict[str, Any]], index: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        with lane(BACKGROUND):
+            out = dict(index=index, ok=True, **worker(payload))
+    except Exception as e:
+        out = {"index": index, "ok": False, "error": str(e)}
+    out["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return out
+
+
+def run(items: Iterable[Item], worker: Callable[[Dict[str, Any]], Dict[str, Any]],
+        finish: Callable[[List[Dict[str, Any]]], Dict[str, Any]], concurrency: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Streams ``worker(payload)`` results (plus index / ok / ms) as they
+    complete, then ``{"summary": finish(results)}`` with the batch totals.
+    """
+    started = time.perf_counter()
+    workers = max(1, concurrency or int(getattr(settings, "FUSION_BULK_CONCURRENCY", 8)))
+    results: List[Dict[str, Any]] = []
+    running: Set[Future] = set()
+    finished = False
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fusion-bulk")
+    try:
+        for index, payload, error in items:
+            if error is not None:
+                results.append({"index": index, "ok": False, "error": error})
+                yield _line(results[-1])
+            else:
+                # Request id / metrics context follow each item into the pool.
+                running.add(pool.submit(contextvars.copy_context().run, _guarded, worker, index, payload))
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for f in done:
+                running.discard(f)  # what is left in ``running`` is not reported yet
+                results.append(f.result())
+                yield _line(results[-1])
+        ok = sum(1 for r in results if r["ok"])
+        summary = {"total": len(results), "ok": ok, "failed": len(results) - ok}
+        finished = True
+        summary.update(finish(results))
+        summary["ms"] = round((time.perf_counter() - started) * 1000, 1)
+        yield _line({"summary": summary})
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)  # client gone: queued items are dropped
+        if not finished:
+            # Not a daemon: the interpreter waits for it, the created jobs still get their email.
+            ctx = contextvars.copy_context()
+            threading.Thread(target=ctx.run, args=(_settle, running, results, finish),
+                             name="fusion-bulk-settle").start()
+
+
+def _settle(running: Set[Future], results: List[Dict[str, Any]], finish: Callable[[List[Dict[str, Any]]], Dict[str, Any]]) -> None:
+    """
+    Client gone mid-batch: waits for the items already running, then runs
+    ``finish`` over everything that completed.
+    """
+    # Futures dropped by shutdown(cancel_futures=True) never count as done for wait().
+    started = [f for f in running if not f.cancelled()]
+    wait(started)
+    results = results + [f.result() for f in started]
+    try:
+        out = finish(results)
+        log.info("Bulk intake: client disconnected after %d item(s); finish ran: %s", len(results), out)
+    except Exception:
+        log.exception("Bulk intake: finish failed after client disconnect")
+
+
+async def aiter_lines(lines: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Async view: each blocking ``next()`` runs in a worker thread, so every line
+    is sent as soon as it is ready (Django would otherwise buffer a sync
+    iterator whole under ASGI).
+    """
+    step = sync_to_async(next, thread_sensitive=False)
+    try:
+        while True:
+            line = await step(lines, None)
+            if line is None:
+                return
+            yield line
+    finally:
+        try:
+            await sync_to_async(lines.close, thread_sensitive=False)()
+        except ValueError:
+            pass  # cancelled mid-step: the generator is still running, it is closed when dropped
@@ -0,0 +1,198 @@
+"""
+Response cache for Service Fusion lookups (customer search / customer detail).
+
+- Bounded in-process LRU with per-entry TTL (default), or any Django cache
+  alias (FUSION_CACHE_BACKEND = "django") to share entries across workers.
+- Per-namespace TTLs; empty results are cached with the shorter negative TTL.
+- Namespaces carry a generation number: ``bump(ns)`` invalidates every key of
+  the namespace at once (e.g. all searches after a customer is created).
+- Hit / miss counters are exposed by ``/sf/stats``.
+
+Cached values are shared between callers: treat them as read-only.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+
+MISS = object()
+
+
+# ===================== Backends =====================
+class LocalLRUBackend:
+    """
+    OrderedDict LRU; ``maxsize`` bounds the number of entries.
+    """
+
+    def __init__(self, maxsize: int = 2048) -> None:
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._gens: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return MISS
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return MISS
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def generation(self, ns: str) -> int:
+        return self._gens.get(ns, 0)
+
+    def bump(self, ns: str) -> None:
+        with self._lock:
+            self._gens[ns] = self._gens.get(ns, 0) + 1
+
+    def size(self) -> int:
+        return len(self._data)
+
+
+class DjangoCacheBackend:
+    """
+    Delegates to ``django.core.cache.caches[alias]`` (Redis/Memcached for
+    cross-worker sharing). Generations live in the same cache, without expiry.
+    """
+
+    def __init__(self, alias: str = "default") -> None:
+        from django.core.cache import caches
+        self.cache = caches[alias]
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        return self.cache.get(key, MISS)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.cache.set(key, value, timeout=ttl)
+
+    def delete(self, key: str) -> None:
+        self.cache.delete(key)
+
+    def generation(self, ns: str) -> int:
+        return int(self.cache.get(f"fusion:gen:{ns}", 0))
+
+    def bump(self, ns: str) -> None:
+        key = f"fusion:gen:{ns}"
+        if not self.cache.add(key, 1, timeout=None):
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, 1, timeout=None)
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+# ===================== Facade =====================
+class ResponseCache:
+    def __init__(self, backend: Any, ttls: Dict[str, float], negative_ttl: float = 30.0, default_ttl: float = 60.0) -> None:
+        self.backend = backend
+        self.ttls = ttls
+        self.negative_ttl = negative_ttl
+        self.default_ttl = default_ttl
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, ns: str, what: str) -> None:
+        with self._lock:
+            c = self._counts.setdefault(ns, {"hits": 0, "negative_hits": 0, "misses": 0, "invalidations": 0})
+            c[what] += 1
+
+    def key(self, ns: str, *parts: Any) -> str:
+        raw = json.dumps(parts, sort_keys=True, default=str)
+        return f"fusion:{ns}:{self.backend.generation(ns)}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+    def lookup(self, ns: str, *parts: Any, key: Optional[str] = None) -> Any:
+        value = self.backend.get(key or self.key(ns, *parts))
+        if value is MISS:
+            self._count(ns, "misses")
+        else:
+            self._count(ns, "hits" if value else "negative_hits")
+        return value
+
+    def store(self, ns: str, value: Any, *parts: Any, key: Optional[str] = None) -> None:
+        """
+        ``key``: taken with ``key()`` before fetching the value, so a ``bump()``
+        meanwhile leaves the (possibly stale) value under the old generation.
+        """
+        ttl = self.ttls.get(ns, self.default_ttl) if value else self.negative_ttl
+        if ttl > 0:
+            self.backend.set(key or self.key(ns, *parts), value, ttl)
+
+    def get_or_fetch(self, ns: str, parts: tuple, fetch: Callable[[], Any]) -> Any:
+        key = self.key(ns, *parts)  # one generation read for the lookup and the store
+        value = self.lookup(ns, key=key)
+        if value is MISS:
+            value = fetch()
+            self.store(ns, value, key=key)
+        return value
+
+    def invalidate(self, ns: str, *parts: Any) -> None:
+        self.backend.delete(self.key(ns, *parts))
+        self._count(ns, "invalidations")
+
+    def bump(self, ns: str) -> None:
+        self.backend.bump(ns)
+        self._count(ns, "invalidations")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            per_ns = {ns: dict(c) for ns, c in self._counts.items()}
+        for c in per_ns.values():
+            looked = c["hits"] + c["negative_hits"] + c["misses"]
+            c["hit_ratio"] = round((c["hits"] + c["negative_hits"]) / looked, 3) if looked else None
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": self.backend.size(),
+            "evictions": self.backend.evictions,
+            "namespaces": per_ns,
+        }
+
+
+# ===================== Per-process singleton =====================
+_CACHE: Optional[ResponseCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def response_cache() -> ResponseCache:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                if getattr(settings, "FUSION_CACHE_BACKEND", "local") == "django":
+                    backend: Any = DjangoCacheBackend(getattr(settings, "FUSION_CACHE_ALIAS", "default"))
+                else:
+                    backend = LocalLRUBackend(int(getattr(settings, "FUSION_CACHE_MAXSIZE", 2048)))
+                _CACHE = ResponseCache(
+                    backend,
+                    ttls={
+                        "customers_search": float(getattr(settings, "FUSION_CACHE_TTL_SEARCH", 120)),
+                        "customer": float(getattr(settings, "FUSION_CACHE_TTL_CUSTOMER", 300)),
+                    },
+                    negative_ttl=float(getattr(settings, "FUSION_CACHE_TTL_NEGATIVE", 30)),
+                )
+    return _CACHE
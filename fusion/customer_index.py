@@ -0,0 +1,461 @@
+"""
+Local searchable customer index for type-ahead search.
+
+Customers (with contacts, phones, emails and locations) are exported from
+Service Fusion into a SQLite file under FUSION_RUNTIME_DIR and loaded into an
+in-memory inverted index in every worker:
+
+- prefix / token matching on name, phone, email and address tokens
+  (sorted vocabulary + bisect),
+- fuzzy matching through a trigram index when a token has no prefix match,
+- phone numbers indexed as digit strings so "214555" finds "+1 (214) 555-0100".
+
+Initial load: ``python manage.py sf_index_customers --full``. Afterwards a
+background thread (FUSION_INDEX_SYNC_INTERVAL) pulls customers by descending
+``updated_at`` until it reaches the last watermark; one worker per host does
+the remote sync, the others reload the rows it wrote.
+
+Customers seen remotely (search fallback, creation) are written through to
+the index too, so before the first full load it only holds those: until
+``full_sync`` has completed once (``full_sync_completed`` meta key) the
+index is not ``ready`` and searches go to Service Fusion.
+"""
+from __future__ import annotations
+
+import bisect
+import contextlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.conf import settings
+
+from .ratelimit import BACKGROUND, lane
+from .storage import runtime_path, sqlite_connect
+
+log = logging.getLogger(__name__)
+
+try:  # POSIX
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+_WORD = re.compile(r"[a-z0-9@._+-]+")
+_SPLIT = re.compile(r"[^a-z0-9]+")
+
+EXPAND = "contacts,contacts.phones,contacts.emails,locations"
+FIELDS = "id,customer_name,contacts,locations,updated_at"
+
+
+# ===================== Text helpers =====================
+def _fold(s: Any) -> str:
+    return str(s or "").strip().lower()
+
+def _digits(s: Any) -> str:
+    return re.sub(r"\D", "", str(s or ""))
+
+def _trigrams(tok: str) -> Set[str]:
+    t = f"  {tok} "
+    return {t[i:i + 3] for i in range(len(t) - 2)}
+
+def query_tokens(q: str) -> List[str]:
+    q = _fold(q)
+    digits = _digits(q)
+    if len(digits) >= 4 and len(digits) >= len(re.sub(r"[\s()+.-]", "", q)):
+        return [digits]  # looks like a phone number
+    return [t for t in _SPLIT.split(q) if t]
+
+def doc_tokens(doc: Dict[str, Any]) -> Tuple[Set[str], Set[str]]:
+    """
+    Returns (name tokens, other tokens) for a customer document.
+    """
+    name = set(t for t in _SPLIT.split(_fold(doc.get("customer_name"))) if t)
+    other: Set[str] = set()
+
+    def add_text(v: Any) -> None:
+        for t in _SPLIT.split(_fold(v)):
+            if t:
+                other.add(t)
+
+    for c in doc.get("contacts") or []:
+        if not isinstance(c, dict):
+            continue
+        add_text(c.get("fname")); add_text(c.get("lname")); add_text(c.get("name"))
+        for p in c.get("phones") or []:
+            d = _digits(p.get("phone") if isinstance(p, dict) else p)
+            if d:
+                other.add(d)
+                if len(d) > 10:
+                    other.add(d[-10:])  # without country code
+        for e in c.get("emails") or []:
+            addr = _fold(e.get("email") if isinstance(e, dict) else e)
+            if addr:
+                other.add(addr)
+                add_text(addr)
+    for loc in doc.get("locations") or []:
+        if not isinstance(loc, dict):
+            continue
+        for k in ("nickname", "street_1", "street_2", "city", "state_prov", "postal_code"):
+            add_text(loc.get(k))
+    return name, other - name
+
+
+# ===================== In-memory index =====================
+class CustomerIndex:
+    def __init__(self) -> None:
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._doc_tokens: Dict[str, Set[str]] = {}
+        self._name_tokens: Dict[str, Set[str]] = {}
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._grams: Dict[str, Set[str]] = defaultdict(set)
+        self._vocab: List[str] = []
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # ---------- writes ----------
+    def upsert(self, docs: Iterable[Dict[str, Any]]) -> int:
+        n = 0
+        with self._lock:
+            for doc in docs:
+                cid = str(doc.get("id") or "")
+                if not cid:
+                    continue
+                self._remove(cid)
+                name, other = doc_tokens(doc)
+                toks = name | other
+                self._docs[cid] = doc
+                self._doc_tokens[cid] = toks
+                self._name_tokens[cid] = name
+                for t in toks:
+                    if t not in self._postings:
+                        self._dirty = True
+                        for g in _trigrams(t):
+                            self._grams[g].add(t)
+                    self._postings[t].add(cid)
+                n += 1
+        return n
+
+    def _remove(self, cid: str) -> None:
+        for t in self._doc_tokens.pop(cid, ()):
+            ids = self._postings.get(t)
+            if ids is not None:
+                ids.discard(cid)
+                if not ids:
+                    del self._postings[t]
+                    for g in _trigrams(t):
+                        self._grams[g].discard(t)
+                    self._dirty = True
+        self._docs.pop(cid, None)
+        self._name_tokens.pop(cid, None)
+
+    # ---------- reads ----------
+    def _vocabulary(self) -> List[str]:
+        if self._dirty:
+            self._vocab = sorted(self._postings)
+            self._dirty = False
+        return self._vocab
+
+    def _prefix(self, tok: str) -> Iterator[str]:
+        vocab = self._vocabulary()
+        i = bisect.bisect_left(vocab, tok)
+        while i < len(vocab) and vocab[i].startswith(tok):
+            yield vocab[i]
+            i += 1
+
+    def _fuzzy(self, tok: str, min_sim: float = 0.34, limit: int = 20) -> List[Tuple[str, float]]:
+        grams = _trigrams(tok)
+        counts: Dict[str, int] = defaultdict(int)
+        for g in grams:
+            for t in self._grams.get(g, ()):
+                counts[t] += 1
+        scored = []
+        for t, shared in counts.items():
+            sim = shared / (len(grams) + len(_trigrams(t)) - shared)
+            if sim >= min_sim:
+                scored.append((t, sim))
+        scored.sort(key=lambda x: -x[1])
+        return scored[:limit]
+
+    def _match(self, tok: str, max_prefix: int = 400) -> Dict[str, float]:
+        """
+        cid -> score for one query token: exact 3, prefix 2, fuzzy 0..1.
+        """
+        scores: Dict[str, float] = {}
+        for i, t in enumerate(self._prefix(tok)):
+            if i >= max_prefix:
+                break
+            s = 3.0 if t == tok else 2.0
+            for cid in self._postings[t]:
+                if scores.get(cid, 0) < s:
+                    scores[cid] = s
+        if not scores and len(tok) >= 3:
+            for t, sim in self._fuzzy(tok):
+                for cid in self._postings[t]:
+                    if scores.get(cid, 0) < sim:
+                        scores[cid] = sim
+        return scores
+
+    def search(self, q: str, limit: int = 25) -> List[Dict[str, Any]]:
+        toks = query_tokens(q)
+        if not toks:
+            return []
+        with self._lock:
+            total: Optional[Dict[str, float]] = None
+            for tok in toks:
+                m = self._match(tok)
+                if total is None:
+                    total = m
+                else:
+                    total = {cid: total[cid] + s for cid, s in m.items() if cid in total}
+                if not total:
+                    return []
+            qn = _fold(q)
+            ranked = []
+            for cid, score in total.items():
+                doc = self._docs[cid]
+                name = _fold(doc.get("customer_name"))
+                bonus = (2.0 if name.startswith(qn) else 0.0) + 0.5 * len(set(toks) & self._name_tokens[cid])
+                ranked.append((-(score + bonus), name, cid))
+            ranked.sort()
+            return [self._docs[cid] for _, _, cid in ranked[:limit]]
+
+
+# ===================== Persistence + sync =====================
+class IndexStore:
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or str(runtime_path("customers.sqlite3"))
+        self.lock_path = self.path + ".lock"
+        self._lock = threading.Lock()
+        self._conn = sqlite_connect(self.path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS customers (id TEXT PRIMARY KEY, doc TEXT NOT NULL, "
+            "updated_at TEXT, synced_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS customers_synced ON customers(synced_at)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def save(self, docs: List[Dict[str, Any]]) -> None:
+        now = time.time()
+        rows = [(str(d["id"]), json.dumps(d), d.get("updated_at"), now) for d in docs if d.get("id")]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO customers (id, doc, updated_at, synced_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET doc = excluded.doc, updated_at = excluded.updated_at, synced_at = excluded.synced_at",
+                rows,
+            )
+            self._conn.execute("COMMIT")
+
+    def changed_since(self, ts: float) -> Tuple[List[Dict[str, Any]], float]:
+        with self._lock:
+            rows = self._conn.execute("SELECT doc, synced_at FROM customers WHERE synced_at > ?", (ts,)).fetchall()
+        latest = max((r["synced_at"] for r in rows), default=ts)
+        return [json.loads(r["doc"]) for r in rows], latest
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @contextlib.contextmanager
+    def sync_lock(self, blocking: bool = True) -> Iterator[bool]:
+        """
+        Yields True when this process owns the remote sync (one per host).
+        """
+        if fcntl is None:
+            yield True
+            return
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+FULL_SYNC_KEY = "full_sync_completed"
+
+Fetcher = Callable[[Dict[str, Any]], Dict[str, Any]]  # params -> decoded /customers page
+
+
+class CustomerIndexService:
+    """
+    Ties the in-memory index to its SQLite store and to Service Fusion.
+    """
+
+    def __init__(self, store: IndexStore, fetch_page: Fetcher, page_size: int = 50) -> None:
+        self.store = store
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.index = CustomerIndex()
+        self._loaded_at = 0.0
+        self._complete = False
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        """
+        A full sync completed (here, or in a process whose rows ``reload`` picked up).
+        """
+        return self._complete
+
+    def reload(self) -> int:
+        """
+        Pulls rows written (by any process) since the last reload.
+        """
+        with self._lock:
+            complete = bool(self.store.get_meta(FULL_SYNC_KEY))  # read first: the rows it covers come below
+            docs, self._loaded_at = self.store.changed_since(self._loaded_at)
+        n = self.index.upsert(docs)
+        self._complete = self._complete or complete
+        return n
+
+    def upsert(self, docs: List[Dict[str, Any]]) -> None:
+        docs = [d for d in docs if isinstance(d, dict) and d.get("id")]
+        if docs:
+            self.store.save(docs)
+            self.index.upsert(docs)
+
+    def search(self, q: str, limit: int = 25) -> List[Dict[str, Any]]:
+        return self.index.search(q, limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "customers": len(self.index),
+            "tokens": len(self.index._postings),
+            "watermark": self.store.get_meta("watermark"),
+            "complete": self.ready,
+            "syncing": bool(self._thread and self._thread.is_alive()),
+        }
+
+    # ---------- remote sync ----------
+    def _pages(self, extra: Dict[str, Any]) -> Iterator[List[Dict[str, Any]]]:
+        page = 1
+        while True:
+            params = {"expand": EXPAND, "fields": FIELDS, "per-page": self.page_size, "page": page, **extra}
+            data = self.fetch_page(params) or {}
+            items = data.get("items") if isinstance(data, dict) else None
+            if not items:
+                return
+            yield items
+            meta = data.get("_meta") or {}
+            if page >= int(meta.get("pageCount") or page + (len(items) >= self.page_size)):
+                return
+            page += 1
+
+    def full_sync(self, progress: Optional[Callable[[int], None]] = None) -> int:
+        n = 0
+        started = time.strftime("%Y-%m-%dT%H:%M:%S")
+        with self.store.sync_lock():
+            for items in self._pages({"sort": "id"}):
+                self.upsert(items)
+                n += len(items)
+                if progress:
+                    progress(n)
+            self.store.set_meta("watermark", self._max_updated(started))
+            self.store.set_meta(FULL_SYNC_KEY, time.strftime("%Y-%m-%dT%H:%M:%S"))
+        self._complete = True
+        return n
+
+    def incremental_sync(self) -> int:
+        """
+        Newest first (sort=-updated_at); stops at the first customer not newer
+        than the stored watermark.
+        """
+        watermark = self.store.get_meta("watermark") or ""
+        newest = watermark
+        n = 0
+        for items in self._pages({"sort": "-updated_at"}):
+            fresh = [d for d in items if str(d.get("updated_at") or "") > watermark]
+            self.upsert(fresh)
+            n += len(fresh)
+            newest = max([newest] + [str(d.get("updated_at") or "") for d in fresh])
+            if len(fresh) < len(items):
+                break
+        if newest != watermark:
+            self.store.set_meta("watermark", newest)
+        return n
+
+    def _max_updated(self, default: str) -> str:
+        docs, _ = self.store.changed_since(0)
+        return max((str(d.get("updated_at") or "") for d in docs), default="") or default
+
+    def start_sync(self, interval: float) -> None:
+        if interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._sync_loop, args=(interval,), name="fusion-index-sync", daemon=True)
+                self._thread.start()
+
+    def _sync_loop(self, interval: float) -> None:
+        while True:
+            try:
+                self.reload()
+                with self.store.sync_lock(blocking=False) as owner, lane(BACKGROUND):
+                    if owner and self.ready:
+                        self.incremental_sync()
+            except Exception as e:
+                log.error("Customer index sync failed: %s", e)
+            time.sleep(interval)
+
+
+# ===================== Per-process singleton =====================
+_SERVICE: Optional[CustomerIndexService] = None
+_SERVICE_PID: Optional[int] = None
+_SERVICE_LOCK = threading.Lock()
+
+
+def _fetch_customers_page(params: Dict[str, Any]) -> Dict[str, Any]:
+    from .views import _get_json  # late import: views imports this module
+    return _get_json("/customers", params=params)
+
+
+def customer_index() -> CustomerIndexService:
+    global _SERVICE, _SERVICE_PID
+    if _SERVICE is None or _SERVICE_PID != os.getpid():
+        with _SERVICE_LOCK:
+            if _SERVICE is None or _SERVICE_PID != os.getpid():
+                svc = CustomerIndexService(
+                    IndexStore(),
+                    _fetch_customers_page,
+                    page_size=int(getattr(settings, "FUSION_INDEX_PAGE_SIZE", 50)),
+                )
+                svc.reload()
+                _SERVICE, _SERVICE_PID = svc, os.getpid()
+    return _SERVICE
+
+
+def index_enabled() -> bool:
+    return bool(getattr(settings, "FUSION_INDEX_ENABLED", True))
+
+
+def start_index_sync(**kwargs: Any) -> None:
+    """
+    ``request_started`` receiver: loads the index and starts periodic sync.
+    """
+    if index_enabled():
+        try:
+            customer_index().start_sync(float(getattr(settings, "FUSION_INDEX_SYNC_INTERVAL", 300)))
+        except Exception as e:
+            log.warning("Customer index unavailable: %s", e)
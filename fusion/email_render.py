@@ -0,0 +1,168 @@
+"""
+Precompiled rendering of the notification emails (templates/send_mail.html).
+
+``render_to_string`` looks the template up, reads and parses it on every
+notification (the cached template loader is off while DEBUG is on). Here the
+template is prepared once per process:
+
+- its ``<style>`` rules are inlined into the matching tags' ``style``
+  attributes at build time (email clients drop ``<style>`` blocks): the
+  template source is rewritten, so no CSS work happens per render,
+- the result is compiled once; renders reuse one Context (push / pop),
+- ``render_digest`` renders the per-notification section of several
+  contexts inside a single email shell (digest-style sends).
+
+With DEBUG on, an edited template is rebuilt on the next render.
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.template import Context, engines
+
+TEMPLATE = "send_mail.html"
+TYPES = ("customer_created", "job_created")
+
+_STYLE = re.compile(r"<style[^>]*>(.*?)</style>\s*", re.S | re.I)
+_RULE = re.compile(r"([^{}]+)\{([^{}]*)\}")
+_TAG = re.compile(r"<([a-zA-Z][a-zA-Z0-9]*)(\s[^<>]*?)?(/?)>")
+_CLASS = re.compile(r'\bclass="([^"]*)"')
+_STYLE_ATTR = re.compile(r'\s*\bstyle="([^"]*)"')
+_SELECTOR = re.compile(r"^([a-zA-Z][a-zA-Z0-9]*)?(?:\.([\w-]+))?$")
+
+# The per-notification section used by render_digest(): between these two markers.
+BODY_START = '<div class="body">'
+BODY_END = '<div class="hr"></div>'
+
+
+# ===================== CSS inlining (build time) =====================
+def _rules(css: str) -> List[Tuple[Optional[str], Optional[str], str]]:
+    """
+    ``(tag, class, declarations)`` for the simple selectors (``tag``, ``.cls``, ``tag.cls``);
+    ordered by specificity (tag < class < tag.class), then source order.
+    """
+    out = []
+    for selectors, decls in _RULE.findall(css):
+        decls = ";".join(d.strip() for d in decls.split(";") if d.strip())
+        for sel in selectors.split(","):
+            m = _SELECTOR.match(sel.strip())
+            if m and decls and any(m.groups()):
+                out.append((m.group(1), m.group(2), decls))
+    return sorted(out, key=lambda r: (r[1] is not None) + (r[0] is not None and r[1] is not None))
+
+
+def inline_css(source: str, css: Optional[str] = None) -> str:
+    """
+    Moves the ``<style>`` rules of a template source (or ``css``) into ``style="..."``
+    attributes. Declarations already inline stay last (they win, as in the browser).
+    """
+    css = " ".join(_STYLE.findall(source)) if css is None else css
+    rules = _rules(re.sub(r"/\*.*?\*/", "", css, flags=re.S))
+    if not rules:
+        return source
+
+    def tag(m: re.Match) -> str:
+        name, attrs, slash = m.group(1).lower(), m.group(2) or "", m.group(3)
+        classes = set((_CLASS.search(attrs) or [None, ""])[1].split())
+        decls = [d for t, c, d in rules if (t is None or t == name) and (c is None or c in classes)]
+        if not decls:
+            return m.group(0)
+        current = _STYLE_ATTR.search(attrs)
+        if current:
+            decls.append(current.group(1).rstrip(";"))
+            attrs = attrs[:current.start()] + attrs[current.end():]
+        return f'<{m.group(1)}{attrs} style="{";".join(decls)}"{slash}>'
+
+    return _TAG.sub(tag, _STYLE.sub("", source))
+
+
+# ===================== Renderer =====================
+class EmailRenderer:
+    def __init__(self, template_name: str = TEMPLATE) -> None:
+        self.template_name = template_name
+        self._lock = threading.Lock()
+        self._built: Optional[Dict[str, Any]] = None
+        self.builds = 0
+
+    def _build(self) -> Dict[str, Any]:
+        engine = engines["django"]
+        path = engine.get_template(self.template_name).origin.name
+        with open(path, encoding="utf-8") as f:
+            raw = f.read()
+        css = " ".join(_STYLE.findall(raw))
+        start, end = raw.find(BODY_START), raw.find(BODY_END)
+        if start < 0 or end < start:
+            raise ValueError(f"{self.template_name}: digest markers not found")
+        start += len(BODY_START)
+        self.builds += 1
+        return {
+            "path": path,
+            "mtime": os.path.getmtime(path),
+            "full": engine.from_string(inline_css(raw, css)).template,
+            "item": engine.from_string(inline_css(raw[start:end], css)).template,
+            "shell": engine.from_string(inline_css(raw[:start] + "{{ items_html|safe }}" + raw[end:], css)).template,
+            "separator": inline_css(BODY_END, css),
+        }
+
+    def compiled(self) -> Dict[str, Any]:
+        built = self._built
+        if built is None or (settings.DEBUG and os.path.getmtime(built["path"]) != built["mtime"]):
+            with self._lock:
+                if self._built is built:
+                    self._built = self._build()
+                built = self._built
+        return built
+
+    @staticmethod
+    def _check(ctx: Dict[str, Any]) -> Dict[str, Any]:
+        ctx = ctx or {}
+        if ctx.get("type") not in TYPES:
+            raise ValueError(f"Unknown email type: {ctx.get('type')!r}")
+        return ctx
+
+    # ---------- API ----------
+    def render(self, ctx: Dict[str, Any]) -> str:
+        return self.compiled()["full"].render(Context(self._check(ctx), autoescape=True))
+
+    def render_batch(self, contexts: Iterable[Dict[str, Any]]) -> List[str]:
+        """
+        One complete email per context.
+        """
+        template = self.compiled()["full"]
+        context = Context(autoescape=True)
+        out = []
+        for ctx in contexts:
+            with context.push(self._check(ctx)):
+                out.append(template.render(context))
+        return out
+
+    def render_digest(self, contexts: Iterable[Dict[str, Any]], brand: Optional[Dict[str, Any]] = None) -> str:
+        """
+        A single email holding the section of every context, separated by rules.
+        """
+        built = self.compiled()
+        context = Context(autoescape=True)
+        parts = []
+        for ctx in contexts:
+            with context.push(self._check(ctx)):
+                parts.append(built["item"].render(context))
+        items_html = built["separator"].join(parts)
+        return built["shell"].render(Context({"brand": brand or {"name": "BlueCollar AI"}, "items_html": items_html}))
+
+
+# ===================== Per-process singleton =====================
+_RENDERER: Optional[EmailRenderer] = None
+_RENDERER_LOCK = threading.Lock()
+
+
+def email_renderer() -> EmailRenderer:
+    global _RENDERER
+    if _RENDERER is None:
+        with _RENDERER_LOCK:
+            if _RENDERER is None:
+                _RENDERER = EmailRenderer()
+    return _RENDERER
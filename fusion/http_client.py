@@ -0,0 +1,153 @@
+"""
+Pooled, keep-alive HTTP client for the Service Fusion Open API.
+
+One ``requests.Session`` is kept per worker process and shared by all of its
+threads, so calls to api.servicefusion.com reuse TCP/TLS connections instead
+of paying a fresh handshake every time.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .metrics import timed
+from .ratelimit import get_limiter
+
+log = logging.getLogger(__name__)
+
+
+class ServiceFusionClient:
+    """
+    Thin wrapper around a pooled ``requests.Session``.
+
+    - ``pool_connections``: number of per-host pools kept alive.
+    - ``pool_maxsize``: max connections kept per host (``pool_block`` makes it a hard limit).
+    - ``connect_timeout`` / ``read_timeout``: applied to every call unless overridden.
+    The session is rebuilt lazily after a fork (gunicorn preload) so workers never share sockets.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_version: str = "v1",
+        *,
+        pool_connections: int = 4,
+        pool_maxsize: int = 20,
+        pool_block: bool = False,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 25.0,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.api_version = api_version.strip("/")
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._session: Optional[requests.Session] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    # ---------- session ----------
+    def _build_session(self) -> requests.Session:
+        s = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+        s.mount("https://", adapter)
+        s.mount("http://", adapter)
+        return s
+
+    @property
+    def session(self) -> requests.Session:
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session = self._build_session()
+                    self._pid = pid
+        return self._session
+
+    def close(self) -> None:
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._pid = None
+
+    # ---------- helpers ----------
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        return (self.connect_timeout, self.read_timeout)
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{self.api_version}{path if path.startswith('/') else '/' + path}"
+
+    def request(self, method: str, url: str, *, paced: bool = True, **kwargs: Any) -> requests.Response:
+        """
+        Sends a request on the pooled session. ``url`` may be absolute (OAuth, LLM)
+        or an API path such as ``/customers``. ``paced=False`` (OAuth token, LLM):
+        not Service Fusion API traffic, so no token bucket and no 429/503 retries.
+        """
+        if not url.startswith(("http://", "https://")):
+            url = self.url(url)
+        kwargs.setdefault("timeout", self.timeout)
+        if not paced:
+            return self.session.request(method, url, **kwargs)
+        # Paced by the rate limiter; throttled idempotent calls are retried (fusion/ratelimit.py).
+        bucket, policy = get_limiter()
+        attempt = 0
+        while True:
+            if bucket is not None:
+                with timed("ratelimit"):
+                    bucket.acquire()
+            with timed("servicefusion") as t:
+                r = self.session.request(method, url, **kwargs)
+                t.failed = r.status_code >= 400
+            wait = policy.delay(r.status_code, r.headers, attempt)
+            if wait is None:
+                return r
+            if bucket is not None:
+                bucket.pause(wait)
+            if not policy.retryable(method, attempt):
+                return r
+            log.warning("Service Fusion %s on %s %s: retry in %.1fs", r.status_code, method, url, wait)
+            r.close()
+            if bucket is None:
+                with timed("ratelimit"):
+                    time.sleep(wait)
+            attempt += 1
+
+
+# ===================== Per-process singleton =====================
+_CLIENT: Optional[ServiceFusionClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> ServiceFusionClient:
+    """
+    Returns the worker's shared client, built from settings on first use.
+    """
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = ServiceFusionClient(
+                    getattr(settings, "SERVICE_FUSION_BASE_URL", "") or "https://api.servicefusion.com",
+                    (getattr(settings, "SERVICE_FUSION_API_PREFIX", "") or "/v1"),
+                    pool_connections=int(getattr(settings, "HTTP_POOL_CONNECTIONS", 4)),
+                    pool_maxsize=int(getattr(settings, "HTTP_POOL_MAXSIZE", 20)),
+                    pool_block=bool(getattr(settings, "HTTP_POOL_BLOCK", False)),
+                    connect_timeout=float(getattr(settings, "HTTP_CONNECT_TIMEOUT", 5)),
+                    read_timeout=float(getattr(settings, "HTTP_READ_TIMEOUT", getattr(settings, "HTTP_TIMEOUT", 25))),
+                )
+    return _CLIENT
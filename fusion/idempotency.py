@@ -0,0 +1,357 @@
+"""
+Duplicate-submission suppression for the create endpoints (``/sf/jobs``, ``/sf/customers``).
+
+A POST is identified by its ``Idempotency-Key`` header (kept
+FUSION_IDEMPOTENCY_TTL seconds) or, without one, by the fingerprint of its
+JSON payload (kept FUSION_IDEMPOTENCY_AUTO_WINDOW seconds, 0 disables):
+
+- first submission: runs, and its response (status < 500) is stored;
+- same key / payload again: the stored response is replayed with
+  ``Idempotent-Replayed: true``, without any LLM / Service Fusion / SMTP call;
+- while the original is still running: waits for it (FUSION_IDEMPOTENCY_WAIT
+  seconds, then 409 + Retry-After);
+- same key with a different payload: 422;
+- original failed (exception or 5xx): nothing is stored, the next one runs.
+
+Records live in SQLite under FUSION_RUNTIME_DIR, shared by the worker
+processes of the host and kept across restarts. An in-flight record whose
+process died is taken over after FUSION_IDEMPOTENCY_LEASE seconds.
+
+    @csrf_exempt
+    @idempotent("sf_create_job")
+    def sf_create_job(request): ...     # async views too
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, JsonResponse
+
+from .storage import runtime_path, sqlite_connect
+
+log = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+# ===================== Store =====================
+class IdempotencyStore:
+    """
+    One row per key: state pending (owner + lease) or done (response + expiry).
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or str(runtime_path("idempotency.sqlite3"))
+        self._lock = threading.Lock()
+        self._conn = sqlite_connect(self.path)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS requests (
+                key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, state TEXT NOT NULL, owner TEXT,
+                status INTEGER, content_type TEXT, body BLOB, lease_until REAL NOT NULL DEFAULT 0,
+                expires_at REAL NOT NULL DEFAULT 0, created_at REAL NOT NULL)"""
+        )
+
+    def claim(self, key: str, fingerprint: str, owner: str, now: float, lease_until: float) -> Optional[Dict[str, Any]]:
+        """
+        Takes the key (None) unless a live record holds it; that record is returned.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT * FROM requests WHERE key = ?", (key,)).fetchone()
+                live = row is not None and (
+                    row["expires_at"] > now if row["state"] == "done" else row["lease_until"] > now
+                )
+                if not live:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO requests (key, fingerprint, state, owner, lease_until, created_at) "
+                        "VALUES (?, ?, 'pending', ?, ?, ?)", (key, fingerprint, owner, lease_until, now),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return dict(row) if live else None
+
+    def complete(self, key: str, owner: str, status: int, content_type: str, body: bytes, expires_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE requests SET state = 'done', status = ?, content_type = ?, body = ?, expires_at = ? "
+                "WHERE key = ? AND owner = ?", (status, content_type, body, expires_at, key, owner),
+            )
+
+    def release(self, key: str, owner: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM requests WHERE key = ? AND owner = ? AND state = 'pending'", (key, owner))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM requests WHERE key = ?", (key,)).fetchone()
+        return dict(row) if row else None
+
+    def purge(self, now: float) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM requests WHERE (state = 'done' AND expires_at < ?) OR (state = 'pending' AND lease_until < ?)",
+                (now, now),
+            ).rowcount
+
+
+# ===================== Identification =====================
+@dataclass(frozen=True)
+class Ident:
+    key: str
+    fingerprint: str
+    ttl: float
+
+
+def fingerprint(endpoint: str, body: bytes) -> str:
+    """
+    sha256 of the endpoint and the canonical JSON payload (key order and whitespace ignored).
+    """
+    try:
+        canonical = json.dumps(json.loads(body or b"{}"), sort_keys=True, separators=(",", ":")).encode()
+    except ValueError:
+        canonical = body
+    return hashlib.sha256(endpoint.encode() + b"\0" + canonical).hexdigest()
+
+
+def _replay(rec: Dict[str, Any]) -> HttpResponse:
+    response = HttpResponse(rec["body"], status=rec["status"], content_type=rec["content_type"])
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _mismatch() -> JsonResponse:
+    return JsonResponse({"error": f"{HEADER} already used with a different payload"}, status=422)
+
+
+def _in_progress() -> JsonResponse:
+    response = JsonResponse({"error": "The original request is still in progress"}, status=409)
+    response["Retry-After"] = "1"
+    return response
+
+
+class Idempotency:
+    def __init__(self, store: IdempotencyStore, *, ttl: float = 86400.0, window: float = 60.0,
+                 wait: float = 30.0, lease: float = 300.0) -> None:
+        self.store = store
+        self.ttl = ttl
+        self.window = window
+        self.wait_timeout = wait
+        self.lease = lease
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self.executed = self.replayed = self.waited = self.conflicts = 0
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def identify(self, endpoint: str, request: HttpRequest) -> Optional[Ident]:
+        """
+        None: not deduplicated (no key and the automatic window is off). ValueError: unusable key.
+        """
+        fp = fingerprint(endpoint, request.body)
+        key = request.headers.get(HEADER)
+        if key is not None:
+            key = key.strip()
+            if not key or len(key) > MAX_KEY_LENGTH or not key.isprintable():
+                raise ValueError(f"Invalid {HEADER} header")
+            return Ident(f"{endpoint}:key:{key}", fp, self.ttl)
+        if self.window <= 0:
+            return None
+        return Ident(f"{endpoint}:auto:{fp}", fp, self.window)
+
+    # ---------- original ----------
+    def begin(self, ident: Ident) -> Optional[Dict[str, Any]]:
+        """
+        None: this request owns the key and must ``finish`` it; otherwise the live record.
+        """
+        now = time.time()
+        if now - self._last_purge > 300:
+            self._last_purge = now
+            self.store.purge(now)
+        rec = self.store.claim(ident.key, ident.fingerprint, self.owner, now, now + self.lease)
+        if rec is None:
+            with self._lock:
+                self._events[ident.key] = threading.Event()
+        return rec
+
+    def finish(self, ident: Ident, response: Optional[HttpResponse]) -> None:
+        """
+        Stores the response, or releases the key when there is none to replay (exception, 5xx, stream).
+        """
+        try:
+            if response is None or response.status_code >= 500 or response.streaming:
+                self.store.release(ident.key, self.owner)
+            else:
+                self.store.complete(ident.key, self.owner, response.status_code, response["Content-Type"],
+                                    response.content, time.time() + ident.ttl)
+                self.count("executed")
+        except Exception as e:
+            log.warning("Idempotency record %s not saved: %s", ident.key, e)
+        finally:
+            with self._lock:
+                event = self._events.pop(ident.key, None)
+            if event is not None:
+                event.set()
+
+    # ---------- duplicates ----------
+    def wait(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Blocks until the in-flight original completes or is released (None), at most FUSION_IDEMPOTENCY_WAIT.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        delay = 0.05
+        while True:
+            rec = self.store.get(key)
+            remaining = deadline - time.monotonic()
+            if rec is None or rec["state"] == "done" or remaining <= 0:
+                return rec
+            with self._lock:
+                event = self._events.get(key)  # original in this process: woken at once
+            if event is not None:
+                event.wait(min(delay, remaining))
+            else:
+                time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.5)
+
+    async def await_(self, key: str) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + self.wait_timeout
+        delay = 0.05
+        get = sync_to_async(self.store.get, thread_sensitive=False)
+        while True:
+            rec = await get(key)
+            remaining = deadline - time.monotonic()
+            if rec is None or rec["state"] == "done" or remaining <= 0:
+                return rec
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.5)
+
+    def resolve(self, ident: Ident, rec: Dict[str, Any]) -> Optional[HttpResponse]:
+        """
+        Answer for a duplicate, given the record after waiting; None: the original
+        went away (failed), this request runs instead.
+        """
+        if rec is None:
+            return None
+        if rec["fingerprint"] != ident.fingerprint:
+            self.count("conflicts")
+            return _mismatch()
+        if rec["state"] == "done":
+            self.count("replayed")
+            return _replay(rec)
+        self.count("conflicts")
+        return _in_progress()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"executed": self.executed, "replayed": self.replayed, "waited": self.waited,
+                    "conflicts": self.conflicts, "in_flight": len(self._events)}
+
+
+# ===================== Per-process singleton =====================
+_IDEMPOTENCY: Optional[Idempotency] = None
+_IDEMPOTENCY_PID: Optional[int] = None
+_IDEMPOTENCY_LOCK = threading.Lock()
+
+
+def idempotency() -> Idempotency:
+    global _IDEMPOTENCY, _IDEMPOTENCY_PID
+    if _IDEMPOTENCY is None or _IDEMPOTENCY_PID != os.getpid():
+        with _IDEMPOTENCY_LOCK:
+            if _IDEMPOTENCY is None or _IDEMPOTENCY_PID != os.getpid():
+                memory = getattr(settings, "FUSION_IDEMPOTENCY_STORE", "sqlite") == "memory"
+                _IDEMPOTENCY = Idempotency(
+                    IdempotencyStore(":memory:" if memory else None),
+                    ttl=float(getattr(settings, "FUSION_IDEMPOTENCY_TTL", 86400)),
+                    window=float(getattr(settings, "FUSION_IDEMPOTENCY_AUTO_WINDOW", 60)),
+                    wait=float(getattr(settings, "FUSION_IDEMPOTENCY_WAIT", 30)),
+                    lease=float(getattr(settings, "FUSION_IDEMPOTENCY_LEASE", 300)),
+                )
+                _IDEMPOTENCY_PID = os.getpid()
+    return _IDEMPOTENCY
+
+
+# ===================== View decorator =====================
+def _enabled(request: HttpRequest) -> bool:
+    return request.method == "POST" and getattr(settings, "FUSION_IDEMPOTENCY_ENABLED", True)
+
+
+def idempotent(endpoint: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    def deco(view: Callable[..., Any]) -> Callable[..., Any]:
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def awrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> Any:
+                if not _enabled(request):
+                    return await view(request, *args, **kwargs)
+                idem = idempotency()
+                try:
+                    ident = idem.identify(endpoint, request)
+                except ValueError as e:
+                    return JsonResponse({"error": str(e)}, status=400)
+                if ident is None:
+                    return await view(request, *args, **kwargs)
+                for _ in range(2):  # a second round when the original failed while we waited
+                    rec = await sync_to_async(idem.begin, thread_sensitive=False)(ident)
+                    if rec is None:
+                        response = None
+                        try:
+                            response = await view(request, *args, **kwargs)
+                            return response
+                        finally:
+                            await sync_to_async(idem.finish, thread_sensitive=False)(ident, response)
+                    if rec["state"] == "pending" and rec["fingerprint"] == ident.fingerprint:
+                        idem.count("waited")
+                        rec = await idem.await_(ident.key)
+                    answer = idem.resolve(ident, rec)
+                    if answer is not None:
+                        return answer
+                return _in_progress()
+            return awrapper
+
+        @functools.wraps(view)
+        def wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> Any:
+            if not _enabled(request):
+                return view(request, *args, **kwargs)
+            idem = idempotency()
+            try:
+                ident = idem.identify(endpoint, request)
+            except ValueError as e:
+                return JsonResponse({"error": str(e)}, status=400)
+            if ident is None:
+                return view(request, *args, **kwargs)
+            for _ in range(2):  # a second round when the original failed while we waited
+                rec = idem.begin(ident)
+                if rec is None:
+                    response = None
+                    try:
+                        response = view(request, *args, **kwargs)
+                        return response
+                    finally:
+                        idem.finish(ident, response)
+                if rec["state"] == "pending" and rec["fingerprint"] == ident.fingerprint:
+                    idem.count("waited")
+                    rec = idem.wait(ident.key)
+                answer = idem.resolve(ident, rec)
+                if answer is not None:
+                    return answer
+            return _in_progress()
+        return wrapper
+    return deco
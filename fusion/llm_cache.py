@@ -0,0 +1,140 @@
+"""
+Content-addressed cache for LLM summaries (call_llm / acall_llm).
+
+- Key: sha256 of the normalized (name, title, description) triple: case,
+  accents, punctuation and whitespace do not create new entries.
+- Near-duplicate mode (FUSION_LLM_CACHE_NEAR_DUP): a second key built from
+  the title and the *problem text* only, reduced to its sorted set of
+  meaningful words, so "Walk-in cooler not cooling!" and "the walk in cooler
+  is not cooling" share one summary whatever the customer.
+- SQLite file under FUSION_RUNTIME_DIR (survives restarts, shared by the
+  workers), TTL on creation time, LRU eviction above FUSION_LLM_CACHE_MAX_ENTRIES.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+
+from .storage import runtime_path, sqlite_connect
+
+# Words that never change what the technician has to do.
+# ("in" stays: "walk in cooler"; "not" obviously stays too.)
+STOPWORDS = frozenset("""
+a an and are at be been but by for from has have is it its of on or our
+please the their there this to was were will with my we us they he she
+le la les un une des du de et est sur dans pour avec
+""".split())
+
+
+def normalize(text: Any) -> str:
+    s = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode()
+    return " ".join(re.findall(r"[a-z0-9]+", s.lower()))
+
+
+def problem_signature(text: Any) -> str:
+    return " ".join(sorted({w for w in normalize(text).split() if w not in STOPWORDS}))
+
+
+def _sha(*parts: str) -> str:
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path: Optional[str] = None, *, ttl: float = 7 * 86400, max_entries: int = 5000,
+                 near_dup: bool = False) -> None:
+        self.path = path or str(runtime_path("llm_cache.sqlite3"))
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.near_dup = near_dup
+        self._lock = threading.Lock()
+        self._conn = sqlite_connect(self.path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, kind TEXT NOT NULL, "
+            "value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache(accessed)")
+        self.counters = {"hits": 0, "near_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def keys(self, name: str, title: str, description: str) -> Tuple[str, Optional[str]]:
+        exact = _sha("exact", normalize(name), normalize(title), normalize(description))
+        near = _sha("near", normalize(title), problem_signature(description)) if self.near_dup else None
+        return exact, near
+
+    def get(self, name: str, title: str, description: str) -> Optional[Dict[str, Any]]:
+        exact, near = self.keys(name, title, description)
+        now = time.time()
+        with self._lock:
+            for key, counter in ((exact, "hits"), (near, "near_hits")):
+                if key is None:
+                    continue
+                row = self._conn.execute(
+                    "SELECT value FROM llm_cache WHERE key = ? AND created > ?", (key, now - self.ttl)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+                    if near and key == exact:  # entries stored before near-dup mode was turned on
+                        self._conn.execute("INSERT OR IGNORE INTO llm_cache VALUES (?, 'near', ?, ?, ?)",
+                                           (near, row["value"], now, now))
+                    self.counters[counter] += 1
+                    return json.loads(row["value"])
+            self.counters["misses"] += 1
+        return None
+
+    def put(self, name: str, title: str, description: str, value: Dict[str, Any]) -> None:
+        if not value:
+            return  # degraded / empty answers are never cached
+        exact, near = self.keys(name, title, description)
+        now = time.time()
+        data = json.dumps(value)
+        rows = [(exact, "exact", data, now, now)] + ([(near, "near", data, now, now)] if near else [])
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)", rows)
+            self.counters["stores"] += 1
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        # Caller holds the lock.
+        cur = self._conn.execute("DELETE FROM llm_cache WHERE created <= ?", (now - self.ttl,))
+        n = cur.rowcount or 0
+        over = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+        if over > 0:
+            cur = self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed LIMIT ?)", (over,)
+            )
+            n += cur.rowcount or 0
+        self.counters["evictions"] += n
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            return {"entries": entries, "near_dup": self.near_dup, **self.counters}
+
+
+# ===================== Per-process singleton =====================
+_CACHE: Optional[LLMCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def llm_cache() -> Optional[LLMCache]:
+    """
+    None when FUSION_LLM_CACHE_ENABLED is off.
+    """
+    global _CACHE
+    if not getattr(settings, "FUSION_LLM_CACHE_ENABLED", True):
+        return None
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = LLMCache(
+                    ttl=float(getattr(settings, "FUSION_LLM_CACHE_TTL", 7 * 86400)),
+                    max_entries=int(getattr(settings, "FUSION_LLM_CACHE_MAX_ENTRIES", 5000)),
+                    near_dup=bool(getattr(settings, "FUSION_LLM_CACHE_NEAR_DUP", False)),
+                )
+    return _CACHE
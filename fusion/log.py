@@ -0,0 +1,198 @@
+"""
+Structured, non-blocking logging for the fusion app.
+
+- ``build_logging()`` returns the project's LOGGING dict (settings.py and
+  logging_config.py share it). ``configure()`` (settings.LOGGING_CONFIG)
+  applies it, then puts each logger's handlers behind a queue, with one
+  listener thread per process doing the writes to stdout / django_debug.log.
+  The request thread still renders the message: ``QueueHandler.prepare()``
+  runs ``msg % args`` (and any traceback) before enqueueing, so arguments
+  are captured as they were at the call. What it no longer waits for is the
+  formatter line and the stream / file I/O.
+- Every record carries ``request_id``: the X-Request-ID header of the current
+  request (or a generated one), set by ``RequestIdMiddleware`` and echoed in
+  the response, so the lines of one request can be grepped together.
+- Messages use lazy %-formatting (``log.info("job %s", job_id)``); large
+  payloads go through ``dump()`` at DEBUG level, so they are only serialized
+  (in the calling thread) when that level is enabled.
+"""
+from __future__ import annotations
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.config
+import logging.handlers
+import os
+import queue
+import re
+import uuid
+from typing import Any, Dict, List, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+REQUEST_ID: contextvars.ContextVar[str] = contextvars.ContextVar("fusion_request_id", default="-")
+
+_VALID_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+
+def request_id() -> str:
+    return REQUEST_ID.get()
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Runs in the caller's thread (queue handler); the listener keeps the value.
+        if not hasattr(record, "request_id"):
+            record.request_id = REQUEST_ID.get()
+        return True
+
+
+class dump:
+    """
+    Lazy JSON rendering of a payload for ``log.debug("... %s", dump(obj))``.
+    """
+    __slots__ = ("obj", "limit")
+
+    def __init__(self, obj: Any, limit: int = 4000) -> None:
+        self.obj = obj
+        self.limit = limit
+
+    def __str__(self) -> str:
+        try:
+            s = json.dumps(self.obj, ensure_ascii=False, default=str)
+        except (TypeError, ValueError):
+            s = repr(self.obj)
+        return s if len(s) <= self.limit else s[:self.limit] + f"... ({len(s)} chars)"
+
+
+# ===================== Configuration =====================
+def build_logging(level: str = "INFO", log_file: Optional[str] = None) -> Dict[str, Any]:
+    level = (level or "INFO").upper()
+    handlers: Dict[str, Any] = {
+        "console": {
+            "class": "logging.StreamHandler",
+            "formatter": "simple",
+            "filters": ["request_id"],
+        },
+    }
+    if log_file:
+        handlers["file"] = {
+            "class": "logging.FileHandler",
+            "filename": str(log_file),
+            "formatter": "verbose",
+            "filters": ["request_id"],
+        }
+    names = list(handlers)
+    return {
+        "version": 1,
+        "disable_existing_loggers": False,
+        "filters": {"request_id": {"()": "fusion.log.RequestIdFilter"}},
+        "formatters": {
+            "verbose": {
+                "format": "{levelname} {asctime} {name} {process:d} {thread:d} [{request_id}] {message}",
+                "style": "{",
+            },
+            "simple": {
+                "format": "{levelname} [{request_id}] {name}: {message}",
+                "style": "{",
+            },
+        },
+        "handlers": handlers,
+        "root": {"handlers": names, "level": level},
+        "loggers": {
+            "django.server": {"handlers": names, "level": level, "propagate": False},
+            "django.security": {"handlers": names, "level": level, "propagate": False},
+            "fusion": {"handlers": names, "level": level, "propagate": False},
+        },
+    }
+
+
+_LISTENERS: List[logging.handlers.QueueListener] = []
+
+
+def _stop_listeners() -> None:
+    while _LISTENERS:
+        _LISTENERS.pop().stop()  # flushes what is still queued
+
+
+def _restart_listeners() -> None:
+    # The listener threads do not survive fork(): start fresh ones in the child.
+    for listener in _LISTENERS:
+        listener.start()
+
+
+def configure(config: Dict[str, Any]) -> None:
+    """
+    ``dictConfig`` then, unless LOG_ASYNC is off, one QueueHandler per distinct set of handlers.
+    """
+    from django.conf import settings
+
+    logging.config.dictConfig(config)
+    if not getattr(settings, "LOG_ASYNC", True):
+        return
+    _stop_listeners()
+    loggers = [logging.getLogger()] + [logging.getLogger(name) for name in config.get("loggers", {})]
+    shared: Dict[tuple, logging.Handler] = {}
+    for logger in loggers:
+        targets = tuple(h for h in logger.handlers if not isinstance(h, logging.handlers.QueueHandler))
+        if not targets:
+            continue
+        if targets not in shared:
+            q: queue.SimpleQueue = queue.SimpleQueue()
+            # prepare() formats msg % args here, in the logging thread; the listener only writes.
+            handler = logging.handlers.QueueHandler(q)
+            handler.addFilter(RequestIdFilter())
+            listener = logging.handlers.QueueListener(q, *targets, respect_handler_level=True)
+            listener.start()
+            _LISTENERS.append(listener)
+            shared[targets] = handler
+        logger.handlers = [shared[targets]]
+
+
+atexit.register(_stop_listeners)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listeners)
+
+
+# ===================== Middleware =====================
+class RequestIdMiddleware:
+    """
+    Binds X-Request-ID (or a new id) to the request's logs and echoes it in the response.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Any) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _bind(request: Any) -> contextvars.Token:
+        rid = request.headers.get("X-Request-ID", "")
+        if not _VALID_ID.match(rid):
+            rid = uuid.uuid4().hex[:16]
+        request.request_id = rid
+        return REQUEST_ID.set(rid)
+
+    def __call__(self, request: Any) -> Any:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self._bind(request)
+        try:
+            response = self.get_response(request)
+            response["X-Request-ID"] = request.request_id
+            return response
+        finally:
+            REQUEST_ID.reset(token)
+
+    async def __acall__(self, request: Any) -> Any:
+        token = self._bind(request)
+        try:
+            response = await self.get_response(request)
+            response["X-Request-ID"] = request.request_id
+            return response
+        finally:
+            REQUEST_ID.reset(token)
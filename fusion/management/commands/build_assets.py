@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from fusion.assets import PAGE_TEMPLATES, assets_dir, brotli, build
+
+
+class Command(BaseCommand):
+    help = "Moves the inline CSS/JS of the page templates into minified, hashed, precompressed bundles."
+
+    def add_arguments(self, parser):
+        parser.add_argument("templates", nargs="*", help=f"Templates to build (default: {', '.join(PAGE_TEMPLATES)}).")
+
+    def handle(self, *args, **options):
+        dirs = [Path(d) for t in settings.TEMPLATES for d in t.get("DIRS", [])]
+        try:
+            manifest = build(dirs, tuple(options["templates"]) or PAGE_TEMPLATES)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Asset build failed: {e}")
+
+        self.stdout.write(f"{'file':<52}{'source':>10}{'min':>10}{'gzip':>10}{'br':>10}")
+        for name, f in sorted(manifest["files"].items()):
+            self.stdout.write(f"{name:<52}{f['source_size']:>10}{f['size']:>10}{f['gzip']:>10}{f.get('br', '-'):>10}")
+        for name, t in manifest["templates"].items():
+            self.stdout.write(f"{name}: {t['source_bytes']} -> {t['bytes']} bytes of HTML")
+        if brotli is None:
+            self.stdout.write(self.style.WARNING("brotli not installed: gzip variants only."))
+        self.stdout.write(self.style.SUCCESS(f"Assets written to {assets_dir()}"))
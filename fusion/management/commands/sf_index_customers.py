@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fusion.customer_index import customer_index
+
+
+class Command(BaseCommand):
+    help = "Loads (--full) or incrementally syncs the local Service Fusion customer index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Re-export every customer (initial load).")
+
+    def handle(self, *args, **options):
+        svc = customer_index()
+        try:
+            if options["full"] or not svc.ready:
+                n = svc.full_sync(progress=lambda n: self.stdout.write(f"  {n} customers…"))
+                self.stdout.write(self.style.SUCCESS(f"Full load: {n} customers indexed."))
+            else:
+                n = svc.incremental_sync()
+                self.stdout.write(self.style.SUCCESS(f"Incremental sync: {n} customers updated."))
+        except Exception as e:
+            raise CommandError(f"Customer index sync failed: {e}")
+        stats = svc.stats()
+        self.stdout.write(f"Index: {stats['customers']} customers, {stats['tokens']} tokens, watermark {stats['watermark']}")
@@ -0,0 +1,53 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fusion.profiling import profiles_dir
+
+
+class Command(BaseCommand):
+    help = "Aggregates the sampled request profiles (FUSION_RUNTIME_DIR/profiles/*.folded)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--endpoint", help="Only this URL name (e.g. sf_create_job).")
+        parser.add_argument("--since", type=float, default=0, help="Only dumps from the last N hours.")
+        parser.add_argument("--top", type=int, default=25, help="Frames listed per table.")
+        parser.add_argument("--out", help="Write the merged collapsed stacks here (flamegraph.pl / speedscope input).")
+
+    def handle(self, *args, **options):
+        cutoff = time.time() - options["since"] * 3600 if options["since"] else 0
+        stacks = Counter()
+        files = 0
+        for path in sorted(profiles_dir().glob("*.folded")):
+            if path.stat().st_mtime < cutoff:
+                continue
+            if options["endpoint"] and f"-{options['endpoint']}-" not in path.name:
+                continue
+            files += 1
+            for line in path.read_text(encoding="utf-8").splitlines():
+                stack, _, n = line.rpartition(" ")
+                if stack and n.isdigit():
+                    stacks[stack] += int(n)
+        if not stacks:
+            raise CommandError("No profile matches.")
+
+        total = sum(stacks.values())
+        own, inclusive = Counter(), Counter()
+        for stack, n in stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += n
+            for frame in set(frames):
+                inclusive[frame] += n
+
+        self.stdout.write(f"{files} profile(s), {total} samples")
+        for title, counter in (("Self (leaf) samples", own), ("Inclusive samples", inclusive)):
+            self.stdout.write(f"\n{title}:")
+            for frame, n in counter.most_common(options["top"]):
+                self.stdout.write(f"  {100.0 * n / total:6.1f}%  {n:8d}  {frame}")
+
+        if options["out"]:
+            with open(options["out"], "w", encoding="utf-8") as f:
+                for stack, n in stacks.most_common():
+                    f.write(f"{stack} {n}\n")
+            self.stdout.write(self.style.SUCCESS(f"\nMerged stacks written to {options['out']}"))
@@ -0,0 +1,240 @@
+"""
+Latency / error metrics per endpoint and per dependency, Prometheus text format.
+
+    @timed("llm")
+    def call_llm(...): ...
+
+    with timed("servicefusion"):
+        r = client.request(...)
+
+- ``MetricsMiddleware`` records every request in
+  ``fusion_http_request_duration_seconds{endpoint,method,status}`` (endpoint =
+  URL name, so the label set stays bounded) and, for JSON responses, adds a
+  ``Server-Timing`` header with the time spent in each dependency during the
+  request (``servicefusion;dur=412.3, llm;dur=1210.0, total;dur=1702.9``).
+  Spans do not nest, so they add up: ``oauth`` (token), ``ratelimit``
+  (queueing for the Service Fusion budget) and ``servicefusion`` (the HTTP
+  exchanges only) are timed separately; ``outbox`` is the request waiting for
+  its email, ``smtp`` the delivery itself (sender thread, ``background``).
+- ``timed(dependency)`` feeds ``fusion_dependency_duration_seconds`` and
+  ``fusion_dependency_errors_total`` labelled with the dependency and the
+  current endpoint (``background`` outside a request: task queue, outbox...).
+- ``GET /metrics`` exposes the registry. Values are per worker process, as
+  with any in-process Prometheus client; scrape each worker or sum them.
+"""
+from __future__ import annotations
+
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+# ===================== Registry =====================
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name, self.help = name, help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, key, value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = BUCKETS) -> None:
+        self.name, self.help = name, help
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Labels, List[float]] = {}  # bucket counts..., +Inf count, sum
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            v[i] += 1
+            v[-1] += seconds
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for key, v in items:
+            cumulative = 0.0
+            for bound, n in zip(self.buckets + (float("inf"),), v[:-1]):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket", key + (("le", le),), cumulative
+            yield f"{self.name}_count", key, cumulative
+            yield f"{self.name}_sum", key, v[-1]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls: type, name: str, help: str) -> Any:
+        with self._lock:
+            m = self.metrics.get(name)
+            if m is None:
+                m = self.metrics[name] = cls(name, help)
+            return m
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get(Counter, name, help)
+
+    def histogram(self, name: str, help: str) -> Histogram:
+        return self._get(Histogram, name, help)
+
+    def render(self) -> str:
+        lines = []
+        for m in list(self.metrics.values()):
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            for name, labels, value in m.samples():
+                lbl = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f"{name}{{{lbl}}} {value:g}" if lbl else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REGISTRY = Registry()
+HTTP_DURATION = REGISTRY.histogram("fusion_http_request_duration_seconds", "HTTP request latency by endpoint.")
+DEP_DURATION = REGISTRY.histogram("fusion_dependency_duration_seconds", "Time spent calling a dependency.")
+DEP_ERRORS = REGISTRY.counter("fusion_dependency_errors_total", "Failed dependency calls.")
+
+
+# ===================== Per-request breakdown =====================
+class RequestTimings:
+    """
+    Endpoint and milliseconds per dependency of one request (shared by the pipeline threads).
+    """
+
+    def __init__(self) -> None:
+        self.endpoint = "unmatched"
+        self.ms: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, dependency: str, ms: float) -> None:
+        with self._lock:
+            self.ms[dependency] = self.ms.get(dependency, 0.0) + ms
+
+    def header(self, total_ms: float) -> str:
+        with self._lock:
+            parts = [f"{name};dur={ms:.1f}" for name, ms in sorted(self.ms.items())]
+        return ", ".join(parts + [f"total;dur={total_ms:.1f}"])
+
+
+_TIMINGS: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("fusion_timings", default=None)
+
+
+class timed:
+    """
+    Context manager / decorator (sync and async functions) timing a dependency call.
+    """
+
+    def __init__(self, dependency: str) -> None:
+        self.dependency = dependency
+        self.started = 0.0
+        self.failed = False  # set for a call that returned an error without raising
+
+    def __enter__(self) -> "timed":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        record(self.dependency, time.perf_counter() - self.started, failed=self.failed or exc_type is not None)
+
+    def __call__(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        dependency = self.dependency
+        if iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def awrapper(*args: Any, **kwargs: Any) -> Any:
+                with timed(dependency):
+                    return await fn(*args, **kwargs)
+            return awrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with timed(dependency):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def record(dependency: str, seconds: float, failed: bool = False) -> None:
+    timings = _TIMINGS.get()
+    endpoint = timings.endpoint if timings is not None else "background"
+    DEP_DURATION.observe(seconds, dependency=dependency, endpoint=endpoint)
+    if failed:
+        DEP_ERRORS.inc(dependency=dependency, endpoint=endpoint)
+    if timings is not None:
+        timings.add(dependency, seconds * 1000)
+
+
+# ===================== Middleware / view =====================
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Any) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def process_view(self, request: Any, view_func: Any, view_args: Any, view_kwargs: Any) -> None:
+        # May run in a sync_to_async thread (copied context): mutate the shared object, not the contextvar.
+        timings = getattr(request, "fusion_timings", None)
+        if timings is not None:
+            match = request.resolver_match
+            timings.endpoint = match.url_name or match.route or "unnamed"
+        return None
+
+    def _start(self, request: Any) -> Tuple[float, contextvars.Token]:
+        request.fusion_timings = RequestTimings()
+        return time.perf_counter(), _TIMINGS.set(request.fusion_timings)
+
+    def _finish(self, request: Any, response: Any, started: float, token: contextvars.Token) -> Any:
+        _TIMINGS.reset(token)
+        elapsed = time.perf_counter() - started
+        timings = request.fusion_timings
+        HTTP_DURATION.observe(elapsed, endpoint=timings.endpoint, method=request.method, status=str(response.status_code))
+        if response.get("Content-Type", "").startswith("application/json"):
+            response["Server-Timing"] = timings.header(elapsed * 1000)
+        return response
+
+    def __call__(self, request: Any) -> Any:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started, token = self._start(request)
+        return self._finish(request, self.get_response(request), started, token)
+
+    async def __acall__(self, request: Any) -> Any:
+        started, token = self._start(request)
+        return self._finish(request, await self.get_response(request), started, token)
+
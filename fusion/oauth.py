@@ -0,0 +1,305 @@
+"""
+Service Fusion OAuth token provider (client_credentials).
+
+- The token is shared by every worker process through a pluggable TokenStore
+  (JSON file under FUSION_RUNTIME_DIR by default).
+- Single-flight: a thread lock plus an exclusive file lock make sure only one
+  refresh is in flight per host; everybody else re-reads the store.
+- Refresh-ahead: a daemon thread renews the token FUSION_OAUTH_REFRESH_MARGIN
+  seconds before ``exp``, so requests only wait on TOKEN_URL when no valid
+  token exists at all (cold start).
+"""
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .http_client import get_client
+from .storage import runtime_path
+
+log = logging.getLogger(__name__)
+
+try:  # POSIX
+    import fcntl
+except ImportError:  # pragma: no cover - Windows dev boxes
+    fcntl = None
+
+
+# ===================== Stores =====================
+class TokenStore(ABC):
+    """
+    Holds ``{"access_token": str, "exp": int, "scope": str}``.
+    """
+
+    @abstractmethod
+    def load(self) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def save(self, tok: Dict[str, Any]) -> None:
+        ...
+
+    @contextlib.contextmanager
+    def lock(self) -> Iterator[None]:
+        """
+        Cross-process exclusive lock held while a refresh is in flight.
+        """
+        yield
+
+
+class MemoryTokenStore(TokenStore):
+    """
+    Per-process store (the previous ``_OAUTH_CACHE`` behaviour).
+    """
+
+    def __init__(self) -> None:
+        self._tok: Optional[Dict[str, Any]] = None
+
+    def load(self):
+        return dict(self._tok) if self._tok else None
+
+    def save(self, tok):
+        self._tok = dict(tok)
+
+
+class FileTokenStore(TokenStore):
+    """
+    JSON file (mode 0600) replaced atomically; ``flock`` on a sidecar file
+    serializes refreshes across the workers of the host.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or str(runtime_path("oauth_token.json"))
+        self.lock_path = self.path + ".lock"
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, tok):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(tok, f)
+        os.replace(tmp, self.path)
+
+    @contextlib.contextmanager
+    def lock(self):
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+# ===================== Provider =====================
+class TokenProvider:
+    """
+    ``fetch()`` performs the OAuth round trip and returns ``(access_token, expires_in)``.
+    ``scope`` identifies the credentials so two client ids never share a token.
+    """
+
+    def __init__(self, store: TokenStore, fetch: Callable[[], Tuple[str, int]], *, scope: str = "",
+                 refresh_margin: int = 300, min_validity: int = 60) -> None:
+        self.store = store
+        self.fetch = fetch
+        self.scope = scope
+        self.refresh_margin = refresh_margin
+        self.min_validity = min_validity
+        self._memo: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+
+    # ---------- reads ----------
+    def _usable(self, tok: Optional[Dict[str, Any]], margin: int) -> bool:
+        return bool(tok and tok.get("access_token") and tok.get("scope", "") == self.scope
+                    and tok.get("exp", 0) > time.time() + margin)
+
+    def _ahead_margin(self, tok: Optional[Dict[str, Any]]) -> int:
+        # Short-lived tokens: refresh at half-life rather than spinning on the margin.
+        return int(min(self.refresh_margin, (tok or {}).get("ttl", self.refresh_margin * 2) / 2))
+
+    def get_token(self) -> str:
+        tok = self._memo
+        if not self._usable(tok, self.min_validity):
+            tok = self.store.load()
+            if self._usable(tok, self.min_validity):
+                self._memo = tok
+            else:
+                tok = self.refresh()
+        if not self._usable(tok, self._ahead_margin(tok)):
+            self._wake.set()  # refresh ahead, without making this request wait
+        self.start_refresher()
+        return tok["access_token"]
+
+    def cached_token(self) -> Optional[str]:
+        """
+        The in-memory token when it is still valid: no store read, no lock, so
+        async callers can use it on the event loop. None: call ``get_token()``.
+        """
+        tok = self._memo
+        if not self._usable(tok, self.min_validity):
+            return None
+        if not self._usable(tok, self._ahead_margin(tok)):
+            self._wake.set()
+        return tok["access_token"]
+
+    def invalidate(self, access_token: Optional[str] = None) -> None:
+        """
+        Drops the cached token (e.g. after a 401) so the next call refreshes.
+        With ``access_token``, only while that is still the current token: after
+        concurrent 401s the first caller clears it, the others keep the new one.
+        """
+        def stale(tok: Optional[Dict[str, Any]]) -> bool:
+            return access_token is None or bool(tok and tok.get("access_token") == access_token)
+
+        with self._lock:
+            if stale(self._memo):
+                self._memo = None
+            with self.store.lock():
+                if stale(self.store.load()):
+                    self.store.save({"access_token": None, "exp": 0, "scope": self.scope})
+
+    # ---------- refresh (single-flight) ----------
+    def refresh(self, ahead: bool = False) -> Dict[str, Any]:
+        """
+        ``ahead=False``: returns any token still valid for ``min_validity``.
+        ``ahead=True``: only accepts a token outside the refresh margin.
+        """
+        def margin(t):
+            return self._ahead_margin(t) if ahead else self.min_validity
+
+        with self._lock:
+            tok = self.store.load()
+            if self._usable(tok, margin(tok)):
+                self._memo = tok
+                return tok
+            with self.store.lock():
+                tok = self.store.load()  # another process may have refreshed meanwhile
+                if not self._usable(tok, margin(tok)):
+                    access_token, ttl = self.fetch()
+                    tok = {"access_token": access_token, "exp": int(time.time()) + int(ttl), "ttl": int(ttl), "scope": self.scope}
+                    self.store.save(tok)
+            self._memo = tok
+            return tok
+
+    def start_refresher(self) -> None:
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        with self._lock:
+            if self._refresher is None or not self._refresher.is_alive():
+                self._refresher = threading.Thread(target=self._refresh_loop, name="fusion-oauth-refresh", daemon=True)
+                self._refresher.start()
+
+    def _refresh_loop(self) -> None:
+        backoff = 5.0
+        while True:
+            try:
+                tok = self.refresh(ahead=True)
+                backoff = 5.0
+                # Wake up at exp - margin; jitter spreads the workers of the host.
+                margin = self._ahead_margin(tok)
+                delay = tok["exp"] - margin - time.time() + random.uniform(0, min(15.0, margin / 4))
+            except Exception as e:
+                log.error("OAuth refresh-ahead failed: %s", e)
+                delay, backoff = backoff, min(backoff * 2, 120.0)
+            self._wake.wait(timeout=max(delay, 1.0))
+            self._wake.clear()
+
+
+# ===================== Wiring =====================
+def _credentials() -> Tuple[str, str]:
+    client_id = (getattr(settings, "SERVICE_FUSION_CLIENT_ID", "") or "").strip()
+    client_secret = (getattr(settings, "SERVICE_FUSION_CLIENT_SECRET", "") or "").strip()
+    if not client_id or not client_secret:
+        raise RuntimeError("SERVICE_FUSION_CLIENT_ID / SERVICE_FUSION_CLIENT_SECRET manquants.")
+    return client_id, client_secret
+
+
+def fetch_client_credentials_token() -> Tuple[str, int]:
+    """
+    The OAuth round trip itself (POST TOKEN_URL, grant_type=client_credentials).
+    """
+    client_id, client_secret = _credentials()
+    base = getattr(settings, "SERVICE_FUSION_BASE_URL", "") or "https://api.servicefusion.com"
+    token_url = getattr(settings, "SERVICE_FUSION_TOKEN_URL", "") or f"{base}/oauth/access_token"
+    data = {"grant_type": "client_credentials", "client_id": client_id, "client_secret": client_secret}
+    r = get_client().request(
+        "POST",
+        token_url,
+        paced=False,  # a cold-start token must not queue behind the API calls waiting for it
+        headers={"Accept": "application/json", "Content-Type": "application/x-www-form-urlencoded"},
+        data=data,
+    )
+    if r.status_code != 200:
+        raise RuntimeError(f"OAuth token failed: {r.status_code} {r.text[:300]}")
+
+    j = r.json()
+    tok = j.get("access_token")
+    if not tok:
+        raise RuntimeError(f"OAuth response without access_token: {j}")
+    try:
+        ttl = int(j.get("expires_in", "3600"))
+    except Exception:
+        ttl = 3600
+    return tok, ttl
+
+
+def _build_store() -> TokenStore:
+    kind = getattr(settings, "FUSION_OAUTH_STORE", "file") or "file"
+    if kind == "file":
+        return FileTokenStore()
+    if kind == "memory":
+        return MemoryTokenStore()
+    return import_string(kind)()
+
+
+_PROVIDER: Optional[TokenProvider] = None
+_PROVIDER_PID: Optional[int] = None
+_PROVIDER_LOCK = threading.Lock()
+
+
+def get_token_provider() -> TokenProvider:
+    global _PROVIDER, _PROVIDER_PID
+    if _PROVIDER is None or _PROVIDER_PID != os.getpid():
+        with _PROVIDER_LOCK:
+            if _PROVIDER is None or _PROVIDER_PID != os.getpid():
+                client_id = (getattr(settings, "SERVICE_FUSION_CLIENT_ID", "") or "").strip()
+                _PROVIDER = TokenProvider(
+                    _build_store(),
+                    fetch_client_credentials_token,
+                    scope=hashlib.sha256(client_id.encode()).hexdigest()[:16],
+                    refresh_margin=int(getattr(settings, "FUSION_OAUTH_REFRESH_MARGIN", 300)),
+                )
+                _PROVIDER_PID = os.getpid()
+    return _PROVIDER
+
+
+def warm_token(**kwargs: Any) -> None:
+    """
+    ``request_started`` receiver: starts the refresh-ahead thread of the process.
+    """
+    try:
+        get_token_provider().start_refresher()
+    except Exception:
+        pass
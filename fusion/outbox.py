@@ -0,0 +1,406 @@
+"""
+Outbound email queue with pooled, long-lived SMTP connections.
+
+- Every message is persisted first (SQLite under FUSION_RUNTIME_DIR), so a
+  crash or an SMTP outage never loses a notification.
+- One sender thread per process claims due messages in batches (leased, like
+  fusion/tasks.py) and sends them over connections it keeps open between
+  batches: the TLS/SMTP handshake is paid once, not per message. A connection
+  idle for more than FUSION_OUTBOX_IDLE_TIMEOUT, or failing a NOOP before
+  reuse, is closed and reopened. A connection lost during the send itself is
+  not retried (the relay may have accepted the message): that attempt fails.
+- Transports keep the historical order: primary settings, then Gmail SSL:465
+  (only for Gmail / unset hosts). A message that fails on all of them is
+  retried with jittered exponential backoff; after FUSION_OUTBOX_MAX_ATTEMPTS
+  it is printed to the console backend (as before) and marked failed.
+- ``send(..., wait=s)`` lets callers keep their "delivered?" bool; the status
+  of any message is served by ``/sf/emails/<id>``.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import smtplib
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from .breaker import CircuitOpenError, breaker
+from .metrics import timed
+from .storage import runtime_path, sqlite_connect
+
+log = logging.getLogger(__name__)
+
+Transport = Tuple[str, Callable[[], Any]]  # (name, connection factory)
+
+FINAL = ("sent", "failed")
+
+
+# ===================== Store =====================
+class OutboxStore:
+    _JSON_FIELDS = ("recipients", "headers")
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or str(runtime_path("outbox.sqlite3"))
+        self._lock = threading.Lock()
+        self._conn = sqlite_connect(self.path)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS emails (
+                id TEXT PRIMARY KEY, status TEXT NOT NULL, subject TEXT, body TEXT, subtype TEXT,
+                from_email TEXT, recipients TEXT, headers TEXT, attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL DEFAULT 0, transport TEXT, error TEXT, owner TEXT,
+                lease_until REAL NOT NULL DEFAULT 0, created_at REAL NOT NULL, updated_at REAL NOT NULL,
+                sent_at REAL)"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS emails_due ON emails(status, next_attempt)")
+
+    def _decode(self, row: Any) -> Dict[str, Any]:
+        rec = dict(row)
+        for k in self._JSON_FIELDS:
+            rec[k] = json.loads(rec[k]) if rec[k] else None
+        return rec
+
+    def create(self, rec: Dict[str, Any]) -> None:
+        rec = dict(rec)
+        for k in self._JSON_FIELDS:
+            rec[k] = json.dumps(rec.get(k))
+        cols = ", ".join(rec)
+        with self._lock:
+            self._conn.execute(f"INSERT INTO emails ({cols}) VALUES ({', '.join('?' * len(rec))})", tuple(rec.values()))
+
+    def get(self, email_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM emails WHERE id = ?", (email_id,)).fetchone()
+        return self._decode(row) if row else None
+
+    def update(self, email_id: str, **fields: Any) -> None:
+        fields["updated_at"] = time.time()
+        sets = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE emails SET {sets} WHERE id = ?", (*fields.values(), email_id))
+
+    def claim(self, owner: str, lease_until: float, now: float, limit: int) -> List[Dict[str, Any]]:
+        """
+        Atomically takes up to ``limit`` due messages (queued, or sending with an expired lease).
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [r["id"] for r in self._conn.execute(
+                    "SELECT id FROM emails WHERE (status = 'queued' AND next_attempt <= ?) "
+                    "OR (status = 'sending' AND lease_until < ?) ORDER BY created_at LIMIT ?",
+                    (now, now, limit),
+                )]
+                rows = []
+                if ids:
+                    marks = ", ".join("?" * len(ids))
+                    self._conn.execute(
+                        f"UPDATE emails SET status = 'sending', owner = ?, lease_until = ?, attempts = attempts + 1, "
+                        f"updated_at = ? WHERE id IN ({marks})", (owner, lease_until, now, *ids),
+                    )
+                    rows = self._conn.execute(f"SELECT * FROM emails WHERE id IN ({marks}) ORDER BY created_at", ids).fetchall()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [self._decode(r) for r in rows]
+
+    def renew(self, email_id: str, owner: str, lease_until: float) -> bool:
+        """
+        Extends the lease of a message this owner is sending; False if it was reclaimed meanwhile.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE emails SET lease_until = ?, updated_at = ? WHERE id = ? AND owner = ? AND status = 'sending'",
+                (lease_until, time.time(), email_id, owner),
+            ).rowcount == 1
+
+    def next_due(self) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(next_attempt) FROM emails WHERE status = 'queued'").fetchone()
+        return row[0]
+
+    def purge(self, before: float) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM emails WHERE status IN ('sent', 'failed') AND updated_at < ?", (before,)
+            ).rowcount
+
+
+# ===================== Connection pool =====================
+class DeliveryUnknown(Exception):
+    """
+    The connection dropped mid-send: the message may have been accepted.
+    """
+
+
+class SMTPPool:
+    """
+    Open connections per transport, owned by the sender thread (no locking).
+    """
+
+    def __init__(self, idle_timeout: float = 60.0) -> None:
+        self.idle_timeout = idle_timeout
+        self._conns: Dict[str, Tuple[Any, float]] = {}
+        self.opened = 0
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        conn, last = self._conns.get(name, (None, 0.0))
+        if conn is not None and (time.monotonic() - last > self.idle_timeout or not self._alive(conn)):
+            self.discard(name)  # servers drop idle sessions: reconnect rather than fail
+            conn = None
+        if conn is None:
+            conn = factory()
+            conn.open()  # opened here, Django's backend keeps it open across send_messages()
+            self.opened += 1
+            self._conns[name] = (conn, time.monotonic())
+        return conn
+
+    @staticmethod
+    def _alive(conn: Any) -> bool:
+        """
+        NOOP on a pooled connection before reusing it: a stale one is caught
+        here, before any DATA, so reconnecting cannot send a message twice.
+        """
+        smtp = getattr(conn, "connection", None)
+        if smtp is None:
+            return True  # not an SMTP backend (console fallback...)
+        try:
+            return smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, name: str, factory: Callable[[], Any], msg: EmailMessage) -> None:
+        """
+        No resend on a new connection once the message went out: a relay that
+        dropped the link after DATA may have accepted it (``DeliveryUnknown``).
+        """
+        with timed("smtp"):
+            conn = self._get(name, factory)  # connect / NOOP failures: nothing was sent
+            try:
+                conn.send_messages([msg])
+            except (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout) as e:
+                self.discard(name)
+                raise DeliveryUnknown(f"connection lost while sending: {e}") from e
+        self._conns[name] = (self._conns[name][0], time.monotonic())
+
+    def discard(self, name: str) -> None:
+        conn, _ = self._conns.pop(name, (None, 0.0))
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def close_idle(self) -> None:
+        now = time.monotonic()
+        for name, (_, last) in list(self._conns.items()):
+            if now - last > self.idle_timeout:
+                self.discard(name)
+
+
+# ===================== Outbox =====================
+def _smtp_hint(name: str, e: BaseException) -> str:
+    msg = str(e)
+    if "535" in msg and "Username and Password not accepted" in msg:
+        return (f"SMTP 535 ({name}): Gmail/Workspace rejected credentials. "
+                "Ensure EMAIL_HOST_USER is the mailbox and EMAIL_HOST_PASSWORD is an App Password.")
+    return f"SMTP send error ({name}): {e}"
+
+
+class Outbox:
+    def __init__(self, store: OutboxStore, transports: Callable[[], List[Transport]], *, batch: int = 20,
+                 max_attempts: int = 5, lease: float = 120.0, idle_timeout: float = 60.0,
+                 retention: float = 7 * 86400) -> None:
+        self.store = store
+        self.transports = transports
+        self.batch = batch
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.retention = retention
+        self.pool = SMTPPool(idle_timeout)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._wake = threading.Event()
+        self._sent = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # ---------- API ----------
+    def submit(self, subject: str, body: str, to: List[str], from_email: str,
+               headers: Optional[Dict[str, str]] = None, subtype: str = "html") -> str:
+        now = time.time()
+        email_id = uuid.uuid4().hex
+        self.store.create({
+            "id": email_id, "status": "queued", "subject": subject, "body": body, "subtype": subtype,
+            "from_email": from_email, "recipients": list(to), "headers": headers or {}, "attempts": 0,
+            "next_attempt": now, "created_at": now, "updated_at": now,
+        })
+        self.start()
+        self._wake.set()
+        return email_id
+
+    def wait(self, email_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Waits until the message is sent / failed (or ``timeout``); returns its status.
+        Polls the store too, since another process's sender may have sent it.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            rec = self.status(email_id)
+            left = deadline - time.monotonic()
+            if rec is None or rec["status"] in FINAL or left <= 0 or (rec["attempts"] and rec["status"] == "queued"):
+                return rec
+            with self._sent:
+                self._sent.wait(timeout=min(left, 0.25))
+
+    def send(self, subject: str, body: str, to: List[str], from_email: str,
+             headers: Optional[Dict[str, str]] = None, subtype: str = "html", wait: float = 0.0) -> Dict[str, Any]:
+        email_id = self.submit(subject, body, to, from_email, headers, subtype)
+        return (self.wait(email_id, wait) if wait > 0 else None) or {"id": email_id, "status": "queued"}
+
+    def status(self, email_id: str) -> Optional[Dict[str, Any]]:
+        rec = self.store.get(email_id)
+        if rec is None:
+            return None
+        for k in ("body", "headers", "owner", "lease_until"):
+            rec.pop(k, None)
+        return rec
+
+    # ---------- sender ----------
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self.store.purge(time.time() - self.retention)
+                self._thread = threading.Thread(target=self._loop, name="fusion-outbox", daemon=True)
+                self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                now = time.time()
+                batch = self.store.claim(self.owner, now + self.lease, now, self.batch)
+                if batch:
+                    self._deliver(batch)
+                    continue
+                self.pool.close_idle()
+                due = self.store.next_due()
+                delay = 30.0 if due is None else max(0.05, min(30.0, due - time.time()))
+                self._wake.wait(timeout=delay)
+                self._wake.clear()
+            except Exception as e:
+                log.exception("Outbox sender error: %s", e)
+                time.sleep(1.0)
+
+    def _message(self, rec: Dict[str, Any]) -> EmailMessage:
+        msg = EmailMessage(subject=rec["subject"], body=rec["body"], from_email=rec["from_email"],
+                           to=rec["recipients"], headers=rec["headers"] or {})
+        msg.content_subtype = rec["subtype"] or "plain"
+        return msg
+
+    def _deliver(self, batch: List[Dict[str, Any]]) -> None:
+        smtp = breaker("smtp")
+        transports = self.transports()
+        for rec in batch:
+            # The batch lease covers the claim, not a slow relay: each message gets a fresh
+            # lease (one message, all transports, fits in it) and is skipped if another
+            # process already reclaimed it, so nothing is sent twice.
+            if not self.store.renew(rec["id"], self.owner, time.time() + self.lease):
+                log.warning("Email %s was reclaimed by another sender; skipped.", rec["id"])
+                continue
+            try:
+                smtp.before()
+            except CircuitOpenError as e:
+                # Not an attempt: wait for the breaker's probe window.
+                self.store.update(rec["id"], status="queued", attempts=rec["attempts"] - 1,
+                                  next_attempt=time.time() + e.retry_in, error=str(e))
+                continue
+            sent_with, errors = None, []
+            for name, factory in transports:
+                try:
+                    self.pool.send(name, factory, self._message(rec))
+                    sent_with = name
+                    break
+                except DeliveryUnknown as e:
+                    # Not handed to the next transport (possible duplicate): the backoff retries later.
+                    errors.append(_smtp_hint(name, e))
+                    log.error("%s", errors[-1])
+                    break
+                except Exception as e:
+                    self.pool.discard(name)
+                    errors.append(_smtp_hint(name, e))
+                    log.error("%s", errors[-1])
+            if sent_with:
+                smtp.success()
+                log.info("Email %s sent (%s).", rec["id"], sent_with)
+                self.store.update(rec["id"], status="sent", transport=sent_with, sent_at=time.time(), error=None)
+            else:
+                smtp.failure()
+                self._failed(rec, " | ".join(errors) or "no SMTP transport configured")
+        with self._sent:
+            self._sent.notify_all()
+
+    def _failed(self, rec: Dict[str, Any], error: str) -> None:
+        if rec["attempts"] < self.max_attempts:
+            delay = random.uniform(0.5, 1.0) * min(900.0, 10.0 * 2 ** (rec["attempts"] - 1))
+            self.store.update(rec["id"], status="queued", next_attempt=time.time() + delay, error=error)
+            return
+        # Console fallback (no external SMTP; guarantees traceability).
+        try:
+            with get_connection("django.core.mail.backends.console.EmailBackend") as conn:
+                msg = self._message(rec)
+                msg.connection = conn
+                msg.send(fail_silently=True)
+            log.warning("Email %s printed to console backend as fallback.", rec["id"])
+        except Exception as e3:
+            log.error("Console email fallback failed: %s", e3)
+        self.store.update(rec["id"], status="failed", transport="console", error=error)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.store._lock:
+            rows = self.store._conn.execute("SELECT status, COUNT(*) AS n FROM emails GROUP BY status").fetchall()
+        return {"by_status": {r["status"]: r["n"] for r in rows}, "connections_opened": self.pool.opened}
+
+
+# ===================== Per-process singleton =====================
+_OUTBOX: Optional[Outbox] = None
+_OUTBOX_PID: Optional[int] = None
+_OUTBOX_LOCK = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    global _OUTBOX, _OUTBOX_PID
+    if _OUTBOX is None or _OUTBOX_PID != os.getpid():
+        with _OUTBOX_LOCK:
+            if _OUTBOX is None or _OUTBOX_PID != os.getpid():
+                from .views import _smtp_transports  # late import: views imports this module
+                _OUTBOX = Outbox(
+                    OutboxStore(":memory:" if getattr(settings, "FUSION_OUTBOX_STORE", "sqlite") == "memory" else None),
+                    _smtp_transports,
+                    batch=int(getattr(settings, "FUSION_OUTBOX_BATCH", 20)),
+                    max_attempts=int(getattr(settings, "FUSION_OUTBOX_MAX_ATTEMPTS", 5)),
+                    # Per-message lease: 2 transports x (send + one reconnect) at EMAIL_TIMEOUT each, plus slack.
+                    lease=max(120.0, 4 * float(getattr(settings, "EMAIL_TIMEOUT", 30) or 30) + 30.0),
+                    idle_timeout=float(getattr(settings, "FUSION_OUTBOX_IDLE_TIMEOUT", 60)),
+                    retention=float(getattr(settings, "FUSION_OUTBOX_RETENTION_DAYS", 7)) * 86400,
+                )
+                _OUTBOX_PID = os.getpid()
+    return _OUTBOX
+
+
+def start_outbox(**kwargs: Any) -> None:
+    """
+    ``request_started`` receiver: resumes delivery of messages persisted by a previous run.
+    """
+    try:
+        get_outbox().start()
+    except Exception as e:
+        log.warning("Outbox unavailable: %s", e)
@@ -0,0 +1,124 @@
+"""
+Rendered-page cache for the static-ish HTML pages (home, platform).
+
+``render_cached(request, template_name, context)`` renders once per
+(template, context hash, template file version, release) and keeps the bytes
+and their gzip variant in a bounded in-process LRU. Responses carry a content
+ETag (per encoding) with ``Cache-Control: no-cache``: browsers revalidate and
+get a 304 while the page is unchanged; otherwise the stored (gzipped when
+accepted) bytes are sent as-is.
+
+Invalidation: entries are keyed on the template file's mtime / size (an
+edited template or a new ``build_assets`` output is picked up) and on
+FUSION_RELEASE (set per deploy); a restart also starts with an empty cache.
+Only for pages whose output does not depend on the request (no csrf_token,
+user or query string in the template).
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, HttpResponseNotModified
+from django.shortcuts import render
+from django.template.loader import get_template
+from django.utils.cache import patch_vary_headers
+
+from .assets import etag_matches, negotiate
+
+
+class PageCache:
+    def __init__(self, maxsize: int = 32) -> None:
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Tuple[str, ...], Tuple[str, bytes, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.not_modified = 0
+
+    def get(self, key: Tuple[str, ...]) -> Optional[Tuple[str, bytes, bytes]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple[str, ...], entry: Tuple[str, bytes, bytes]) -> None:
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses, "not_modified": self.not_modified}
+
+
+_CACHE: Optional[PageCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def page_cache() -> PageCache:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = PageCache(int(getattr(settings, "FUSION_PAGE_CACHE_MAX_ENTRIES", 32)))
+    return _CACHE
+
+
+def _key(template_name: str, context: Optional[Dict[str, Any]]) -> Tuple[str, ...]:
+    origin = get_template(template_name).origin.name  # cached loader: no re-parse
+    try:
+        st = os.stat(origin)
+        version = f"{st.st_mtime_ns}:{st.st_size}"
+    except OSError:
+        version = ""
+    ctx = hashlib.sha256(json.dumps(context or {}, sort_keys=True, default=str).encode()).hexdigest()
+    return (template_name, ctx, version, getattr(settings, "FUSION_RELEASE", ""))
+
+
+def _send(request: HttpRequest, digest: str, body: bytes, gz: bytes) -> HttpResponse:
+    gzipped = negotiate(request.headers.get("Accept-Encoding", ""), ("gzip",)) == "gzip"
+    etag = f'"{digest}-gzip"' if gzipped else f'"{digest}"'
+    if etag_matches(request.headers.get("If-None-Match"), f'"{digest}"', f'"{digest}-gzip"'):
+        page_cache().count("not_modified")
+        response = HttpResponseNotModified()
+    elif gzipped:
+        response = HttpResponse(gz, content_type="text/html; charset=utf-8")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(body, content_type="text/html; charset=utf-8")
+    response["ETag"] = etag
+    response["Cache-Control"] = "no-cache"
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+def render_cached(request: HttpRequest, template_name: str, context: Optional[Dict[str, Any]] = None) -> HttpResponse:
+    if not getattr(settings, "FUSION_PAGE_CACHE_ENABLED", True) or request.method not in ("GET", "HEAD"):
+        return render(request, template_name, context)
+    cache = page_cache()
+    key = _key(template_name, context)
+    entry = cache.get(key)
+    if entry is None:
+        cache.count("misses")
+        body = render(request, template_name, context).content
+        entry = (hashlib.sha256(body).hexdigest()[:20], body, gzip.compress(body, compresslevel=6, mtime=0))
+        cache.put(key, entry)
+    else:
+        cache.count("hits")
+    return _send(request, *entry)
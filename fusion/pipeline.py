@@ -0,0 +1,179 @@
+"""
+Tiny dependency-graph runner for multi-step request pipelines.
+
+Stages declare the stages they depend on; every stage whose dependencies are
+done starts immediately, so independent network calls overlap instead of
+adding up. Per-stage wall time (ms) is recorded for the JSON response.
+
+    p = Pipeline()
+    p.stage("llm", lambda r: call_llm(...))
+    p.stage("job", lambda r: create(r["llm"]), after=("llm",))
+    p.stage("note", lambda r: add_note(r["job"]), after=("job",), required=False)
+    results = p.run()          # or: await p.arun() with coroutine stages
+    p.timings                  # {"llm": 812.4, "job": 301.2, "note": 95.0, "total": 1209.8}
+
+``on_stage(name, state, detail)`` is called with running / done / failed / skipped
+(used by the background task queue to publish progress).
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import inspect
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .profiling import attached
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[[Dict[str, Any]], Any]
+    after: Tuple[str, ...] = ()
+    required: bool = True
+
+
+def _attached_call(fn: Callable[[Dict[str, Any]], Any], results: Dict[str, Any]) -> Any:
+    with attached():
+        return fn(results)
+
+
+class Pipeline:
+    """
+    - ``required`` stage failure: nothing new is started and the exception is re-raised.
+    - optional stage failure: recorded in ``errors``; stages depending on it are skipped.
+    """
+
+    def __init__(self, max_workers: int = 8, on_stage: Optional[Callable[[str, str, Dict[str, Any]], None]] = None) -> None:
+        self.max_workers = max_workers
+        self.on_stage = on_stage
+        self._stages: Dict[str, Stage] = {}
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, BaseException] = {}
+        self.skipped: set[str] = set()
+        self.timings: Dict[str, float] = {}
+
+    def stage(self, name: str, fn: Callable[[Dict[str, Any]], Any], *, after: Tuple[str, ...] = (), required: bool = True) -> "Pipeline":
+        unknown = [d for d in after if d not in self._stages]
+        if unknown:
+            raise ValueError(f"Stage {name!r} depends on undeclared stage(s): {unknown}")
+        self._stages[name] = Stage(name, fn, tuple(after), required)
+        return self
+
+    # ---------- scheduling ----------
+    def _emit(self, name: str, state: str, **detail: Any) -> None:
+        if self.on_stage is not None:
+            try:
+                self.on_stage(name, state, detail)
+            except Exception:
+                pass
+
+    def _ready(self, pending: Dict[str, Stage]) -> list[Stage]:
+        ready = []
+        for name, st in list(pending.items()):
+            if any(d in self.errors or d in self.skipped for d in st.after):
+                self.skipped.add(name)
+                del pending[name]
+                self._emit(name, "skipped")
+            elif all(d in self.results for d in st.after):
+                ready.append(st)
+                del pending[name]
+        return ready
+
+    def _record(self, st: Stage, started: float, error: Optional[BaseException] = None) -> None:
+        ms = self.timings[st.name] = round((time.perf_counter() - started) * 1000, 1)
+        if error is None:
+            self._emit(st.name, "done", ms=ms)
+        else:
+            self._emit(st.name, "failed", ms=ms, error=str(error))
+
+    def _call(self, st: Stage) -> Any:
+        started = time.perf_counter()
+        self._emit(st.name, "running")
+        try:
+            with attached():  # sampled with the request when it is being profiled
+                out = st.fn(self.results)
+        except Exception as e:
+            self._record(st, started, e)
+            raise
+        self._record(st, started)
+        return out
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Runs the graph on a per-call thread pool. Each stage runs in a copy of the
+        caller's context so request-scoped contextvars stay visible.
+        """
+        t0 = time.perf_counter()
+        pending = dict(self._stages)
+        running: Dict[Future, Stage] = {}
+        failure: Optional[BaseException] = None
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(pending))), thread_name_prefix="fusion-pipeline") as pool:
+            while True:
+                if failure is None:
+                    for st in self._ready(pending):
+                        running[pool.submit(contextvars.copy_context().run, self._call, st)] = st
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for f in done:
+                    st = running.pop(f)
+                    try:
+                        self.results[st.name] = f.result()
+                    except Exception as e:
+                        self.errors[st.name] = e
+                        if st.required and failure is None:
+                            failure = e
+        self.skipped.update(pending)
+        self.timings["total"] = round((time.perf_counter() - t0) * 1000, 1)
+        if failure is not None:
+            raise failure
+        return self.results
+
+    async def arun(self) -> Dict[str, Any]:
+        """
+        Same contract as ``run`` on the running event loop. Coroutine stages are
+        awaited; plain callables run in a worker thread.
+        """
+        t0 = time.perf_counter()
+        pending = dict(self._stages)
+        running: Dict[asyncio.Task, Stage] = {}
+        failure: Optional[BaseException] = None
+
+        async def call(st: Stage) -> Any:
+            started = time.perf_counter()
+            self._emit(st.name, "running")
+            try:
+                if inspect.iscoroutinefunction(st.fn):
+                    out = await st.fn(self.results)
+                else:
+                    out = await asyncio.to_thread(_attached_call, st.fn, self.results)
+            except Exception as e:
+                self._record(st, started, e)
+                raise
+            self._record(st, started)
+            return out
+
+        while True:
+            if failure is None:
+                for st in self._ready(pending):
+                    running[asyncio.ensure_future(call(st))] = st
+            if not running:
+                break
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                st = running.pop(t)
+                try:
+                    self.results[st.name] = t.result()
+                except Exception as e:
+                    self.errors[st.name] = e
+                    if st.required and failure is None:
+                        failure = e
+        self.skipped.update(pending)
+        self.timings["total"] = round((time.perf_counter() - t0) * 1000, 1)
+        if failure is not None:
+            raise failure
+        return self.results
@@ -0,0 +1,274 @@
+"""
+Opt-in wall-clock sampling profiler for the fusion API endpoints.
+
+A request is profiled when FUSION_PROFILE_ENABLED is on, its URL name is in
+FUSION_PROFILE_ENDPOINTS, and either:
+- it carries ``X-Fusion-Profile: <FUSION_PROFILE_TOKEN>`` (header trigger; the
+  response then names the dump in ``X-Fusion-Profile``), or
+- it falls in the FUSION_PROFILE_SAMPLE_RATE fraction of requests (dump only
+  logged, no response header).
+
+While at least one profiled request is running, a sampler thread reads the
+stacks of the threads serving it every FUSION_PROFILE_INTERVAL seconds: the
+request thread plus the pipeline workers running its stages (fusion/pipeline.py
+attaches them). Wall clock means time blocked on Service Fusion, the LLM or
+SMTP shows up as well as CPU time.
+
+Under ASGI the event-loop thread serves every request at once, so it is not
+sampled; the request's task is instead, as its chain of coroutines (each
+awaiting the next). That shows where the request waits; synchronous calls
+made by the coroutine that is running are not visible, and work handed to
+``sync_to_async`` threads ends the chain at the awaited future.
+
+Each profile is written to FUSION_RUNTIME_DIR/profiles as a collapsed-stack
+file (``frame;frame;frame count`` per line, root first, the endpoint as root
+frame) that flamegraph.pl / speedscope read directly. ``manage.py sf_profiles``
+aggregates them.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Iterator, List, Optional, Set
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+from .storage import runtime_path
+
+log = logging.getLogger(__name__)
+
+HEADER = "X-Fusion-Profile"
+DEFAULT_ENDPOINTS = ("sf_create_job", "sf_search_customers", "sf_create_customer", "sf_get_customer", "sf_get_job")
+
+
+def profiles_dir() -> Path:
+    return runtime_path("profiles", "x").parent
+
+
+class Session:
+    def __init__(self, endpoint: str, max_seconds: float, asked: bool = False) -> None:
+        self.endpoint = endpoint
+        self.deadline = time.monotonic() + max_seconds
+        self.asked = asked
+        self.task: Optional[asyncio.Task] = None
+        self.threads: Set[int] = set()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+
+_SESSION: contextvars.ContextVar[Optional[Session]] = contextvars.ContextVar("fusion_profile", default=None)
+
+
+@contextlib.contextmanager
+def attached() -> Iterator[None]:
+    """
+    Adds the current thread to the profile of the request it works for, if any.
+    """
+    session = _SESSION.get()
+    if session is None:
+        yield
+        return
+    tid = threading.get_ident()
+    session.threads.add(tid)
+    try:
+        yield
+    finally:
+        session.threads.discard(tid)
+
+
+def _collapse(frame: Any) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _collapse_task(task: asyncio.Task) -> str:
+    names = []
+    coro: Any = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return ";".join(names)
+
+
+# ===================== Sampler =====================
+class Sampler:
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self._sessions: Set[Session] = set()
+        self._lock = threading.Lock()
+        self._pass = threading.Lock()  # held while a sampling pass writes session.stacks
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def start(self, session: Session) -> None:
+        with self._lock:
+            self._sessions.add(session)
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._loop, name="fusion-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, session: Session) -> None:
+        """
+        Returns once the session is out of every pass: its stacks can then be read.
+        """
+        with self._lock:
+            self._sessions.discard(session)
+        with self._pass:
+            pass
+
+    def _loop(self) -> None:
+        while True:
+            with self._lock:
+                sessions = list(self._sessions)
+            if not sessions:
+                self._wake.clear()
+                self._wake.wait(timeout=60)
+                continue
+            with self._pass:
+                self._sample(sessions)
+            time.sleep(self.interval)
+
+    def _sample(self, sessions: List[Session]) -> None:
+        frames = sys._current_frames()
+        now = time.monotonic()
+        for s in sessions:
+            if now > s.deadline:
+                continue
+            s.samples += 1
+            if s.task is not None:
+                stack = _collapse_task(s.task)
+                if stack:
+                    s.stacks[f"{s.endpoint};{stack}"] += 1
+            for tid in list(s.threads):
+                frame = frames.get(tid)
+                if frame is not None:
+                    s.stacks[f"{s.endpoint};{_collapse(frame)}"] += 1
+
+
+_SAMPLER: Optional[Sampler] = None
+_SAMPLER_LOCK = threading.Lock()
+
+
+def sampler() -> Sampler:
+    global _SAMPLER
+    if _SAMPLER is None:
+        with _SAMPLER_LOCK:
+            if _SAMPLER is None:
+                _SAMPLER = Sampler(float(getattr(settings, "FUSION_PROFILE_INTERVAL", 0.005)))
+    return _SAMPLER
+
+
+def write_profile(session: Session) -> Optional[Path]:
+    if not session.stacks:
+        return None
+    folder = profiles_dir()
+    path = folder / f"{time.strftime('%Y%m%d-%H%M%S')}-{session.endpoint}-{uuid.uuid4().hex[:8]}.folded"
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, n in session.stacks.most_common():
+            f.write(f"{stack} {n}\n")
+    keep = int(getattr(settings, "FUSION_PROFILE_MAX_FILES", 500))
+    dumps = sorted(folder.glob("*.folded"), key=lambda p: p.stat().st_mtime)
+    for old in dumps[:max(0, len(dumps) - keep)]:
+        old.unlink(missing_ok=True)
+    return path
+
+
+# ===================== Middleware =====================
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Any) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _session(request: Any) -> Optional[Session]:
+        if not getattr(settings, "FUSION_PROFILE_ENABLED", False):
+            return None
+        token = getattr(settings, "FUSION_PROFILE_TOKEN", "")
+        asked = bool(token) and request.headers.get(HEADER) == token
+        if not asked and random.random() >= float(getattr(settings, "FUSION_PROFILE_SAMPLE_RATE", 0.0)):
+            return None
+        try:
+            endpoint = resolve(request.path_info).url_name or ""
+        except Resolver404:
+            return None
+        if endpoint not in getattr(settings, "FUSION_PROFILE_ENDPOINTS", DEFAULT_ENDPOINTS):
+            return None
+        return Session(endpoint, float(getattr(settings, "FUSION_PROFILE_MAX_SECONDS", 60)), asked=asked)
+
+    def _begin(self, session: Session, task: Optional[asyncio.Task] = None) -> contextvars.Token:
+        if task is not None:
+            session.task = task
+        else:
+            session.threads.add(threading.get_ident())
+        sampler().start(session)
+        return _SESSION.set(session)
+
+    def _detach(self, session: Session, token: contextvars.Token) -> None:
+        _SESSION.reset(token)
+        sampler().stop(session)
+
+    def _end(self, session: Session, token: contextvars.Token, response: Any) -> Any:
+        self._detach(session, token)
+        try:
+            path = write_profile(session)
+        except Exception as e:  # never fail the profiled request over its profile
+            log.warning("Profile dump failed: %s", e)
+            path = None
+        if path is not None:
+            log.info("Profile of %s: %s (%d samples)", session.endpoint, path.name, session.samples)
+            if session.asked:
+                response[HEADER] = path.name
+        return response
+
+    def __call__(self, request: Any) -> Any:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        session = self._session(request)
+        if session is None:
+            return self.get_response(request)
+        token = self._begin(session)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self._detach(session, token)
+            raise
+        return self._end(session, token, response)
+
+    async def __acall__(self, request: Any) -> Any:
+        session = self._session(request)
+        if session is None:
+            return await self.get_response(request)
+        token = self._begin(session, asyncio.current_task())  # the request's task, not the shared loop thread
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            self._detach(session, token)
+            raise
+        return self._end(session, token, response)
+
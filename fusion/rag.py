@@ -0,0 +1,93 @@
+"""
+Bounded-memory extraction of the RAG documents produced by the LLM service.
+
+Only the first ``budget`` characters of a document are ever used (technician
+notes, email excerpt), so nothing here materializes a whole document:
+
+- downloads are streamed to disk with a hard cap (``iter_capped``; see
+  fusion/artifacts.py, which keeps them),
+- .docx: ``word/document.xml`` is read straight out of the zip with
+  ``iterparse``. Only ``w:t`` text runs are kept, parsed elements are
+  cleared, and parsing stops once the budget is reached,
+- JSON / plain text: the file is decoded incrementally and the read stops at
+  the budget.
+"""
+from __future__ import annotations
+
+import xml.etree.ElementTree as ET
+import zipfile
+from pathlib import Path
+from typing import IO, Iterator, List, Optional
+
+import requests
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_T, W_P, W_TAB, W_BR = W_NS + "t", W_NS + "p", W_NS + "tab", W_NS + "br"
+
+CHUNK = 64 * 1024
+
+
+class DocumentTooLarge(ValueError):
+    pass
+
+
+# ===================== Download =====================
+def iter_capped(resp: requests.Response, max_bytes: int) -> Iterator[bytes]:
+    length = resp.headers.get("Content-Length")
+    if length and length.isdigit() and int(length) > max_bytes:
+        raise DocumentTooLarge(f"{resp.url}: {length} bytes > {max_bytes}")
+    total = 0
+    for chunk in resp.iter_content(CHUNK):
+        total += len(chunk)
+        if total > max_bytes:
+            raise DocumentTooLarge(f"{resp.url}: more than {max_bytes} bytes")
+        yield chunk
+
+
+# ===================== Extraction =====================
+def docx_text(fileobj: IO[bytes], budget: int) -> str:
+    """
+    Text of the first paragraphs of a .docx: stops at the paragraph that crosses ``budget``.
+    Runs are concatenated inside a paragraph; paragraphs are joined with a space.
+    """
+    paragraphs: List[str] = []
+    runs: List[str] = []
+    size = pending = 0  # normalized text kept / raw characters of the open paragraph
+    with zipfile.ZipFile(fileobj) as z, z.open("word/document.xml") as xml:
+        for _, el in ET.iterparse(xml, events=("end",)):
+            tag = el.tag
+            if tag == W_T and el.text:
+                runs.append(el.text)
+                pending += len(el.text)
+            elif tag in (W_TAB, W_BR):
+                runs.append(" ")
+            elif tag == W_P:
+                text = " ".join("".join(runs).split())
+                if text:
+                    paragraphs.append(text)
+                    size += len(text) + 1
+                runs, pending = [], 0
+                el.clear()  # drop the parsed subtree: memory stays flat
+            if size > budget or pending > 2 * budget:
+                break
+    text = " ".join("".join(runs).split())
+    if text:
+        paragraphs.append(text)
+    return " ".join(paragraphs)
+
+
+def text_head(path: Path | str, budget: int, encoding: Optional[str] = None) -> str:
+    """
+    First ``budget`` (+1) characters of a text/JSON file.
+    """
+    with open(path, "r", encoding=encoding or "utf-8", errors="replace") as f:
+        return f.read(budget + 1)
+
+
+def clip(text: str, budget: int) -> str:
+    return text[:budget] + "..." if len(text) > budget else text
+
+
+def docx_head(path: Path | str, budget: int) -> str:
+    with open(path, "rb") as f:
+        return docx_text(f, budget)
@@ -0,0 +1,292 @@
+"""
+Client-side pacing of Service Fusion calls.
+
+- Token bucket: FUSION_RATE_LIMIT requests/second with FUSION_RATE_BURST
+  tokens, shared by all threads of the process or, with FUSION_RATE_SHARED,
+  by every process of the host (state file + flock under FUSION_RUNTIME_DIR).
+- Priority lanes: calls made inside ``with lane("background")`` (task workers,
+  index sync) only take a token when no interactive call is waiting in the
+  process, and never dip into the last FUSION_RATE_INTERACTIVE_RESERVE tokens.
+- 429 / 503 responses pause the whole bucket for ``Retry-After`` (or a
+  jittered exponential backoff); idempotent verbs are then retried.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from django.conf import settings
+
+from .storage import runtime_path
+
+try:  # POSIX
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+RETRY_STATUSES = (429, 503)
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+_LANE: contextvars.ContextVar[str] = contextvars.ContextVar("fusion_lane", default=INTERACTIVE)
+
+
+class RateLimitExceeded(RuntimeError):
+    """
+    No token could be obtained within ``max_wait`` seconds.
+    """
+
+
+@contextlib.contextmanager
+def lane(name: str) -> Iterator[None]:
+    token = _LANE.set(name)
+    try:
+        yield
+    finally:
+        _LANE.reset(token)
+
+
+def current_lane() -> str:
+    return _LANE.get()
+
+
+def retry_after(headers: Any, default: float) -> float:
+    """
+    ``Retry-After`` as seconds (delta-seconds or HTTP-date), else ``default``.
+    """
+    value = (headers or {}).get("Retry-After")
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+def backoff(attempt: int, base: float = 0.5, cap: float = 20.0) -> float:
+    # "Full jitter" exponential backoff.
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+# ===================== Buckets =====================
+class TokenBucket:
+    """
+    Per-process bucket. ``_take`` / ``_pause`` hold the state logic so the
+    shared variant only swaps the storage.
+    """
+
+    def __init__(self, rate: float, burst: int, *, reserve: int = 0, max_wait: float = 30.0) -> None:
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.reserve = min(max(0, int(reserve)), self.burst - 1)
+        self.max_wait = max_wait
+        self._state = {"tokens": float(self.burst), "ts": time.monotonic(), "paused_until": 0.0}
+        self._cond = threading.Condition()
+        self._waiting = {INTERACTIVE: 0, BACKGROUND: 0}
+        self.counters = {"acquired": 0, "throttled": 0, "paused": 0, "timeouts": 0}
+
+    # ---------- state (override for shared storage) ----------
+    def _clock(self) -> float:
+        return time.monotonic()
+
+    def _apply(self, st: Dict[str, float], now: float, floor: float) -> float:
+        """
+        Refills ``st`` and takes a token if possible; returns the wait (0 = taken).
+        """
+        if st["paused_until"] > now:
+            return st["paused_until"] - now
+        st["tokens"] = min(self.burst, st["tokens"] + (now - st["ts"]) * self.rate)
+        st["ts"] = now
+        if st["tokens"] - 1 >= floor:
+            st["tokens"] -= 1
+            return 0.0
+        return (floor + 1 - st["tokens"]) / self.rate
+
+    def _take(self, floor: float) -> float:
+        return self._apply(self._state, self._clock(), floor)
+
+    def _pause(self, seconds: float) -> None:
+        until = self._clock() + seconds
+        self._state["paused_until"] = max(self._state["paused_until"], until)
+
+    # ---------- public ----------
+    def _try(self, name: str) -> float:
+        # Caller holds self._cond.
+        if name != INTERACTIVE and self._waiting[INTERACTIVE]:
+            return 0.05  # an interactive call is queued: let it go first
+        return self._take(self.reserve if name != INTERACTIVE else 0)
+
+    def acquire(self, name: Optional[str] = None) -> None:
+        name = name or current_lane()
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            self._waiting[name] = self._waiting.get(name, 0) + 1
+            try:
+                throttled = False
+                while True:
+                    wait = self._try(name)
+                    if wait <= 0:
+                        self.counters["acquired"] += 1
+                        self.counters["throttled"] += throttled
+                        return
+                    throttled = True
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        self.counters["timeouts"] += 1
+                        raise RateLimitExceeded(f"Service Fusion rate budget exhausted ({self.rate}/s)")
+                    self._cond.wait(timeout=min(wait, left, 1.0))
+            finally:
+                self._waiting[name] -= 1
+                self._cond.notify_all()
+
+    async def aacquire(self, name: Optional[str] = None) -> None:
+        name = name or current_lane()
+        deadline = time.monotonic() + self.max_wait
+        throttled = False
+        with self._cond:
+            self._waiting[name] = self._waiting.get(name, 0) + 1
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try(name)
+                    if wait <= 0:
+                        self.counters["acquired"] += 1
+                        self.counters["throttled"] += throttled
+                        return
+                throttled = True
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    self.counters["timeouts"] += 1
+                    raise RateLimitExceeded(f"Service Fusion rate budget exhausted ({self.rate}/s)")
+                await asyncio.sleep(min(wait, left, 1.0))
+        finally:
+            with self._cond:
+                self._waiting[name] -= 1
+                self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """
+        Upstream said "slow down": nobody in the bucket sends for ``seconds``.
+        """
+        with self._cond:
+            self._pause(seconds)
+            self.counters["paused"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"rate": self.rate, "burst": self.burst, "shared": False, "waiting": dict(self._waiting), **self.counters}
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Bucket state in a JSON file guarded by ``flock``: one budget for every
+    worker process of the host. Wall-clock time, since processes share it.
+    """
+
+    def __init__(self, rate: float, burst: int, *, path: Optional[str] = None, **kwargs: Any) -> None:
+        super().__init__(rate, burst, **kwargs)
+        self.path = path or str(runtime_path("ratelimit.json"))
+
+    def _clock(self) -> float:
+        return time.time()
+
+    @contextlib.contextmanager
+    def _locked_state(self) -> Iterator[Dict[str, float]]:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = os.read(fd, 4096)
+            try:
+                st = json.loads(raw) if raw else {}
+            except ValueError:
+                st = {}
+            st = {"tokens": float(st.get("tokens", self.burst)), "ts": float(st.get("ts", time.time())),
+                  "paused_until": float(st.get("paused_until", 0.0))}
+            yield st
+            data = json.dumps(st).encode()
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, data)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _take(self, floor: float) -> float:
+        with self._locked_state() as st:
+            return self._apply(st, self._clock(), floor)
+
+    def _pause(self, seconds: float) -> None:
+        with self._locked_state() as st:
+            st["paused_until"] = max(st["paused_until"], self._clock() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "shared": True}
+
+
+# ===================== Retry policy =====================
+class RetryPolicy:
+    def __init__(self, max_retries: int = 3, max_delay: float = 30.0) -> None:
+        self.max_retries = max_retries
+        self.max_delay = max_delay
+        self.retries = 0
+
+    def delay(self, status: int, headers: Any, attempt: int) -> Optional[float]:
+        """
+        Seconds to back off after a throttled response, None otherwise.
+        """
+        if status not in RETRY_STATUSES:
+            return None
+        return min(self.max_delay, retry_after(headers, backoff(attempt)))
+
+    def retryable(self, method: str, attempt: int) -> bool:
+        ok = method.upper() in IDEMPOTENT_METHODS and attempt < self.max_retries
+        self.retries += ok
+        return ok
+
+
+# ===================== Per-process singleton =====================
+_LIMITER: Optional[Tuple[TokenBucket, RetryPolicy]] = None
+_LIMITER_PID: Optional[int] = None
+_LIMITER_LOCK = threading.Lock()
+
+
+def get_limiter() -> Tuple[Optional[TokenBucket], RetryPolicy]:
+    """
+    ``(bucket, retry policy)``; the bucket is None when FUSION_RATE_LIMIT is 0.
+    """
+    global _LIMITER, _LIMITER_PID
+    if _LIMITER is None or _LIMITER_PID != os.getpid():
+        with _LIMITER_LOCK:
+            if _LIMITER is None or _LIMITER_PID != os.getpid():
+                rate = float(getattr(settings, "FUSION_RATE_LIMIT", 5))
+                bucket: Optional[TokenBucket] = None
+                if rate > 0:
+                    cls = SharedTokenBucket if getattr(settings, "FUSION_RATE_SHARED", False) else TokenBucket
+                    bucket = cls(
+                        rate,
+                        int(getattr(settings, "FUSION_RATE_BURST", 10)),
+                        reserve=int(getattr(settings, "FUSION_RATE_INTERACTIVE_RESERVE", 2)),
+                        max_wait=float(getattr(settings, "FUSION_RATE_MAX_WAIT", 30)),
+                    )
+                policy = RetryPolicy(
+                    max_retries=int(getattr(settings, "FUSION_RATE_MAX_RETRIES", 3)),
+                    max_delay=float(getattr(settings, "FUSION_RATE_MAX_RETRY_DELAY", 30)),
+                )
+                _LIMITER, _LIMITER_PID = (bucket, policy), os.getpid()
+    return _LIMITER
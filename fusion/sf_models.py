@@ -0,0 +1,242 @@
+"""
+Typed Service Fusion models, per-endpoint view profiles and fast JSON.
+
+- ``Customer`` / ``Contact`` / ``Location`` / ``Job`` / ``Note``: slotted
+  dataclasses holding only what the front end, the notification emails and
+  the customer index use. ``from_api`` tolerates missing keys and the
+  dict-or-string shapes Service Fusion returns for phones / emails;
+  ``to_dict`` emits the Service Fusion shape (``customer_name``,
+  ``contacts[].phones[].phone``, ``locations[].street_1``...) without the
+  null values (empty lists are kept), so the browser code keeps working on
+  smaller bodies.
+- A ``Profile`` is what one endpoint needs: the ``fields`` / ``expand``
+  sent to Service Fusion (so less is sent back and parsed) and the model the
+  body is parsed into.
+- ``dumps`` / ``loads`` / ``json_response`` use orjson when installed, the
+  standard library with compact separators otherwise. Models serialize
+  directly.
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _str(value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    return str(value)
+
+
+def _values(items: Any, key: str) -> List[str]:
+    out = []
+    for it in items or []:
+        v = it.get(key) if isinstance(it, dict) else it
+        if v:
+            out.append(str(v))
+    return out
+
+
+def _compact(d: Dict[str, Any]) -> Dict[str, Any]:
+    # Only nulls go: an empty list is an answer (the front end re-fetches a customer whose
+    # ``contacts`` / ``locations`` key is missing, taking it for "not loaded").
+    return {k: v for k, v in d.items() if v is not None}
+
+
+# ===================== Models =====================
+@dataclass(slots=True)
+class Contact:
+    fname: Optional[str] = None
+    lname: Optional[str] = None
+    phones: List[str] = field(default_factory=list)
+    emails: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_api(cls, d: Dict[str, Any]) -> "Contact":
+        return cls(_str(d.get("fname")), _str(d.get("lname")), _values(d.get("phones"), "phone"),
+                   _values(d.get("emails"), "email"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return _compact({
+            "fname": self.fname,
+            "lname": self.lname,
+            "phones": [{"phone": p} for p in self.phones],
+            "emails": [{"email": e} for e in self.emails],
+        })
+
+
+@dataclass(slots=True)
+class Location:
+    id: Optional[int] = None
+    nickname: Optional[str] = None
+    street_1: Optional[str] = None
+    street_2: Optional[str] = None
+    city: Optional[str] = None
+    state_prov: Optional[str] = None
+    postal_code: Optional[str] = None
+
+    @classmethod
+    def from_api(cls, d: Dict[str, Any]) -> "Location":
+        return cls(d.get("id"), _str(d.get("nickname")), _str(d.get("street_1")), _str(d.get("street_2")),
+                   _str(d.get("city")), _str(d.get("state_prov")), _str(d.get("postal_code")))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return _compact({
+            "id": self.id,
+            "nickname": self.nickname,
+            "street_1": self.street_1,
+            "street_2": self.street_2,
+            "city": self.city,
+            "state_prov": self.state_prov,
+            "postal_code": self.postal_code,
+        })
+
+
+@dataclass(slots=True)
+class Customer:
+    id: Optional[int] = None
+    customer_name: Optional[str] = None
+    contacts: List[Contact] = field(default_factory=list)
+    locations: List[Location] = field(default_factory=list)
+    updated_at: Optional[str] = None
+
+    def __bool__(self) -> bool:  # empty body: negative-cached like {}
+        return self.id is not None
+
+    @classmethod
+    def from_api(cls, d: Dict[str, Any]) -> "Customer":
+        return cls(
+            d.get("id"),
+            _str(d.get("customer_name")),
+            [Contact.from_api(c) for c in d.get("contacts") or [] if isinstance(c, dict)],
+            [Location.from_api(loc) for loc in d.get("locations") or [] if isinstance(loc, dict)],
+            _str(d.get("updated_at")),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return _compact({
+            "id": self.id,
+            "customer_name": self.customer_name,
+            "contacts": [c.to_dict() for c in self.contacts],
+            "locations": [loc.to_dict() for loc in self.locations],
+            "updated_at": self.updated_at,
+        })
+
+
+@dataclass(slots=True)
+class Note:
+    notes: Optional[str] = None
+    created_at: Optional[str] = None
+
+    @classmethod
+    def from_api(cls, d: Dict[str, Any]) -> "Note":
+        return cls(_str(d.get("notes") or d.get("note") or d.get("text")), _str(d.get("created_at")))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return _compact({"notes": self.notes, "created_at": self.created_at})
+
+
+@dataclass(slots=True)
+class Job:
+    id: Optional[int] = None
+    number: Optional[str] = None
+    status: Optional[str] = None
+    customer_name: Optional[str] = None
+    location_name: Optional[str] = None
+    category: Optional[str] = None
+    priority: Optional[str] = None
+    description: Optional[str] = None
+    tech_notes: Optional[str] = None
+    created_at: Optional[str] = None
+    notes: List[Note] = field(default_factory=list)
+
+    def __bool__(self) -> bool:  # empty body: negative-cached like {}
+        return self.id is not None
+
+    @classmethod
+    def from_api(cls, d: Dict[str, Any]) -> "Job":
+        return cls(
+            d.get("id"), _str(d.get("number")), _str(d.get("status")), _str(d.get("customer_name")),
+            _str(d.get("location_name")), _str(d.get("category")), _str(d.get("priority")),
+            _str(d.get("description")), _str(d.get("tech_notes")), _str(d.get("created_at")),
+            [Note.from_api(n) for n in d.get("notes") or [] if isinstance(n, dict)],
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return _compact({
+            "id": self.id,
+            "number": self.number,
+            "status": self.status,
+            "customer_name": self.customer_name,
+            "location_name": self.location_name,
+            "category": self.category,
+            "priority": self.priority,
+            "description": self.description,
+            "tech_notes": self.tech_notes,
+            "created_at": self.created_at,
+            "notes": [n.to_dict() for n in self.notes],
+        })
+
+
+# ===================== View profiles =====================
+@dataclass(frozen=True, slots=True)
+class Profile:
+    model: type
+    fields: str
+    expand: str = ""
+
+    def params(self, **extra: Any) -> Dict[str, Any]:
+        p = {"fields": self.fields}
+        if self.expand:
+            p["expand"] = self.expand
+        p.update(extra)
+        return p
+
+    def parse(self, data: Any) -> Any:
+        return self.model.from_api(data if isinstance(data, dict) else {})
+
+    def parse_items(self, data: Any) -> List[Any]:
+        items = data.get("items") if isinstance(data, dict) else None
+        return [self.model.from_api(it) for it in items or [] if isinstance(it, dict)]
+
+
+CUSTOMER_EXPAND = "contacts,contacts.phones,contacts.emails,locations"
+CUSTOMER_DETAIL = Profile(Customer, "id,customer_name,contacts,locations", CUSTOMER_EXPAND)  # sf_get_customer, creation
+CUSTOMER_SEARCH = Profile(Customer, "id,customer_name,contacts,locations", CUSTOMER_EXPAND)  # autocomplete
+JOB_DETAIL = Profile(Job, "id,number,status,customer_name,location_name,category,priority,description,tech_notes,created_at", "notes")
+JOB_CREATED = Profile(Job, "id,number,status,customer_name,description,priority,created_at,location_name,category,tech_notes", "notes")
+
+
+# ===================== JSON =====================
+def _default(obj: Any) -> Any:
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return to_dict()
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATACLASS)
+    return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads(data: bytes | str) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_response(data: Any, status: int = 200) -> HttpResponse:
+    """
+    ``JsonResponse(data, safe=False)`` equivalent: compact body, models accepted.
+    """
+    return HttpResponse(dumps(data), status=status, content_type="application/json")
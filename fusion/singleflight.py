@@ -0,0 +1,131 @@
+"""
+Request coalescing ("single-flight") for identical in-flight reads.
+
+The first caller for a key runs the call; callers arriving with the same key
+while it is in flight wait for it and receive the very same result (or the
+same exception). Nothing is kept once the call returns: this is not a cache.
+
+    flight = SingleFlight()
+    data = flight.do(key, lambda: fetch())          # threads
+    data = await flight.ado(key, lambda: afetch())  # coroutines, per event loop
+
+Shared results must be treated as read-only by every waiter. A cancelled
+``ado`` caller only stops waiting, unless it was the last one: then the
+call itself is cancelled, nobody is left to use its result.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _ACall:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, _Call] = {}
+        self._futures: Dict[Tuple[int, Hashable], _ACall] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        The call runs in its own task, awaited by every caller through ``shield``
+        and counted: a cancelled caller (the first one included) only stops
+        waiting, the last one cancels the call.
+        """
+        loop = asyncio.get_running_loop()
+        k = (id(loop), key)
+        with self._lock:
+            call = self._futures.get(k)
+            if call is None:
+                call = self._futures[k] = _ACall(loop.create_task(fn()))
+                call.task.add_done_callback(lambda t: self._adone(k, t))
+                self.executed += 1
+            else:
+                self.coalesced += 1
+            call.waiters += 1
+        cancelled = False
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            if self._leave(k, call) and cancelled and not call.task.done():
+                call.task.cancel()
+
+    def _leave(self, k: Tuple[int, Hashable], call: _ACall) -> bool:
+        """
+        True for the last waiter; a call being cancelled takes no new waiters.
+        """
+        with self._lock:
+            call.waiters -= 1
+            if call.waiters:
+                return False
+            if self._futures.get(k) is call:
+                del self._futures[k]
+            return True
+
+    def _adone(self, k: Tuple[int, Hashable], task: asyncio.Future) -> None:
+        with self._lock:
+            call = self._futures.get(k)
+            if call is not None and call.task is task:
+                del self._futures[k]
+        if not task.cancelled():
+            task.exception()  # mark retrieved when every caller was cancelled
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._calls) + len(self._futures)
+        total = self.executed + self.coalesced
+        return {
+            "upstream_calls": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": in_flight,
+            "saved_ratio": round(self.coalesced / total, 3) if total else None,
+        }
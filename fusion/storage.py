@@ -0,0 +1,34 @@
+"""
+Local runtime storage shared by the fusion subsystems (task queue, caches, outbox...).
+
+The project has no database (DATABASES = {}), so persistent state lives in small
+SQLite files under FUSION_RUNTIME_DIR.
+"""
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+
+from django.conf import settings
+
+
+def runtime_path(*parts: str) -> Path:
+    """
+    Returns a path inside FUSION_RUNTIME_DIR, creating parent directories.
+    """
+    base = Path(getattr(settings, "FUSION_RUNTIME_DIR", None) or Path(settings.BASE_DIR) / "var")
+    path = base.joinpath(*parts)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def sqlite_connect(path: Path | str) -> sqlite3.Connection:
+    """
+    Autocommit connection usable from several threads (callers serialize access
+    with their own lock). WAL lets several worker processes share the file.
+    """
+    conn = sqlite3.connect(str(path), timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,403 @@
+"""
+In-process background task queue with a bounded worker pool.
+
+Used by sf_create_job to run the post-creation enrichment (verification GET,
+description patch, note, email) after the 202 response has been sent.
+
+- Handlers are registered by name with ``@task("name")`` so queued work can be
+  re-hydrated after a restart.
+- Every task is persisted through a pluggable TaskStore (SQLite file by default,
+  see FUSION_TASK_STORE). On start, a worker reclaims queued tasks and running
+  tasks whose lease expired (their worker died); running workers keep
+  scanning for expired leases every ``lease / 4`` seconds.
+- Per-step progress is saved as it happens and served by ``/sf/tasks/<id>``; a
+  retried task sees which steps already completed.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .ratelimit import BACKGROUND, lane
+from .storage import runtime_path, sqlite_connect
+
+log = logging.getLogger(__name__)
+
+TASK_HANDLERS: Dict[str, Callable[["TaskContext"], Any]] = {}
+
+
+def task(name: str):
+    """
+    Registers a handler: ``handler(ctx: TaskContext) -> JSON-serializable result``.
+    """
+    def deco(fn):
+        TASK_HANDLERS[name] = fn
+        return fn
+    return deco
+
+
+class QueueFull(Exception):
+    pass
+
+
+# ===================== Stores =====================
+class TaskStore(ABC):
+    """
+    Persistence interface. Records are plain dicts:
+    id, name, payload, status (queued|running|done|failed), steps, result, error,
+    attempts, owner, lease_until, created_at, updated_at.
+    """
+
+    @abstractmethod
+    def create(self, rec: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def update(self, task_id: str, **fields: Any) -> None:
+        ...
+
+    @abstractmethod
+    def claim(self, task_id: str, owner: str, lease_until: float, now: float) -> Optional[Dict[str, Any]]:
+        """
+        Atomically marks a queued (or lease-expired) task as running for ``owner``.
+        """
+
+    @abstractmethod
+    def reclaimable(self, now: float, limit: int = 100, queued: bool = True) -> List[str]:
+        """
+        Lease-expired running tasks, plus queued ones unless ``queued`` is False.
+        """
+
+    @abstractmethod
+    def purge(self, before: float) -> int:
+        ...
+
+
+class MemoryTaskStore(TaskStore):
+    """
+    Non-persistent store (tests, single-process dev).
+    """
+
+    def __init__(self) -> None:
+        self._data: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, rec):
+        with self._lock:
+            self._data[rec["id"]] = json.loads(json.dumps(rec))
+
+    def get(self, task_id):
+        with self._lock:
+            rec = self._data.get(task_id)
+            return json.loads(json.dumps(rec)) if rec else None
+
+    def update(self, task_id, **fields):
+        with self._lock:
+            if task_id in self._data:
+                self._data[task_id].update(json.loads(json.dumps(fields)))
+                self._data[task_id]["updated_at"] = time.time()
+
+    def claim(self, task_id, owner, lease_until, now):
+        with self._lock:
+            rec = self._data.get(task_id)
+            if not rec or not (rec["status"] == "queued" or (rec["status"] == "running" and rec["lease_until"] < now)):
+                return None
+            rec.update(status="running", owner=owner, lease_until=lease_until, attempts=rec["attempts"] + 1, updated_at=now)
+            return json.loads(json.dumps(rec))
+
+    def reclaimable(self, now, limit=100, queued=True):
+        with self._lock:
+            ids = [r["id"] for r in sorted(self._data.values(), key=lambda r: r["created_at"])
+                   if (queued and r["status"] == "queued") or (r["status"] == "running" and r["lease_until"] < now)]
+            return ids[:limit]
+
+    def purge(self, before):
+        with self._lock:
+            old = [k for k, r in self._data.items() if r["status"] in ("done", "failed") and r["updated_at"] < before]
+            for k in old:
+                del self._data[k]
+            return len(old)
+
+
+class SQLiteTaskStore(TaskStore):
+    """
+    Default store: one SQLite file shared by every worker process of the host.
+    """
+    _JSON_FIELDS = ("payload", "steps", "result")
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or str(runtime_path("tasks.sqlite3"))
+        self._lock = threading.Lock()
+        self._conn = sqlite_connect(self.path)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY, name TEXT NOT NULL, payload TEXT, status TEXT NOT NULL,
+                steps TEXT, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,
+                owner TEXT, lease_until REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL, updated_at REAL NOT NULL)"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks(status, created_at)")
+
+    def _row(self, row) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        rec = dict(row)
+        for k in self._JSON_FIELDS:
+            rec[k] = json.loads(rec[k]) if rec[k] else None
+        return rec
+
+    def create(self, rec):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO tasks (id, name, payload, status, steps, result, error, attempts, owner, lease_until, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (rec["id"], rec["name"], json.dumps(rec["payload"]), rec["status"], json.dumps(rec["steps"]),
+                 None, None, rec["attempts"], rec["owner"], rec["lease_until"], rec["created_at"], rec["updated_at"]),
+            )
+
+    def get(self, task_id):
+        with self._lock:
+            return self._row(self._conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone())
+
+    def update(self, task_id, **fields):
+        fields["updated_at"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        vals = [json.dumps(v) if k in self._JSON_FIELDS else v for k, v in fields.items()]
+        with self._lock:
+            self._conn.execute(f"UPDATE tasks SET {cols} WHERE id = ?", (*vals, task_id))
+
+    def claim(self, task_id, owner, lease_until, now):
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE tasks SET status = 'running', owner = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ? AND (status = 'queued' OR (status = 'running' AND lease_until < ?))",
+                (owner, lease_until, now, task_id, now),
+            )
+            if cur.rowcount != 1:
+                return None
+            return self._row(self._conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone())
+
+    def reclaimable(self, now, limit=100, queued=True):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM tasks WHERE (? AND status = 'queued') OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY created_at LIMIT ?",
+                (queued, now, limit),
+            ).fetchall()
+        return [r["id"] for r in rows]
+
+    def purge(self, before):
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM tasks WHERE status IN ('done', 'failed') AND updated_at < ?", (before,))
+            return cur.rowcount
+
+
+# ===================== Queue =====================
+class TaskContext:
+    """
+    Handed to a handler: its payload, the steps recorded by earlier attempts and
+    a thread-safe ``progress(step, state, **detail)`` that persists as it goes.
+    """
+
+    def __init__(self, queue_: "TaskQueue", rec: Dict[str, Any]) -> None:
+        self.id = rec["id"]
+        self.payload = rec["payload"] or {}
+        self.steps: Dict[str, Any] = dict(rec["steps"] or {})
+        self.attempt = rec["attempts"]
+        self._queue = queue_
+        self._lock = threading.Lock()
+
+    def done(self, step: str) -> bool:
+        return (self.steps.get(step) or {}).get("state") == "done"
+
+    def progress(self, step: str, state: str, **detail: Any) -> None:
+        with self._lock:
+            self.steps[step] = {"state": state, **detail}
+            self._queue.store.update(self.id, steps=self.steps, lease_until=time.time() + self._queue.lease)
+
+
+class TaskQueue:
+    def __init__(self, store: TaskStore, *, workers: int = 4, max_pending: int = 500,
+                 lease: float = 300.0, max_attempts: int = 3, retention: float = 7 * 86400) -> None:
+        self.store = store
+        self.workers = workers
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._q: "queue.Queue[str]" = queue.Queue(maxsize=max_pending)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._scan_every = max(1.0, lease / 4)
+        self._next_scan = time.time() + self._scan_every
+
+    # ---------- lifecycle ----------
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f"fusion-task-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        self.recover()
+
+    def recover(self) -> int:
+        """
+        Re-enqueues persisted work left by a previous (or crashed) worker.
+        """
+        now = time.time()
+        self.store.purge(now - self.retention)
+        return self._enqueue(self.store.reclaimable(now, limit=self._q.maxsize or 100))
+
+    def reclaim_expired(self) -> int:
+        """
+        Re-enqueues running tasks whose lease expired while this process runs
+        (a worker of another process died). Queued rows are left alone: their
+        process still holds them in memory.
+        """
+        return self._enqueue(self.store.reclaimable(time.time(), limit=self._q.maxsize or 100, queued=False))
+
+    def _enqueue(self, ids: List[str]) -> int:
+        n = 0
+        for tid in ids:
+            try:
+                self._q.put_nowait(tid)  # a duplicate is harmless: claim() lets one worker through
+            except queue.Full:
+                break
+            n += 1
+        return n
+
+    # ---------- API ----------
+    def submit(self, name: str, payload: Dict[str, Any]) -> str:
+        if name not in TASK_HANDLERS:
+            raise KeyError(f"Unknown task {name!r}")
+        if self._q.full():
+            raise QueueFull(f"{self._q.qsize()} tasks pending")
+        self.start()
+        now = time.time()
+        tid = uuid.uuid4().hex
+        self.store.create({
+            "id": tid, "name": name, "payload": payload, "status": "queued", "steps": {},
+            "attempts": 0, "owner": None, "lease_until": 0, "created_at": now, "updated_at": now,
+        })
+        try:
+            self._q.put_nowait(tid)
+        except queue.Full:
+            # Filled up since the check above: the caller runs the work itself, so
+            # the row must not be picked up again by recover().
+            self.store.update(tid, status="failed", error="queue full; not run in the background")
+            raise QueueFull(f"{self._q.qsize()} tasks pending")
+        return tid
+
+    def status(self, task_id: str) -> Optional[Dict[str, Any]]:
+        rec = self.store.get(task_id)
+        if rec is None:
+            return None
+        rec.pop("payload", None)
+        rec.pop("owner", None)
+        rec.pop("lease_until", None)
+        return rec
+
+    # ---------- workers ----------
+    def _work(self) -> None:
+        while True:
+            self._maybe_scan()
+            try:
+                tid = self._q.get(timeout=self._scan_every)
+            except queue.Empty:
+                continue
+            try:
+                self._run(tid)
+            except Exception as e:
+                log.exception("Task %s crashed: %s", tid, e)
+            finally:
+                self._q.task_done()
+
+    def _maybe_scan(self) -> None:
+        with self._lock:
+            if time.time() < self._next_scan:
+                return
+            self._next_scan = time.time() + self._scan_every  # one worker per period does the scan
+        try:
+            n = self.reclaim_expired()
+            if n:
+                log.warning("Reclaimed %d task(s) whose lease expired.", n)
+        except Exception as e:
+            log.error("Task lease scan failed: %s", e)
+
+    def _run(self, tid: str) -> None:
+        now = time.time()
+        rec = self.store.claim(tid, self.owner, now + self.lease, now)
+        if rec is None:
+            return  # already taken by another worker/process
+        if rec["attempts"] > self.max_attempts:
+            self.store.update(tid, status="failed", error="max attempts exceeded")
+            return
+        handler = TASK_HANDLERS.get(rec["name"])
+        if handler is None:
+            self.store.update(tid, status="failed", error=f"no handler for {rec['name']!r}")
+            return
+        ctx = TaskContext(self, rec)
+        try:
+            with lane(BACKGROUND):  # yields the API budget to interactive requests
+                result = handler(ctx)
+        except Exception as e:
+            self.store.update(tid, status="failed", error=str(e), steps=ctx.steps)
+            return
+        self.store.update(tid, status="done", result=result, steps=ctx.steps, error=None)
+
+
+# ===================== Per-process singleton =====================
+_QUEUE: Optional[TaskQueue] = None
+_QUEUE_PID: Optional[int] = None
+_QUEUE_LOCK = threading.Lock()
+
+
+def _build_store() -> TaskStore:
+    kind = getattr(settings, "FUSION_TASK_STORE", "sqlite") or "sqlite"
+    if kind == "sqlite":
+        return SQLiteTaskStore()
+    if kind == "memory":
+        return MemoryTaskStore()
+    return import_string(kind)()
+
+
+def get_queue() -> TaskQueue:
+    global _QUEUE, _QUEUE_PID
+    if _QUEUE is None or _QUEUE_PID != os.getpid():
+        with _QUEUE_LOCK:
+            if _QUEUE is None or _QUEUE_PID != os.getpid():
+                _QUEUE = TaskQueue(
+                    _build_store(),
+                    workers=int(getattr(settings, "FUSION_TASK_WORKERS", 4)),
+                    max_pending=int(getattr(settings, "FUSION_TASK_MAX_PENDING", 500)),
+                    lease=float(getattr(settings, "FUSION_TASK_LEASE", 300)),
+                    max_attempts=int(getattr(settings, "FUSION_TASK_MAX_ATTEMPTS", 3)),
+                    retention=float(getattr(settings, "FUSION_TASK_RETENTION_DAYS", 7)) * 86400,
+                )
+                _QUEUE_PID = os.getpid()
+    return _QUEUE
+
+
+def start_task_queue(**kwargs: Any) -> None:
+    """
+    ``request_started`` receiver (fusion/apps.py): starts the workers, and thus
+    recovery of persisted work, on the first request served by a process.
+    """
+    get_queue().start()
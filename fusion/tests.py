@@ -1,3 +1,560 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import io
+import os
+import smtplib
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from . import bulk
+from . import idempotency as idem_module
+from .assets import etag_matches, minify_js
+from .breaker import _BREAKERS, CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from .cache import MISS, LocalLRUBackend, ResponseCache
+from .customer_index import CustomerIndexService, IndexStore
+from .oauth import MemoryTokenStore, TokenProvider, TokenStore
+from .outbox import DeliveryUnknown, Outbox, OutboxStore, SMTPPool
+from .profiling import HEADER, ProfilingMiddleware
+from .ratelimit import BACKGROUND, INTERACTIVE, RateLimitExceeded, TokenBucket, lane
+from .sf_models import CUSTOMER_SEARCH
+from .singleflight import SingleFlight
+from .tasks import TASK_HANDLERS, MemoryTaskStore, QueueFull, TaskQueue, TaskStore
+
+
+class SingleFlightAsyncTests(SimpleTestCase):
+    def test_cancelled_leader_does_not_cancel_waiters(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "data"
+
+        async def scenario():
+            leader = asyncio.ensure_future(flight.ado("k", fetch))
+            await asyncio.sleep(0)  # leader registered the call
+            waiter = asyncio.ensure_future(flight.ado("k", fetch))
+            await asyncio.sleep(0)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await waiter
+
+        self.assertEqual(asyncio.run(scenario()), "data")
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats()["in_flight"], 0)
+
+    def test_last_cancelled_waiter_cancels_the_call(self):
+        flight = SingleFlight()
+        cancelled = []
+
+        async def fetch():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        async def scenario():
+            callers = [asyncio.ensure_future(flight.ado("k", fetch)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            callers[0].cancel()
+            await asyncio.sleep(0.01)
+            self.assertEqual(cancelled, [])  # the other caller still waits
+            callers[1].cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            await asyncio.sleep(0.01)
+
+        asyncio.run(scenario())
+        self.assertEqual(cancelled, [1])
+        self.assertEqual(flight.stats()["in_flight"], 0)
+
+    def test_error_is_shared(self):
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def scenario():
+            return await asyncio.gather(flight.ado("k", fetch), flight.ado("k", fetch), return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(flight.stats()["upstream_calls"], 1)
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def test_bump_during_fetch_is_not_undone(self):
+        cache = ResponseCache(LocalLRUBackend(), ttls={"customers_search": 60})
+
+        def fetch():
+            cache.bump("customers_search")  # a customer was created meanwhile
+            return [{"id": 1}]
+
+        self.assertEqual(cache.get_or_fetch("customers_search", ("acme",), fetch), [{"id": 1}])
+        self.assertIs(cache.lookup("customers_search", "acme"), MISS)
+
+
+class TokenProviderTests(SimpleTestCase):
+    def test_invalidate_after_concurrent_401s_refreshes_once(self):
+        fetched = []
+
+        def fetch():
+            fetched.append(1)
+            return f"tok{len(fetched)}", 3600
+
+        provider = TokenProvider(MemoryTokenStore(), fetch)
+        provider._wake.set = lambda: None  # no refresh-ahead thread in this test
+        provider.start_refresher = lambda: None
+        stale = provider.get_token()
+        provider.invalidate(stale)
+        fresh = provider.get_token()
+        provider.invalidate(stale)  # a late 401 for the old token keeps the new one
+        self.assertEqual(provider.get_token(), fresh)
+        self.assertEqual((stale, fresh, len(fetched)), ("tok1", "tok2", 2))
+
+    def test_incomplete_store_fails_when_built(self):
+        load_only = type("LoadOnly", (TokenStore,), {"load": lambda self: None})
+        with self.assertRaises(TypeError):
+            load_only()
+
+    def test_cached_token_is_memo_only(self):
+        provider = TokenProvider(MemoryTokenStore(), lambda: ("tok", 3600))
+        provider.start_refresher = lambda: None
+        self.assertIsNone(provider.cached_token())  # cold: the caller must go through get_token()
+        provider.get_token()
+        self.assertEqual(provider.cached_token(), "tok")
+
+
+class SFModelTests(SimpleTestCase):
+    def test_empty_lists_are_kept(self):
+        [c] = CUSTOMER_SEARCH.parse_items({"items": [{"id": 7, "customer_name": "Acme", "contacts": [], "locations": []}]})
+        self.assertEqual(c.to_dict(), {"id": 7, "customer_name": "Acme", "contacts": [], "locations": []})
+
+
+class BulkParseTests(SimpleTestCase):
+    def test_json_array(self):
+        items = bulk.parse(b'[{"customer_name": "A"}, 3]')
+        self.assertEqual(items, [(0, {"customer_name": "A"}, None), (1, None, "item must be a JSON object")])
+
+    def test_ndjson_bad_line_only_fails_its_item(self):
+        items = bulk.parse(b'{"customer_name": "A"}\n\n{oops\n{"customer_name": "B"}\n', "application/x-ndjson")
+        self.assertEqual([(i, p, e is not None) for i, p, e in items],
+                         [(0, {"customer_name": "A"}, False), (1, None, True), (2, {"customer_name": "B"}, False)])
+
+    def test_malformed_array_and_size_limit(self):
+        with self.assertRaises(ValueError):
+            bulk.parse(b'[{"a": 1},')
+        with override_settings(FUSION_BULK_MAX_ITEMS=2), self.assertRaises(bulk.BatchTooLarge):
+            bulk.parse(b"[{}, {}, {}]")
+
+
+class OnceTests(SimpleTestCase):
+    def test_concurrent_callers_share_one_call(self):
+        once, calls, gate = bulk.Once(), [], threading.Event()
+
+        def resolve():
+            calls.append(1)
+            gate.wait(2)
+            return {"id": 7}
+
+        out = []
+        threads = [threading.Thread(target=lambda: out.append(once.get("acme", resolve))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        gate.set()
+        for t in threads:
+            t.join(2)
+        self.assertEqual((len(calls), out), (1, [{"id": 7}] * 4))
+        self.assertEqual(once.results(), {"acme": {"id": 7}})
+
+    def test_error_is_shared_and_not_in_results(self):
+        once, calls = bulk.Once(), []
+
+        def create():
+            calls.append(1)
+            raise RuntimeError("create failed")
+
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                once.get("acme", create)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(once.results(), {})
+
+
+class BulkRunTests(SimpleTestCase):
+    def test_finish_runs_when_client_disconnects(self):
+        running, release, finished = threading.Semaphore(0), threading.Event(), threading.Event()
+        seen = []
+
+        def worker(payload):
+            if payload["slow"]:
+                running.release()
+                release.wait(2)
+            return {}
+
+        def finish(results):
+            seen.extend(sorted(r["index"] for r in results))
+            finished.set()
+            return {}
+
+        items = [(0, {"slow": False}, None), (1, {"slow": True}, None), (2, {"slow": True}, None)]
+        lines = bulk.run(items, worker, finish, concurrency=3)
+        next(lines)
+        self.assertTrue(running.acquire(timeout=2) and running.acquire(timeout=2))
+        lines.close()  # client gone while items 1 and 2 are still creating their jobs
+        self.assertFalse(finished.is_set())
+        release.set()
+        self.assertTrue(finished.wait(2))
+        self.assertEqual(seen, [0, 1, 2])
+
+
+class CustomerIndexTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "customers.sqlite3")
+        self.pages = [{"items": [{"id": 1, "customer_name": "Acme"}, {"id": 2, "customer_name": "Acorn"}]}, {}]
+
+    def service(self):
+        return CustomerIndexService(IndexStore(self.path), lambda params: self.pages[params["page"] - 1])
+
+    def test_write_through_alone_is_not_ready(self):
+        svc = self.service()
+        svc.upsert([{"id": 1, "customer_name": "Acme"}])
+        self.assertEqual(len(svc.search("ac")), 1)
+        self.assertFalse(svc.ready)
+        self.assertFalse(self.service().ready)
+
+    def test_full_sync_marks_ready_for_other_processes(self):
+        self.service().full_sync()
+        other = self.service()
+        self.assertFalse(other.ready)
+        other.reload()
+        self.assertTrue(other.ready)
+        self.assertEqual(len(other.search("ac")), 2)
+
+
+class TaskQueueTests(SimpleTestCase):
+    def setUp(self):
+        TASK_HANDLERS.setdefault("test_noop", lambda ctx: None)
+        self.store = MemoryTaskStore()
+        self.tq = TaskQueue(self.store, workers=1, max_pending=1, lease=60)
+        self.tq.start = lambda: None  # no worker threads: the test drives the queue
+
+    def rec(self, tid, status, lease_until=0):
+        return {"id": tid, "name": "test_noop", "payload": {}, "status": status, "steps": {}, "attempts": 1,
+                "owner": "gone:1", "lease_until": lease_until, "created_at": 0, "updated_at": 0}
+
+    def test_queue_filled_after_check_fails_the_row(self):
+        self.tq._q.put_nowait("other")
+        self.tq._q.full = lambda: False  # another thread filled it between the check and the put
+        with self.assertRaises(QueueFull):
+            self.tq.submit("test_noop", {})
+        [rec] = [r for r in self.store._data.values()]
+        self.assertEqual(rec["status"], "failed")
+        self.assertEqual(self.tq.recover(), 0)
+
+    def test_incomplete_store_fails_when_built(self):
+        methods = {name: lambda self, *a, **kw: None for name in ("create", "get", "update", "claim", "reclaimable")}
+        no_purge = type("NoPurge", (TaskStore,), methods)
+        with self.assertRaises(TypeError):
+            no_purge()
+
+    def test_reclaim_expired_skips_queued_rows(self):
+        self.store.create(self.rec("dead", "running", lease_until=1))
+        self.store.create(self.rec("waiting", "queued"))
+        self.assertEqual(self.tq.reclaim_expired(), 1)
+        self.assertEqual(self.tq._q.get_nowait(), "dead")
+
+
+class ProfilingTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.settings = override_settings(FUSION_PROFILE_ENABLED=True, FUSION_PROFILE_TOKEN="t",
+                                          FUSION_PROFILE_INTERVAL=0.001, FUSION_RUNTIME_DIR=tmp.name)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def test_header_only_when_asked(self):
+        def view(request):
+            time.sleep(0.05)
+            return HttpResponse("ok")
+
+        rf = RequestFactory()
+        with override_settings(FUSION_PROFILE_SAMPLE_RATE=1.0):
+            sampled = ProfilingMiddleware(view)(rf.get("/sf/jobs/1"))
+        asked = ProfilingMiddleware(view)(rf.get("/sf/jobs/1", HTTP_X_FUSION_PROFILE="t"))
+        self.assertNotIn(HEADER, sampled)
+        self.assertTrue(asked[HEADER].endswith(".folded"))
+
+    def test_async_request_samples_its_task(self):
+        async def waits_for_upstream():
+            await asyncio.sleep(0.05)
+
+        async def view(request):
+            await waits_for_upstream()
+            return HttpResponse("ok")
+
+        response = asyncio.run(ProfilingMiddleware(view)(RequestFactory().get("/sf/jobs/1", HTTP_X_FUSION_PROFILE="t")))
+        with open(os.path.join(self.settings.options["FUSION_RUNTIME_DIR"], "profiles", response[HEADER])) as f:
+            stacks = f.read()
+        self.assertIn("fusion.tests:waits_for_upstream", stacks)
+        self.assertNotIn("selectors", stacks)
+
+
+class FakeSMTP:
+    def __init__(self, sent, drop=False):
+        self.sent, self.drop, self.stale = sent, drop, False
+        self.connection = self
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def noop(self):
+        if self.stale:
+            raise smtplib.SMTPServerDisconnected("gone")
+        return 250, b"OK"
+
+    def send_messages(self, msgs):
+        self.sent.extend(msgs)  # DATA went out
+        if self.drop:
+            raise smtplib.SMTPServerDisconnected("dropped after DATA")
+        return len(msgs)
+
+
+class SMTPPoolTests(SimpleTestCase):
+    def test_drop_after_data_is_not_resent(self):
+        sent, pool = [], SMTPPool()
+        with self.assertRaises(DeliveryUnknown):
+            pool.send("primary", lambda: FakeSMTP(sent, drop=True), "msg")
+        self.assertEqual(sent, ["msg"])
+        self.assertEqual(pool.opened, 1)
+
+    def test_stale_connection_is_replaced_before_sending(self):
+        sent, pool, conns = [], SMTPPool(), []
+
+        def factory():
+            conns.append(FakeSMTP(sent))
+            return conns[-1]
+
+        pool.send("primary", factory, "m1")
+        conns[0].stale = True  # the relay closed the idle session
+        pool.send("primary", factory, "m2")
+        self.assertEqual(sent, ["m1", "m2"])
+        self.assertEqual(pool.opened, 2)
+
+
+class ETagTests(SimpleTestCase):
+    def test_if_none_match_is_a_weak_list(self):
+        self.assertTrue(etag_matches('W/"abc-gzip"', '"abc-gzip"'))
+        self.assertTrue(etag_matches('"old", W/"abc"', '"abc"', '"abc-gzip"'))
+        self.assertTrue(etag_matches("*", '"abc"'))
+        self.assertFalse(etag_matches('"abcd"', '"abc"'))
+        self.assertFalse(etag_matches(None, '"abc"'))
+
+
+class TokenBucketTests(SimpleTestCase):
+    def bucket(self, **kw):
+        return TokenBucket(rate=0.01, burst=3, reserve=2, max_wait=0.05, **kw)  # no refill during a test
+
+    def test_background_lane_keeps_the_interactive_reserve(self):
+        b = self.bucket()
+        with lane(BACKGROUND):
+            b.acquire()
+            with self.assertRaises(RateLimitExceeded):
+                b.acquire()
+        b.acquire()
+        b.acquire()  # interactive calls may use the reserve
+        self.assertEqual(b.stats()["acquired"], 3)
+
+    def test_background_yields_to_waiting_interactive_calls(self):
+        b = self.bucket()
+        b._waiting[INTERACTIVE] = 1  # an interactive caller is queued
+        with self.assertRaises(RateLimitExceeded):
+            b.acquire(BACKGROUND)
+
+    def test_max_wait_bounds_the_wait(self):
+        b = self.bucket()
+        for _ in range(3):
+            b.acquire()
+        started = time.monotonic()
+        with self.assertRaises(RateLimitExceeded):
+            b.acquire()
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(b.stats()["timeouts"], 1)
+
+    def test_pause_blocks_every_lane(self):
+        b = self.bucket()
+        b.pause(5)
+        with self.assertRaises(RateLimitExceeded):
+            asyncio.run(b.aacquire(INTERACTIVE))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def guarded_error(self, b, exc):
+        with self.assertRaises(type(exc)):
+            with b.guard():
+                raise exc
+
+    def test_opens_after_threshold_and_probes_once(self):
+        b = CircuitBreaker("dep", failure_threshold=2, reset_timeout=0.05)
+        self.guarded_error(b, ConnectionError("down"))
+        self.assertEqual(b.state, CLOSED)
+        self.guarded_error(b, ConnectionError("down"))
+        self.assertEqual(b.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            b.before()
+        time.sleep(0.06)
+        b.before()  # the probe
+        self.assertEqual(b.state, HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            b.before()  # only one probe at a time
+        b.success()
+        self.assertEqual((b.state, b.failures), (CLOSED, 0))
+
+    def test_failed_probe_reopens(self):
+        b = CircuitBreaker("dep", failure_threshold=1, reset_timeout=0.05)
+        self.guarded_error(b, TimeoutError())
+        time.sleep(0.06)
+        self.guarded_error(b, TimeoutError())  # the probe failed
+        self.assertEqual(b.state, OPEN)
+        self.assertEqual(b.counters["opened"], 2)
+
+    def test_client_errors_leave_it_closed(self):
+        b = CircuitBreaker("dep", failure_threshold=1)
+        self.guarded_error(b, ValueError("bad payload"))
+        self.assertEqual(b.state, CLOSED)
+
+
+class OutboxTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = OutboxStore(os.path.join(tmp.name, "outbox.sqlite3"))
+        _BREAKERS.pop("smtp", None)
+        self.addCleanup(_BREAKERS.pop, "smtp", None)
+
+    def queue(self, email_id="e1", attempts=0):
+        now = time.time()
+        self.store.create({"id": email_id, "status": "queued", "subject": "s", "body": "b", "subtype": "html",
+                           "from_email": "f@example.com", "recipients": ["t@example.com"], "headers": {},
+                           "attempts": attempts, "next_attempt": now, "created_at": now, "updated_at": now})
+
+    def test_claim_lease_and_renew(self):
+        self.queue()
+        now = time.time()
+        [rec] = self.store.claim("a", now + 0.05, now, 10)
+        self.assertEqual((rec["status"], rec["attempts"]), ("sending", 1))
+        self.assertEqual(self.store.claim("b", now + 60, now, 10), [])  # leased to a
+        self.assertTrue(self.store.renew("e1", "a", now + 0.05))
+        later = now + 0.1  # a's lease expired: b takes over, a can no longer renew
+        self.assertEqual([r["id"] for r in self.store.claim("b", later + 60, later, 10)], ["e1"])
+        self.assertFalse(self.store.renew("e1", "a", later + 60))
+
+    def test_failed_attempt_backs_off_then_fails_over_to_console(self):
+        def refused():
+            raise smtplib.SMTPConnectError(421, "try later")
+
+        outbox = Outbox(self.store, lambda: [("primary", refused)], max_attempts=2)
+        self.queue()
+        now = time.time()
+        with self.assertLogs("fusion.outbox", "ERROR"):
+            outbox._deliver(self.store.claim(outbox.owner, now + 60, now, 10))
+        rec = self.store.get("e1")
+        self.assertEqual(rec["status"], "queued")
+        self.assertTrue(now + 5 <= rec["next_attempt"] <= time.time() + 10)  # 10s * jitter for attempt 1
+
+        self.store.update("e1", next_attempt=0)
+        now = time.time()
+        with contextlib.redirect_stdout(io.StringIO()) as console, self.assertLogs("fusion.outbox"):
+            outbox._deliver(self.store.claim(outbox.owner, now + 60, now, 10))
+        self.assertEqual((self.store.get("e1")["status"], self.store.get("e1")["transport"]), ("failed", "console"))
+        self.assertIn("Subject: s", console.getvalue())
+
+    def test_drop_after_data_skips_the_fallback_transport(self):
+        sent = []
+        outbox = Outbox(self.store, lambda: [("primary", lambda: FakeSMTP(sent, drop=True)),
+                                             ("gmail_ssl", lambda: FakeSMTP(sent))])
+        self.queue()
+        now = time.time()
+        with self.assertLogs("fusion.outbox", "ERROR") as logs:
+            outbox._deliver(self.store.claim(outbox.owner, now + 60, now, 10))
+        self.assertIn("connection lost while sending", logs.output[0])
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(self.store.get("e1")["status"], "queued")
+
+
+class MinifyJSTests(SimpleTestCase):
+    def test_regex_literals_are_verbatim(self):
+        self.assertEqual(minify_js("var re = /\\/\\/ x/g; // comment\nvar q = a / b / c;"),
+                         "var re=/\\/\\/ x/g;var q=a/b/c;")
+        self.assertEqual(minify_js('if (/["\'/]/.test(s)) { return 1; }'), 'if(/["\'/]/.test(s)){return 1;}')
+
+    def test_template_literals_are_verbatim(self):
+        src = "const t = `a\n  // kept ${ x + `in ${y}` }  /* kept */`;\nfoo()"
+        self.assertEqual(minify_js(src), "const t=`a\n  // kept ${x+`in ${y}`}  /* kept */`;foo()")
+
+    def test_line_breaks_kept_where_asi_depends_on_them(self):
+        self.assertEqual(minify_js("let b = a\n++b\nreturn\nx"), "let b=a\n++b\nreturn\nx")
+        self.assertEqual(minify_js("var a = b\n(c)"), "var a=b\n(c)")
+
+    def test_adjacent_operators_are_not_merged(self):
+        self.assertEqual(minify_js("x = y - -z; s = a++ + b"), "x=y- -z;s=a++ +b")
+
+
+class IdempotencyTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.idem = idem_module.Idempotency(idem_module.IdempotencyStore(os.path.join(tmp.name, "idem.sqlite3")),
+                                            wait=0.2, lease=60)
+        for name, value in (("_IDEMPOTENCY", self.idem), ("_IDEMPOTENCY_PID", os.getpid())):
+            patcher = mock.patch.object(idem_module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.calls = []
+
+        @idem_module.idempotent("sf_create_job")
+        def view(request):
+            self.calls.append(request.body)
+            return JsonResponse({"job_id": len(self.calls)}, status=202)
+
+        self.view = view
+
+    def post(self, body, key="k1"):
+        return self.view(RequestFactory().post("/sf/jobs", body, content_type="application/json",
+                                               HTTP_IDEMPOTENCY_KEY=key))
+
+    def test_same_key_replays_the_stored_response(self):
+        first = self.post('{"a": 1, "b": 2}')
+        again = self.post('{"b": 2, "a": 1}')  # same payload, other key order
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual((again.status_code, again.content), (202, first.content))
+        self.assertEqual(again["Idempotent-Replayed"], "true")
+
+    def test_same_key_other_payload_is_rejected(self):
+        self.post('{"a": 1}')
+        self.assertEqual(self.post('{"a": 2}').status_code, 422)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_pending_record_of_a_dead_process_is_taken_over(self):
+        ident = self.idem.identify("sf_create_job", RequestFactory().post(
+            "/sf/jobs", '{"a": 1}', content_type="application/json", HTTP_IDEMPOTENCY_KEY="k1"))
+        now = time.time()
+        self.idem.store.claim(ident.key, ident.fingerprint, "dead-worker", now, now + 0.05)
+        self.assertEqual(self.post('{"a": 1}').status_code, 409)  # lease still live: waited, then 409
+        time.sleep(0.06)
+        self.assertEqual(self.post('{"a": 1}').status_code, 202)  # lease expired: this request runs
+        self.assertEqual(len(self.calls), 1)
@@ -0,0 +1,244 @@
+"""
+Type-ahead customer search streamed as NDJSON (``GET /sf/customers/typeahead``).
+
+One JSON object per line:
+
+    {"phase": "local", "q": "acm", "items": [...]}     # index + cached searches, immediately
+    {"phase": "remote", "q": "acm", "items": [...]}    # merged with Service Fusion, when it answers
+    {"phase": "superseded", "q": "acm"}                # a newer query of the same session took over
+    {"phase": "error", "q": "acm", "message": "..."}
+    {"phase": "done", "q": "acm", "ms": 412.3}
+
+Queries are grouped per session (``session`` parameter / ``X-Typeahead-Session``
+header, client address otherwise). A new query supersedes the session's
+previous one: if that one is still in its debounce window
+(FUSION_TYPEAHEAD_DEBOUNCE) Service Fusion is never called; if its upstream
+call is in flight, the stream stops waiting for it. Under ASGI the call is
+cancelled too, unless another session waits on the same coalesced GET
+(``SingleFlight.ado`` only cancels it with its last waiter). Either way the
+superseded stream ends at once, as it does when the client disconnects.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import hashlib
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.http import HttpRequest, StreamingHttpResponse
+
+from .sf_models import dumps
+
+LIMIT = 25
+
+
+# ===================== Sessions =====================
+class Ticket:
+    def __init__(self, session: str, q: str) -> None:
+        self.session = session
+        self.q = q
+        self.superseded = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def on_supersede(self, fn: Callable[[], None]) -> None:
+        with self._lock:
+            if not self.superseded.is_set():
+                self._callbacks.append(fn)
+                return
+        fn()
+
+    def supersede(self) -> None:
+        with self._lock:
+            self.superseded.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn()
+
+
+class Sessions:
+    """
+    Latest query per session; starting a new one supersedes the previous.
+    """
+
+    def __init__(self) -> None:
+        self._current: Dict[str, Ticket] = {}
+        self._lock = threading.Lock()
+        self.superseded = 0
+
+    def begin(self, session: str, q: str) -> Ticket:
+        ticket = Ticket(session, q)
+        with self._lock:
+            previous = self._current.get(session)
+            self._current[session] = ticket
+            if previous is not None:
+                self.superseded += 1
+        if previous is not None:
+            previous.supersede()
+        return ticket
+
+    def end(self, ticket: Ticket) -> None:
+        with self._lock:
+            if self._current.get(ticket.session) is ticket:
+                del self._current[ticket.session]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"active": len(self._current), "superseded": self.superseded}
+
+
+_SESSIONS = Sessions()
+_POOL: Optional[ThreadPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def sessions() -> Sessions:
+    return _SESSIONS
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                workers = int(getattr(settings, "FUSION_TYPEAHEAD_WORKERS", 8))
+                _POOL = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fusion-typeahead")
+    return _POOL
+
+
+def session_key(request: HttpRequest) -> str:
+    explicit = request.GET.get("session") or request.headers.get("X-Typeahead-Session")
+    if explicit:
+        return explicit[:64]
+    client = f"{request.META.get('REMOTE_ADDR', '')}|{request.headers.get('User-Agent', '')}"
+    return hashlib.sha1(client.encode()).hexdigest()
+
+
+def _debounce() -> float:
+    return float(getattr(settings, "FUSION_TYPEAHEAD_DEBOUNCE", 0.15))
+
+
+# ===================== Ranking =====================
+def rank(q: str, *groups: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merges result lists (first occurrence of an id wins) and orders them: name
+    starts with the query, a word of the name does, the name contains it, then
+    the rest in their original order (index relevance, then remote order).
+    """
+    needle = q.strip().lower()
+    seen, merged = set(), []
+    for group in groups:
+        for it in group:
+            key = it.get("id") or id(it)
+            if key not in seen:
+                seen.add(key)
+                merged.append(it)
+
+    def score(pair: Any) -> tuple:
+        pos, it = pair
+        name = str(it.get("customer_name") or it.get("name") or "").lower()
+        if name.startswith(needle):
+            tier = 0
+        elif any(w.startswith(needle) for w in name.split()):
+            tier = 1
+        elif needle in name:
+            tier = 2
+        else:
+            tier = 3
+        return tier, pos
+
+    ranked = [it for _, it in sorted(enumerate(merged), key=score)][:LIMIT]
+    return [dict(it, name=it["customer_name"]) if "name" not in it and "customer_name" in it else it for it in ranked]
+
+
+def _line(phase: str, q: str, **extra: Any) -> bytes:
+    return dumps(dict(phase=phase, q=q, **extra)) + b"\n"
+
+
+def response(lines: Any) -> StreamingHttpResponse:
+    r = StreamingHttpResponse(lines, content_type="application/x-ndjson")
+    r["Cache-Control"] = "no-store"
+    r["X-Accel-Buffering"] = "no"  # nginx: pass each line through
+    return r
+
+
+# ===================== Streams =====================
+def stream(q: str, session: str, local: Callable[[str], tuple], remote: Callable[[str], List[Dict[str, Any]]]) -> Iterator[bytes]:
+    """
+    Sync stream. ``local(q)`` -> (items, complete): complete when the cached
+    search already is Service Fusion's answer; ``remote(q)`` blocks on it.
+    """
+    started = time.perf_counter()
+    if not q:
+        yield _line("done", q, ms=0.0)
+        return
+    ticket = _SESSIONS.begin(session, q)
+    try:
+        items, complete = local(q)
+        yield _line("local", q, items=rank(q, items))
+        if not complete:
+            if ticket.superseded.wait(_debounce()):
+                yield _line("superseded", q)
+                return
+            # Request id / metrics context follow the call into the pool thread.
+            future: Future = _pool().submit(contextvars.copy_context().run, remote, q)
+            wake = threading.Event()
+            ticket.on_supersede(wake.set)
+            future.add_done_callback(lambda f: wake.set())
+            wake.wait()
+            if not future.done():
+                yield _line("superseded", q)
+                return
+            try:
+                yield _line("remote", q, items=rank(q, items, future.result()))
+            except Exception as e:
+                yield _line("error", q, message=str(e))
+        yield _line("done", q, ms=round((time.perf_counter() - started) * 1000, 1))
+    finally:
+        _SESSIONS.end(ticket)
+
+
+async def astream(q: str, session: str, local: Callable[[str], Any], remote: Callable[[str], Any]) -> Any:
+    """
+    Async stream: ``local`` / ``remote`` are coroutine functions; a superseded upstream call is cancelled.
+    """
+    started = time.perf_counter()
+    if not q:
+        yield _line("done", q, ms=0.0)
+        return
+    loop = asyncio.get_running_loop()
+    ticket = _SESSIONS.begin(session, q)
+    superseded = loop.create_future()
+    task: Optional[asyncio.Future] = None
+
+    def _mark() -> None:
+        if not superseded.done():
+            superseded.set_result(True)
+
+    ticket.on_supersede(lambda: loop.call_soon_threadsafe(_mark))
+    try:
+        items, complete = await local(q)
+        yield _line("local", q, items=rank(q, items))
+        if not complete:
+            done, _ = await asyncio.wait({superseded}, timeout=_debounce())
+            if done:
+                yield _line("superseded", q)
+                return
+            task = asyncio.ensure_future(remote(q))
+            done, _ = await asyncio.wait({task, superseded}, return_when=asyncio.FIRST_COMPLETED)
+            if task not in done:
+                yield _line("superseded", q)
+                return
+            try:
+                yield _line("remote", q, items=rank(q, items, task.result()))
+            except Exception as e:
+                yield _line("error", q, message=str(e))
+        yield _line("done", q, ms=round((time.perf_counter() - started) * 1000, 1))
+    finally:
+        if task is not None and not task.done():  # superseded or client gone
+            task.cancel()
+        _SESSIONS.end(ticket)
@@ -1,18 +1,32 @@
+from django.conf import settings
 from django.urls import path
+from . import async_views, views
+from .assets import serve_asset
 from .views import (
-    sf_search_customers, sf_get_customer, sf_create_job,
-    sf_oauth_test, sf_create_customer, platform_server, bluecollar_main_platform,home
+    sf_oauth_test, platform_server, bluecollar_main_platform,home
 )
 
+# Sous ASGI (config/asgi.py) les endpoints Service Fusion passent par les vues async.
+api = async_views if getattr(settings, "FUSION_ASYNC_VIEWS", False) else views
+
 urlpatterns = [
     path("", home, name="home"),
     path("home/", bluecollar_main_platform, name="bluecollar_main_platform_root"),
 
     # API JSON pour le front
-    path("sf/customers/search", sf_search_customers, name="sf_search_customers"),
-    path("sf/customers/<str:cid>", sf_get_customer, name="sf_get_customer"),
-    path("sf/customers", sf_create_customer, name="sf_create_customer"),  # <-- AJOUTER CETTE LIGNE
-    path("sf/jobs", sf_create_job, name="sf_create_job"),
+    path("sf/customers/search", api.sf_search_customers, name="sf_search_customers"),
+    path("sf/customers/typeahead", api.sf_typeahead_customers, name="sf_typeahead_customers"),
+    path("sf/customers/<str:cid>", api.sf_get_customer, name="sf_get_customer"),
+    path("sf/customers", api.sf_create_customer, name="sf_create_customer"),  # <-- AJOUTER CETTE LIGNE
+    path("sf/jobs", api.sf_create_job, name="sf_create_job"),
+    path("sf/jobs/bulk", api.sf_create_jobs_bulk, name="sf_create_jobs_bulk"),
+    path("sf/jobs/<str:jid>", api.sf_get_job, name="sf_get_job"),
+    path("sf/tasks/<str:task_id>", views.sf_task_status, name="sf_task_status"),
+    path("sf/emails/<str:email_id>", views.sf_email_status, name="sf_email_status"),
+    path("sf/stats", views.sf_stats, name="sf_stats"),
+    path("healthz", views.healthz, name="healthz"),
+    path("metrics", views.metrics, name="metrics"),
+    path("assets/<str:name>", serve_asset, name="fusion_asset"),
 
     path("sf/oauth/test", sf_oauth_test, name="sf_oauth_test"),
     path("platform_server/", platform_server, name="platform_server"),
@@ -1,23 +1,48 @@
 from __future__ import annotations
 
 import json
+import logging
 import time
 import re
-import traceback
-from typing import Any, Dict, Optional, List
+import threading
+from typing import Any, Dict, Iterator, Optional, List
 
 import requests
 from django.conf import settings
-from django.core.mail import EmailMessage, get_connection
-from django.http import HttpRequest, JsonResponse
+from django.core.mail import get_connection
+from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import render
-from django.template.loader import render_to_string
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 
+from .artifacts import artifact_store
+from .assets import page_template
+from .breaker import CircuitOpenError, breaker, health
+from .cache import MISS, response_cache
+from .customer_index import customer_index, index_enabled
+from .email_render import email_renderer
+from .http_client import get_client
+from .idempotency import idempotent, idempotency
+from .llm_cache import llm_cache
+from .log import dump
+from .metrics import REGISTRY, timed
+from .oauth import get_token_provider
+from .outbox import get_outbox
+from .page_cache import page_cache, render_cached
+from .pipeline import Pipeline
+from .rag import clip, docx_head, text_head
+from .ratelimit import RateLimitExceeded, get_limiter, retry_after
+from .sf_models import CUSTOMER_DETAIL, CUSTOMER_SEARCH, JOB_CREATED, JOB_DETAIL, Customer, Job, dumps, json_response, loads
+from .singleflight import SingleFlight
+from .tasks import QueueFull, TaskContext, get_queue, task
+from . import bulk, typeahead
+
+log = logging.getLogger(__name__)
+
 # ===================== Constantes API SF =====================
-API_BASE = "https://api.servicefusion.com"
+API_BASE = getattr(settings, "SERVICE_FUSION_BASE_URL", "") or "https://api.servicefusion.com"
 API_VERSION = "v1"
-TOKEN_URL = f"{API_BASE}/oauth/access_token"
+TOKEN_URL = getattr(settings, "SERVICE_FUSION_TOKEN_URL", "") or f"{API_BASE}/oauth/access_token"
 
 # ----------------- Catégories autorisées + mapping UI -> SF -----------------
 ALLOWED_CATEGORIES = {
@@ -63,19 +88,17 @@ TECHNICIANS = {
     }
 }
 
-# ===================== Cache runtime =====================
-_OAUTH_CACHE: Dict[str, Any] = {"access_token": None, "exp": 0}
-
 # ===================== Pages =====================
 # Removed legacy views (home/connect/mapping) during cleanup; only core pages remain
 
 # ===================== Utils =====================
-def _timeout() -> int:
-    return int(getattr(settings, "HTTP_TIMEOUT", 30))
+def _timeout() -> tuple[float, float]:
+    # (connect, read) — see HTTP_CONNECT_TIMEOUT / HTTP_READ_TIMEOUT
+    return get_client().timeout
 
 
 def home(request: HttpRequest):
-    return render(request, "bluecollar_website_connected.html", {})
+    return render_cached(request, page_template("bluecollar_website_connected.html"))
 def _norm(s: str | None) -> str:
     return re.sub(r"\s+", " ", (s or "").strip())
 
@@ -104,92 +127,158 @@ def _json_error(e: Exception, path: str, resp: Optional[requests.Response] = Non
                 detail["response"] = j
         except Exception:
             detail["response"] = resp.text
-    print("SF ERROR:", json.dumps(detail, ensure_ascii=False))
-    traceback.print_exc()
+    if isinstance(e, CircuitOpenError):
+        # Fast-fail: no traceback, the breaker already logged the outage.
+        detail["error"] = f"{e.name} unavailable"
+        out = JsonResponse(detail, status=503)
+        out["Retry-After"] = str(max(1, int(e.retry_in)))
+        return out
+    log.error("SF error: %s", dump(detail), exc_info=e)
+    # Still throttled after the limiter's retries: tell the agent to retry later instead of a 502.
+    if isinstance(e, RateLimitExceeded) or (resp is not None and resp.status_code == 429):
+        out = JsonResponse(detail, status=429)
+        out["Retry-After"] = str(int(retry_after(getattr(resp, "headers", None), 5)))
+        return out
     return JsonResponse(detail, status=502)
 
 # ===================== OAuth (client_credentials) =====================
+@timed("oauth")
 def _get_oauth_token() -> str:
-    now = int(time.time())
-    if _OAUTH_CACHE["access_token"] and _OAUTH_CACHE["exp"] > now + 60:
-        return _OAUTH_CACHE["access_token"]
-
-    client_id = (getattr(settings, "SERVICE_FUSION_CLIENT_ID", "") or "").strip()
-    client_secret = (getattr(settings, "SERVICE_FUSION_CLIENT_SECRET", "") or "").strip()
-    if not client_id or not client_secret:
-        raise RuntimeError("SERVICE_FUSION_CLIENT_ID / SERVICE_FUSION_CLIENT_SECRET manquants.")
-
-    data = {"grant_type": "client_credentials", "client_id": client_id, "client_secret": client_secret}
-    r = requests.post(
-        TOKEN_URL,
-        headers={"Accept": "application/json", "Content-Type": "application/x-www-form-urlencoded"},
-        data=data,
-        timeout=_timeout(),
-    )
-    if r.status_code != 200:
-        raise RuntimeError(f"OAuth token failed: {r.status_code} {r.text[:300]}")
-
-    j = r.json()
-    tok = j.get("access_token")
-    if not tok:
-        raise RuntimeError(f"OAuth response without access_token: {j}")
-
-    try:
-        ttl = int(j.get("expires_in", "3600"))
-    except Exception:
-        ttl = 3600
-    _OAUTH_CACHE["access_token"] = tok
-    _OAUTH_CACHE["exp"] = now + ttl
-    return tok
+    # Shared across workers, single-flight, refreshed ahead of expiry (fusion/oauth.py).
+    return get_token_provider().get_token()
 
-def _headers_json() -> Dict[str, str]:
-    tok = _get_oauth_token()
+def _headers_json(tok: Optional[str] = None) -> Dict[str, str]:
+    tok = tok or _get_oauth_token()
     return {"Authorization": f"Bearer {tok}", "Accept": "application/json", "Content-Type": "application/json"}
 
 def _url(path: str) -> str:
     return f"{API_BASE}/{API_VERSION}{path if path.startswith('/') else '/' + path}"
 
-def _get(path: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
-    r = requests.get(_url(path), headers=_headers_json(), params=params or {}, timeout=_timeout())
-    r.raise_for_status()
+def _sf_request(method: str, path: str, **kwargs: Any) -> requests.Response:
+    # Fails fast with CircuitOpenError while Service Fusion is known to be down (fusion/breaker.py).
+    # Server-Timing: the token (oauth) is timed here, limiter wait and HTTP time by the client.
+    with breaker("servicefusion").guard():
+        tok = _get_oauth_token()
+        r = get_client().request(method, _url(path), headers=_headers_json(tok), **kwargs)
+        if r.status_code == 401:
+            # Token revoked before its exp: drop it for every worker and retry once with a fresh one.
+            log.warning("Service Fusion 401 on %s %s: refreshing the OAuth token", method, path)
+            r.close()
+            get_token_provider().invalidate(tok)
+            r = get_client().request(method, _url(path), headers=_headers_json(), **kwargs)
+        r.raise_for_status()
     return r
 
+def _get(path: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
+    return _sf_request("GET", path, params=params or {})
+
+# Concurrent identical GETs (same path, params and token scope) share one upstream call.
+_INFLIGHT_GETS = SingleFlight()
+
+def _get_key(path: str, params: Optional[Dict[str, Any]] = None) -> tuple:
+    items = tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+    return (path, items, get_token_provider().scope)
+
+def _get_json(path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Coalesced GET returning the parsed body. Waiters share the same object: read-only.
+    """
+    def fetch():
+        r = _get(path, params)
+        return loads(r.content) if r.content else {}
+    return _INFLIGHT_GETS.do(_get_key(path, params), fetch)
+
+# Bodies are sent compact (sf_models.dumps); _headers_json already sets the JSON content type.
 def _post(path: str, json_body: Dict[str, Any], params: Optional[Dict[str, Any]] = None) -> requests.Response:
-    r = requests.post(_url(path), headers=_headers_json(), json=json_body, params=params or {}, timeout=_timeout())
-    r.raise_for_status()
-    return r
+    return _sf_request("POST", path, data=dumps(json_body), params=params or {})
 
 def _patch(path: str, json_body: Dict[str, Any]) -> requests.Response:
-    r = requests.patch(_url(path), headers=_headers_json(), json=json_body, timeout=_timeout())
-    r.raise_for_status()
-    return r
+    return _sf_request("PATCH", path, data=dumps(json_body))
 
 def _put(path: str, json_body: Dict[str, Any]) -> requests.Response:
-    r = requests.put(_url(path), headers=_headers_json(), json=json_body, timeout=_timeout())
-    r.raise_for_status()
-    return r
+    return _sf_request("PUT", path, data=dumps(json_body))
 
 # ===================== API — Customers =====================
+def _search_key(q: str) -> str:
+    return _norm(q).lower()
+
 def api_customers_search(q: str) -> list[dict]:
-    params = {
-        "filters[name]": q,
-        "expand": "contacts,contacts.phones,contacts.emails,locations",
-        "per-page": 25,
-        "fields": "id,customer_name,contacts,locations",
-    }
-    r = _get("/customers", params=params)
-    data = r.json() if r.content else {}
-    if isinstance(data, dict) and isinstance(data.get("items"), list):
-        return data["items"]
-    return []
+    # Local index first once fully loaded (fusion/customer_index.py); Service Fusion only on a miss.
+    hits = _index_search(q, full_only=True)
+    if hits:
+        return hits
+    # Cached per normalized query (fusion/cache.py); empty results are cached briefly.
+    items = response_cache().get_or_fetch("customers_search", (_search_key(q),), lambda: _fetch_customers_search(q))
+    _index_customers(items)
+    return items
+
+def _index_search(q: str, full_only: bool = False) -> list[dict]:
+    """
+    ``full_only``: nothing until a full sync completed; before that the index
+    only holds the customers seen so far, so a hit is not a complete answer.
+    """
+    if not index_enabled():
+        return []
+    try:
+        svc = customer_index()
+        if full_only and not svc.ready:
+            return []
+        return svc.search(q, limit=25)
+    except Exception as e:
+        log.warning("Customer index search failed: %s", e)
+        return []
 
-def api_customer_by_id(cid: int | str) -> dict:
-    r = _get(f"/customers/{cid}", params={"expand": "contacts,contacts.phones,contacts.emails,locations"})
-    return r.json() if r.content else {}
+def _index_customers(items: list[dict]) -> None:
+    """
+    Write-through: customers seen remotely (search fallback, creation) are
+    searchable locally right away, before the next incremental sync.
+    """
+    if items and index_enabled():
+        try:
+            customer_index().upsert(items)
+        except Exception as e:
+            log.warning("Customer index update failed: %s", e)
 
-def api_job_by_id(jid: int | str) -> dict:
-    r = _get(f"/jobs/{jid}", params={"expand": "notes,visits"})
-    return r.json() if r.content else {}
+def _fetch_customers_search(q: str) -> list[dict]:
+    data = _get_json("/customers", params=CUSTOMER_SEARCH.params(**{"filters[name]": q, "per-page": 25}))
+    # Compact dicts: what the index and the response cache keep.
+    return [c.to_dict() for c in CUSTOMER_SEARCH.parse_items(data)]
+
+def _typeahead_local(q: str) -> tuple:
+    """
+    (items, complete): a cached search is Service Fusion's answer; index hits are not (may lag the sync).
+    """
+    cached = response_cache().lookup("customers_search", _search_key(q))
+    if cached is not MISS:
+        return cached, True
+    return _index_search(q), False
+
+def _typeahead_remote(q: str) -> list[dict]:
+    cache = response_cache()
+    key = cache.key("customers_search", _search_key(q))
+    items = _fetch_customers_search(q)
+    cache.store("customers_search", items, key=key)
+    _index_customers(items)
+    return items
+
+def api_customer_by_id(cid: int | str) -> Customer:
+    return response_cache().get_or_fetch("customer", (str(cid),), lambda: _fetch_customer_by_id(cid))
+
+def _fetch_customer_by_id(cid: int | str) -> Customer:
+    return CUSTOMER_DETAIL.parse(_get_json(f"/customers/{cid}", params=CUSTOMER_DETAIL.params()))
+
+def _invalidate_customer(customer_id: Any = None) -> None:
+    """
+    A customer (or one of its locations) changed: drop its detail entry and
+    every cached search, since any of them may now match differently.
+    """
+    cache = response_cache()
+    if customer_id is not None:
+        cache.invalidate("customer", str(customer_id))
+    cache.bump("customers_search")
+
+def api_job_by_id(jid: int | str) -> Job:
+    return JOB_DETAIL.parse(_get_json(f"/jobs/{jid}", params=JOB_DETAIL.params()))
 
 # ---------- AJOUTS: création client ----------
 def api_customer_create_minimal(customer_name: str) -> dict:
@@ -199,6 +288,7 @@ def api_customer_create_minimal(customer_name: str) -> dict:
     """
     body = {"customer_name": _norm(customer_name)}
     r = _post("/customers", body)
+    _invalidate_customer()
     return r.json() if r.content else {}
 
 def api_location_create_for_customer(customer_id: Any, loc: Dict[str, Any]) -> Optional[dict]:
@@ -221,6 +311,7 @@ def api_location_create_for_customer(customer_id: Any, loc: Dict[str, Any]) -> O
         return None
     try:
         r = _post("/locations", body)
+        _invalidate_customer(customer_id)
         return r.json() if r.content else {}
     except Exception:
         # On ne bloque pas si la création de location échoue.
@@ -351,19 +442,15 @@ def build_sf_job_payload(form_payload: Dict[str, Any], tech_notes: str = None) -
         payload["completion_notes"] = tech_notes
 
     # DETAILED LOGS FOR DEBUG
-    print(f"\n🔍 ===== JOB CREATION - DEBUG ======")
-    print(f"📋 Customer: {customer_name}")
-    print(f"📍 Location: {_norm(location.get('name'))}")
-    print(f"🏷️  Category: {category_ui}")
-    print(f"⚡ Priority: {priority}")
-    print(f"📝 Description: {description[:100]}...")
-    print(f"👨‍💼 Technician: {technician_obj['first_name']} {technician_obj['last_name']} (ID: {technician_obj['id']})")
-    print(f"📅 Status: {scheduling['status']}")
-    print(f"📅 Start Date: {scheduling.get('start_date', 'None')}")
-    print(f"📅 End Date: {scheduling.get('end_date', 'None')}")
-    if tech_notes:
-        print(f"📝 Tech Notes: {tech_notes[:100]}...")
-    print(f"🔍 ======================================\n")
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(
+            "Job creation: customer=%r location=%r category=%r priority=%r technician=%s %s (ID: %s) "
+            "status=%r start=%s end=%s description=%r tech_notes=%r",
+            customer_name, _norm(location.get("name")), category_ui, priority,
+            technician_obj["first_name"], technician_obj["last_name"], technician_obj["id"],
+            scheduling["status"], scheduling.get("start_date"), scheduling.get("end_date"),
+            description[:100], (tech_notes or "")[:100],
+        )
     mapped_cat = _map_category(category_ui)
     if mapped_cat:
         payload["category"] = mapped_cat
@@ -375,10 +462,7 @@ def build_sf_job_payload(form_payload: Dict[str, Any], tech_notes: str = None) -
 
 def api_job_create_strict(form_payload: Dict[str, Any], tech_notes: str = None) -> Dict[str, Any]:
     payload = build_sf_job_payload(form_payload, tech_notes)
-    r = _post("/jobs", payload, params={
-        "fields": "id,number,status,customer_name,description,priority,created_at,location_name,category,tech_notes",
-        "expand": "notes",
-    })
+    r = _post("/jobs", payload, params=JOB_CREATED.params())
     return r.json() if r.content else {}
 
 def api_job_patch_description(job_id: Any, description: str) -> None:
@@ -399,15 +483,16 @@ def api_job_update_tech_notes(job_id: Any, notes: str) -> None:
     """
     try:
         _put(f"/jobs/{job_id}", {"tech_notes": notes})
-        print(f"✅ Notes pour techniciens mises à jour pour le job {job_id}")
+        log.info("Notes pour techniciens mises à jour pour le job %s", job_id)
     except Exception as e:
-        print(f"❌ Erreur lors de la mise à jour des notes techniciens: {e}")
+        log.error("Erreur lors de la mise à jour des notes techniciens: %s", e)
 
 
 # ===================== LLM + Email (RESTORED) =====================
 def _llm_headers() -> Dict[str, str]:
     return {"Content-Type": "application/json", "x-api-key": getattr(settings, "LLM_API_KEY", "")}
 
+@timed("llm")
 def call_llm(name: str, title: str, description: str) -> Dict[str, Any]:
     """
     Calls your external LLM summarizer. Returns {"links": {...}, "rag_url": "..."} (best-effort).
@@ -416,21 +501,39 @@ def call_llm(name: str, title: str, description: str) -> Dict[str, Any]:
     url = getattr(settings, "LLM_API_URL", "")
     if not url:
         return {}
-    r = requests.post(url, headers=_llm_headers(), json={
-        "name": name or "Client",
-        "title": title or "Note",
-        "description": description or "",
-    }, timeout=_timeout())
-    r.raise_for_status()
+    cache = llm_cache()  # repeats (and near-duplicates, if enabled) skip the LLM: fusion/llm_cache.py
+    hit = cache.get(name, title, description) if cache else None
+    if hit is not None:
+        return hit
+    try:
+        with breaker("llm").guard():
+            # Pooled client, outside the Service Fusion rate limit (the LLM has its own quota).
+            r = get_client().request("POST", url, paced=False, headers=_llm_headers(), json={
+                "name": name or "Client",
+                "title": title or "Note",
+                "description": description or "",
+            }, timeout=_timeout())
+            r.raise_for_status()
+    except CircuitOpenError as e:
+        # Known LLM outage: create the job without AI notes instead of waiting for the timeout.
+        log.warning("%s; job created without LLM notes.", e)
+        return {}
     data = r.json() if r.content else {}
     links = data.get("links") or {}
     rag_url = links.get("docx") or links.get("json")
-    return {"links": links, "rag_url": rag_url, "raw": data}
+    result = {"links": links, "rag_url": rag_url, "raw": data}
+    if cache:
+        cache.put(name, title, description, result)
+    return result
 
+@timed("rag")
 def get_rag_document_content(rag_url: str) -> str:
     """
     Récupère le contenu du document RAG depuis l'URL.
+    Téléchargement mis en cache (fusion/artifacts.py), extraction bornée (fusion/rag.py):
+    seuls les FUSION_RAG_CHAR_BUDGET premiers caractères sont lus, une fois par version du document.
     """
+    budget = int(getattr(settings, "FUSION_RAG_CHAR_BUDGET", 2000))
     try:
         if not rag_url:
             return "Document RAG non disponible"
@@ -438,52 +541,29 @@ def get_rag_document_content(rag_url: str) -> str:
         # Pour les documents .docx, on va extraire le contenu textuel
         if rag_url.endswith('.docx'):
             try:
-                import zipfile
-                import xml.etree.ElementTree as ET
-                from io import BytesIO
-                
-                print(f"🔍 Tentative d'extraction du contenu .docx depuis: {rag_url}")
-                response = requests.get(rag_url, timeout=30)
-                response.raise_for_status()
-                
-                # Extraire le contenu textuel du document .docx
-                with zipfile.ZipFile(BytesIO(response.content)) as docx:
-                    # Lire le document principal
-                    document_xml = docx.read('word/document.xml')
-                    root = ET.fromstring(document_xml)
-                    
-                    # Extraire tout le texte des paragraphes
-                    text_content = []
-                    for paragraph in root.iter():
-                        if paragraph.text and paragraph.text.strip():
-                            text_content.append(paragraph.text.strip())
-                    
-                    # Joindre le contenu et nettoyer
-                    full_text = ' '.join(text_content)
-                    
-                    print(f"📄 Contenu extrait: {full_text[:200]}...")
-                    
-                    # Limiter la longueur et nettoyer
-                    if len(full_text) > 2000:
-                        full_text = full_text[:2000] + "..."
-                    
-                    if full_text.strip():
-                        return full_text
-                    else:
-                        print("⚠️ Aucun contenu textuel trouvé dans le document .docx")
-                        return f"📄 Document technique disponible: {rag_url}\n\nCe document contient l'analyse détaillée du problème et les recommandations de réparation."
+                log.debug("Tentative d'extraction du contenu .docx depuis: %s", rag_url)
+                with breaker("llm").guard():
+                    full_text = artifact_store().text(rag_url, f"docx:{budget}", lambda a: docx_head(a["path"], budget))
+
+                log.debug("Contenu extrait: %.200s", full_text)
+
+                if full_text.strip():
+                    return clip(full_text, budget)
+                else:
+                    log.warning("Aucun contenu textuel trouvé dans le document .docx: %s", rag_url)
+                    return f"📄 Document technique disponible: {rag_url}\n\nCe document contient l'analyse détaillée du problème et les recommandations de réparation."
                     
             except Exception as docx_error:
-                print(f"❌ Erreur lors de l'extraction du contenu .docx: {docx_error}")
+                log.error("Erreur lors de l'extraction du contenu .docx: %s", docx_error)
                 return f"📄 Document technique disponible: {rag_url}\n\nCe document contient l'analyse détaillée du problème et les recommandations de réparation."
         else:
             # Pour les autres types de fichiers
-            response = requests.get(rag_url, timeout=30)
-            response.raise_for_status()
-            return response.text[:2000] + "..." if len(response.text) > 2000 else response.text
+            with breaker("llm").guard():
+                head = artifact_store().text(rag_url, f"head:{budget}", lambda a: text_head(a["path"], budget, a["encoding"]))
+            return clip(head, budget)
             
     except Exception as e:
-        print(f"❌ Erreur lors de la récupération du document RAG: {e}")
+        log.error("Erreur lors de la récupération du document RAG: %s", e)
         return f"📄 Document technique disponible: {rag_url}\n\nErreur lors de la récupération du contenu détaillé."
 
 # ===================== Email helpers =====================
@@ -571,149 +651,319 @@ def _resolve_from_addresses() -> tuple[str, dict]:
 
     return envelope_from, headers
 
+def _smtp_transports() -> List[tuple]:
+    """
+    SMTP connection factories in delivery order for the outbox (fusion/outbox.py):
+    primary settings, then Gmail SSL:465 only if host is gmail or unspecified (keeps prior behavior).
+    """
+    transports = [("primary", _conn_from_settings)]
+    host = (getattr(settings, "EMAIL_HOST", "") or "").lower().strip()
+    if "gmail.com" in host or host == "":
+        transports.append(("gmail", _conn_gmail_ssl))
+    return transports
+
+def _outbox_send(subject: str, body: str, recipient: str, subtype: str) -> bool:
+    """
+    Queues the message and waits up to FUSION_OUTBOX_WAIT seconds for its delivery.
+    False means "not delivered yet": the outbox keeps retrying it in the background.
+    """
+    # Force envelope sender to SMTP user for Gmail compliance; keep display name in 'From' header.
+    from_email, from_headers = _resolve_from_addresses()
+    log.debug("Email: from_email=%r from_headers=%r", from_email, from_headers)
+    rec = get_outbox().send(subject, body, [recipient], from_email, from_headers, subtype=subtype,
+                            wait=float(getattr(settings, "FUSION_OUTBOX_WAIT", 10)))
+    if rec["status"] != "sent":
+        log.warning("Email %s not delivered yet (%s); see /sf/emails/%s", rec["id"], rec["status"], rec["id"])
+    return rec["status"] == "sent"
+
+@timed("outbox")
 def _send_html_email(subject: str, html: str, to_email: str) -> bool:
     """
     Robust HTML sender with strict Gmail/Workspace compatibility.
     Steps:
-      1) Validate recipient; build a primary SMTP connection (STARTTLS 587 if configured).
-      2) Force envelope sender to SMTP username; keep display name in 'From' header.
-      3) On 535 or any SMTP error, retry with SSL:465 fallback.
-      4) If everything fails, print to console backend so no data is lost.
+      1) Validate recipient.
+      2) Persist the message in the outbox; its sender thread delivers it over a pooled
+         SMTP connection (primary settings, then SSL:465 fallback), with retries.
+      3) After the last attempt the message is printed to the console backend so no data is lost.
     """
     recipient = (to_email or getattr(settings, "WORKORDER_RECIPIENT", "")).strip()
-    print(f"🔍 DEBUG EMAIL: to_email='{to_email}', WORKORDER_RECIPIENT='{getattr(settings, 'WORKORDER_RECIPIENT', '')}', final_recipient='{recipient}'")
+    log.debug("Email: to_email=%r final_recipient=%r", to_email, recipient)
     if not recipient:
-        print("⚠️ No recipient provided; skip email.")
+        log.warning("No recipient provided; skip email.")
         return False
+    return _outbox_send(subject, html, recipient, "html")
 
-    # Resolve envelope sender + branded header.
-    from_email, from_headers = _resolve_from_addresses()
-    print(f"🔍 DEBUG EMAIL: from_email='{from_email}', from_headers={from_headers}")
+def _render_email(template_ctx: Dict[str, Any]) -> str:
+    """
+    Renders the email HTML using templates/send_mail.html (compiled once, CSS inlined; fusion/email_render.py)
+    """
+    return email_renderer().render(template_ctx)
 
-    # 1) Primary connection (from settings).
-    try:
-        with _conn_from_settings() as conn:
-            msg = EmailMessage(
-                subject=subject,
-                body=html,
-                from_email=from_email,   # envelope sender MUST match SMTP auth user for Gmail
-                to=[recipient],
-                connection=conn,
-                headers=from_headers     # keep 'Bluecollar <...>' display if configured
-            )
-            msg.content_subtype = "html"
-            msg.send(fail_silently=False)
-        print("✅ HTML Email sent (primary SMTP settings).")
-        return True
-    except Exception as e1:
-        # Provide a targeted hint when Gmail refuses credentials.
-        msg = str(e1)
-        if "535" in msg and "Username and Password not accepted" in msg:
-            print("❌ SMTP 535 (primary): Gmail/Workspace rejected credentials. "
-                  "Ensure EMAIL_HOST_USER is the mailbox and EMAIL_HOST_PASSWORD is an App Password.")
-        else:
-            print(f"❌ SMTP send error (primary): {e1}")
+# ===================== Shared builders (sync + async views) =====================
+def _tech_notes(content: str) -> str:
+    return f"AI ANALYSIS & RECOMMENDATIONS:\n\n{content}\n\nComplete document sent by email with attachments."
 
-    # 2) Gmail SSL:465 fallback — only if host is gmail or unspecified (keeps prior behavior).
+def _reply_from_json(json_content: str) -> str:
+    """
+    Returns the 'reply' field of the LLM JSON artifact, or the raw text if it does not parse.
+    """
     try:
-        host = (getattr(settings, "EMAIL_HOST", "") or "").lower().strip()
-        if "gmail.com" in host or host == "":
-            with _conn_gmail_ssl() as conn:
-                msg = EmailMessage(
-                    subject=subject,
-                    body=html,
-                    from_email=from_email,
-                    to=[recipient],
-                    connection=conn,
-                    headers=from_headers
-                )
-                msg.content_subtype = "html"
-                msg.send(fail_silently=False)
-            print("✅ HTML Email sent (fallback Gmail SSL:465).")
-            return True
-    except Exception as e2:
-        msg = str(e2)
-        if "535" in msg and "Username and Password not accepted" in msg:
-            print("❌ SMTP 535 (gmail ssl fallback): Gmail/Workspace rejected credentials. "
-                  "Verify that the account uses an App Password and the domain is on Google Workspace.")
-        else:
-            print(f"❌ SMTP send error (gmail ssl fallback): {e2}")
+        json_data = json.loads(json_content)
+        return json_data.get('reply', json_content)
+    except Exception as json_error:
+        log.warning("JSON parsing error: %s", json_error)
+        return json_content
+
+def _artifact_reply(artifact: Dict[str, Any]) -> str:
+    with open(artifact["path"], "r", encoding=artifact["encoding"] or "utf-8", errors="replace") as f:
+        return _reply_from_json(f.read())
+
+def _job_refs(job_resp: Dict[str, Any]) -> tuple[Any, Any, Optional[str]]:
+    job_id = _safe_get(job_resp, "id") or _safe_get(job_resp, "job_id") or _safe_get(job_resp, "data", "id")
+    job_number = _safe_get(job_resp, "number") or _safe_get(job_resp, "data", "number")
+    job_api_url = f"{API_BASE}/{API_VERSION}/jobs/{job_id}" if job_id else None
+    return job_id, job_number, job_api_url
+
+def _rag_extras(rag: Optional[str], links: Dict[str, Any]) -> list[str]:
+    extras = []
+    if rag: extras.append(f"RAG: {rag}")
+    if links.get("docx"): extras.append(f"Doc: {links['docx']}")
+    return extras
+
+def _rag_note(rag: Optional[str], links: Dict[str, Any]) -> str:
+    # Créer une note formatée pour la section notes
+    note_parts = ["🔍 AI-Generated Analysis & Resources:"]
+    if rag:
+        note_parts.append(f"📊 RAG Analysis: {rag}")
+    if links.get("docx"):
+        note_parts.append(f"📄 Document: {links['docx']}")
+
+    # Ajouter des informations sur l'assignation du technicien
+    from datetime import datetime
+    current_hour = datetime.now().hour
+    if 8 <= current_hour < 17:
+        note_parts.append("⏰ Assigned during business hours (8am-5pm) - Visible on dispatch grid")
+    else:
+        note_parts.append("🌙 Assigned after hours - Will appear on next business day dispatch")
+    return "\n".join(note_parts)
 
-    # 3) Console fallback (no external SMTP; guarantees traceability).
-    try:
-        from django.core.mail import get_connection as gc
-        with gc("django.core.mail.backends.console.EmailBackend") as conn:
-            msg = EmailMessage(
-                subject=subject,
-                body=html,
-                from_email=from_email,
-                to=[recipient],
-                connection=conn,
-                headers=from_headers
-            )
-            msg.content_subtype = "html"
-            msg.send(fail_silently=True)
-        print("ℹ️ HTML Email printed to console backend as fallback.")
-    except Exception as e3:
-        print(f"⚠️ Console email fallback failed: {e3}")
-    return False
+def _job_email_ctx(payload: Dict[str, Any], job_resp: Dict[str, Any], links: Dict[str, Any], rag: Optional[str]) -> Dict[str, Any]:
+    job_id, job_number, job_api_url = _job_refs(job_resp)
+    return {
+        "type": "job_created",
+        "brand": {"name": "BlueCollar AI"},
+        "job": {
+            "id": job_id,
+            "number": job_number,
+            "status": _safe_get(job_resp, "status"),
+            "priority": _safe_get(job_resp, "priority") or payload.get("priority"),
+            "category": _safe_get(job_resp, "category") or payload.get("category"),
+            "created_at": _safe_get(job_resp, "created_at"),
+            "api_url": job_api_url,
+            "description": payload.get("problem_details") or "(empty)",
+        },
+        "customer": {
+            "name": _norm(payload.get("customer_name")),
+            "contact": _safe_get(payload, "contact") or {},
+        },
+        "location": {
+            "name": _safe_get(payload, "service_location", "name") or "",
+            "address": _safe_get(payload, "service_location", "address") or "",
+        },
+        "links": {
+            "docx": links.get("docx"),
+            "json": links.get("json"),
+            "rag": rag,
+        },
+    }
 
-def _render_email(template_ctx: Dict[str, Any]) -> str:
-    """
-    Renders the email HTML using templates/send_mail.html
-    """
-    return render_to_string("send_mail.html", template_ctx or {})
+def _job_email_subject(ctx: Dict[str, Any], category: str, priority: str) -> str:
+    return f"[Work Order] {ctx['customer']['name']} — {category}/{priority}"
+
+def _customer_email_ctx(payload: Dict[str, Any], full: Dict[str, Any], cname: str) -> Dict[str, Any]:
+    loc = payload.get("service_location") or {}
+    return {
+        "type": "customer_created",
+        "brand": {"name": "BlueCollar AI"},
+        "customer": {
+            "id": full.get("id"),
+            "name": full.get("customer_name") or cname,
+            "contact": _safe_get(payload, "contact") or {},
+        },
+        "location": {
+            "name": loc.get("name") or "",
+            "address": (loc.get("address") or loc.get("street_1") or ""),
+            "city": loc.get("city") or "",
+            "state": loc.get("state") or "",
+            "zip": loc.get("zip") or "",
+        },
+        "links": {},
+    }
 
 # ---- Legacy text email kept intact (not used by new HTML flow but preserved) ----
 def email_workorder(subject: str, lines: list[str], to_email: Optional[str] = None) -> bool:
     recipient = (to_email or getattr(settings, "WORKORDER_RECIPIENT", "")).strip()
     if not recipient:
-        print("⚠️ No recipient provided; skip email.")
+        log.warning("No recipient provided; skip email.")
         return False
+    return _outbox_send(subject, "\n".join(lines).strip(), recipient, "plain")
+# -----------------------------------------------------------------------------
 
-    # Force envelope sender to SMTP user for Gmail compliance.
-    from_email, from_headers = _resolve_from_addresses()
-
-    body = "\n".join(lines).strip()
+# ===================== Job pipeline stages (sf_create_job) =====================
+def _prepare_tech_notes(links: Dict[str, Any], rag: Optional[str]) -> Optional[str]:
+    """
+    Builds the technician notes from the LLM artifacts (JSON 'reply' first, then .docx).
+    """
+    if not (rag or links):
+        return None
     try:
-        with _conn_from_settings() as conn:
-            EmailMessage(
-                subject=subject,
-                body=body,
-                from_email=from_email,
-                to=[recipient],
-                connection=conn,
-                headers=from_headers
-            ).send(fail_silently=False)
+        # Try JSON content first which is easier to read
+        json_url = links.get("json")
+        if json_url:
+            # Extract only the 'reply' field content from JSON (parsed once per artifact version)
+            with breaker("llm").guard():
+                reply = artifact_store().text(json_url, "reply", _artifact_reply)
+            log.debug("JSON reply retrieved: %.200s", reply)
+            tech_notes = _tech_notes(reply)
+        else:
+            # Fallback to .docx document
+            tech_notes = _tech_notes(get_rag_document_content(rag))
+
+        log.debug("Tech Notes prepared: %.100s", tech_notes)
+        return tech_notes
+    except Exception as e:
+        log.error("Error during RAG notes generation: %s", e)
+        return _tech_notes(f"Technical document available: {rag}")
+
+def _verify_tech_notes(job_resp: Dict[str, Any], tech_notes: Optional[str]) -> Optional[bool]:
+    """
+    Force verification via GET to ensure tech_notes are properly saved.
+    """
+    job_id = _job_refs(job_resp)[0]
+    if not (job_id and tech_notes):
+        return None
+    log.debug("Final verification of tech_notes via GET /jobs/%s", job_id)
+    job_details = api_job_by_id(job_id)
+    if job_details.tech_notes:
+        log.info("Tech Notes confirmed via GET for job %s", job_id)
         return True
-    except Exception:
-        try:
-            with _conn_gmail_ssl() as conn:
-                EmailMessage(
-                    subject=subject,
-                    body=body,
-                    from_email=from_email,
-                    to=[recipient],
-                    connection=conn,
-                    headers=from_headers
-                ).send(fail_silently=False)
-            return True
-        except Exception:
-            try:
-                from django.core.mail import get_connection as gc
-                with gc("django.core.mail.backends.console.EmailBackend") as conn:
-                    EmailMessage(
-                        subject=subject,
-                        body=body,
-                        from_email=from_email,
-                        to=[recipient],
-                        connection=conn,
-                        headers=from_headers
-                    ).send(fail_silently=True)
-            except Exception:
-                pass
+    log.warning("Tech Notes still missing after GET verification (job %s); fields: %s", job_id, list(job_details.to_dict()))
     return False
-# -----------------------------------------------------------------------------
+
+def _enrich_job_description(job_resp: Dict[str, Any], problem: str, rag: Optional[str], links: Dict[str, Any]) -> None:
+    """
+    Appends the RAG / document links to the job description.
+    """
+    job_id = _job_refs(job_resp)[0]
+    extras = _rag_extras(rag, links)
+    if not (job_id and extras):
+        return
+    cur_desc = _safe_get(job_resp, "description") or problem or ""
+    api_job_patch_description(job_id, (cur_desc + "\n\n" + "\n".join(extras)).strip())
+
+def _add_rag_note(job_resp: Dict[str, Any], rag: Optional[str], links: Dict[str, Any]) -> None:
+    job_id = _job_refs(job_resp)[0]
+    if job_id and _rag_extras(rag, links):
+        api_job_add_note(job_id, _rag_note(rag, links))
+
+def _send_job_email(payload: Dict[str, Any], job_resp: Dict[str, Any], links: Dict[str, Any], rag: Optional[str], category: str, priority: str) -> bool:
+    to_email = _safe_get(payload, "email", "to")
+    ctx = _job_email_ctx(payload, job_resp, links, rag)
+    return _send_html_email(
+        subject=_job_email_subject(ctx, category, priority),
+        html=_render_email(ctx),
+        to_email=to_email or getattr(settings, "WORKORDER_RECIPIENT", ""),
+    )
+
+# ===================== Background enrichment (after job creation) =====================
+def _enrichment_data(payload: Dict[str, Any], r: Dict[str, Any], category: str, priority: str) -> Dict[str, Any]:
+    """
+    Everything the post-creation steps need, JSON-serializable so it can be queued.
+    """
+    llm = r.get("llm") or {}
+    return {
+        "payload": payload,
+        "job_resp": r["job"],
+        "links": llm.get("links") or {},
+        "rag": llm.get("rag_url"),
+        "tech_notes": r.get("tech_notes"),
+        "category": category,
+        "priority": priority,
+    }
+
+def _enrichment_pipeline(data: Dict[str, Any], on_stage=None, skip=None) -> Pipeline:
+    """
+    verify ∥ describe ∥ note ∥ email — all only depend on the created job.
+    ``skip(name)`` lets a retried task leave out steps that already completed.
+    """
+    payload, job_resp, links, rag = data["payload"], data["job_resp"], data["links"], data["rag"]
+    problem = payload.get("problem_details") or ""
+    stages = (
+        ("verify", lambda r: _verify_tech_notes(job_resp, data["tech_notes"])),
+        ("describe", lambda r: _enrich_job_description(job_resp, problem, rag, links)),
+        ("note", lambda r: _add_rag_note(job_resp, rag, links)),
+        ("email", lambda r: _send_job_email(payload, job_resp, links, rag, data["category"], data["priority"])),
+    )
+    p = Pipeline(on_stage=on_stage)
+    for name, fn in stages:
+        if name == "email" and not data.get("notify", True):
+            continue  # bulk intake: one digest per recipient instead
+        if skip is None or not skip(name):
+            p.stage(name, fn, required=False)
+    return p
+
+@task("job_enrichment")
+def _job_enrichment_task(ctx: TaskContext) -> Dict[str, Any]:
+    p = _enrichment_pipeline(
+        ctx.payload,
+        on_stage=lambda name, state, detail: ctx.progress(name, state, **detail),
+        skip=ctx.done,
+    )
+    p.run()
+    if not ctx.payload.get("notify", True):
+        return {"email_status": "digest", "timings": p.timings}
+    email_ok = p.results.get("email") if "email" in p.results else ctx.done("email")
+    return {"email_status": "sent" if email_ok else "unknown", "timings": p.timings}
+
+def _schedule_enrichment(data: Dict[str, Any]) -> Optional[str]:
+    """
+    Queues the enrichment task; None means "run it inline" (disabled or queue full).
+    """
+    if not getattr(settings, "FUSION_BACKGROUND_ENRICHMENT", True):
+        return None
+    try:
+        return get_queue().submit("job_enrichment", data)
+    except QueueFull as e:
+        log.warning("Task queue full (%s); enrichment runs inline.", e)
+        return None
+
+def _merge_timings(*parts: Dict[str, float]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    total = 0.0
+    for t in parts:
+        total += t.get("total", 0.0)
+        out.update({k: v for k, v in t.items() if k != "total"})
+    out["total"] = round(total, 1)
+    return out
+
+def _job_response(data: Dict[str, Any], timings: Dict[str, float], task_id: Optional[str] = None,
+                  email_ok: Optional[bool] = None) -> JsonResponse:
+    job_resp = data["job_resp"]
+    job_id, job_number, job_api_url = _job_refs(job_resp)
+    body = {
+        "ok": True,
+        "job_id": job_id,
+        "job_number": job_number,
+        "job_api_url": job_api_url,
+        "email_status": "sent" if email_ok else "unknown",
+        "links": data["links"], "rag_url": data["rag"],
+        "service_fusion": job_resp,
+        "timings": timings,
+    }
+    if task_id:
+        body.update(email_status="queued", task_id=task_id, status_url=reverse("sf_task_status", args=[task_id]))
+        return JsonResponse(body, status=202)
+    return JsonResponse(body, status=200)
 
 # ===================== API JSON (front) =====================
 def sf_search_customers(request: HttpRequest):
@@ -724,21 +974,28 @@ def sf_search_customers(request: HttpRequest):
         return JsonResponse([], safe=False)
     try:
         items = api_customers_search(q)
-        for it in items:
-            if "name" not in it and "customer_name" in it:
-                it["name"] = it["customer_name"]
-        return JsonResponse(items, safe=False)
+        # Cached items are shared: alias "name" on copies.
+        items = [dict(it, name=it["customer_name"]) if "name" not in it and "customer_name" in it else it for it in items]
+        return json_response(items)
     except requests.HTTPError as he:
         return _json_error(he, "customers", he.response)
     except Exception as e:
         return _json_error(e, "customers")
 
+def sf_typeahead_customers(request: HttpRequest):
+    """
+    Streamed type-ahead (NDJSON, see fusion/typeahead.py): local results first, then Service Fusion.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    q = (request.GET.get("q") or "").strip()
+    return typeahead.response(typeahead.stream(q, typeahead.session_key(request), _typeahead_local, _typeahead_remote))
+
 def sf_get_customer(request: HttpRequest, cid: str):
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
     try:
-        data = api_customer_by_id(cid)
-        return JsonResponse(data, safe=False)
+        return json_response(api_customer_by_id(cid))
     except requests.HTTPError as he:
         return _json_error(he, "customers", he.response)
     except Exception as e:
@@ -748,8 +1005,7 @@ def sf_get_job(request: HttpRequest, jid: str):
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
     try:
-        data = api_job_by_id(jid)
-        return JsonResponse(data, safe=False)
+        return json_response(api_job_by_id(jid))
     except requests.HTTPError as he:
         return _json_error(he, "jobs", he.response)
     except Exception as e:
@@ -757,6 +1013,7 @@ def sf_get_job(request: HttpRequest, jid: str):
 
 # ---------- AJOUT: endpoint POST /sf/customers ----------
 @csrf_exempt
+@idempotent("sf_create_customer")
 def sf_create_customer(request: HttpRequest):
     """
     Crée un client Service Fusion (minimal), puis essaie d’ajouter une localisation primaire.
@@ -789,33 +1046,18 @@ def sf_create_customer(request: HttpRequest):
 
         # 3) Fetch full (best-effort)
         try:
-            full = api_customer_by_id(cust_id)
+            full = api_customer_by_id(cust_id).to_dict()
         except Exception:
             full = {"id": cust_id, "customer_name": cname}
+        _index_customers([full])
 
         # 4) Send HTML notification
         to_email = _safe_get(payload, "email", "to")
-        ctx = {
-            "type": "customer_created",
-            "brand": {"name": "BlueCollar AI"},
-            "customer": {
-                "id": full.get("id"),
-                "name": full.get("customer_name") or cname,
-                "contact": _safe_get(payload, "contact") or {},
-            },
-            "location": {
-                "name": loc.get("name") or "",
-                "address": (loc.get("address") or loc.get("street_1") or ""),
-                "city": loc.get("city") or "",
-                "state": loc.get("state") or "",
-                "zip": loc.get("zip") or "",
-            },
-            "links": {},
-        }
+        ctx = _customer_email_ctx(payload, full, cname)
         html = _render_email(ctx)
         _send_html_email(subject=f"[Customer Created] {cname}", html=html, to_email=to_email or getattr(settings, "WORKORDER_RECIPIENT", ""))
 
-        return JsonResponse(full, safe=False, status=200)
+        return json_response(full)
 
     except requests.HTTPError as he:
         return _json_error(he, "customers", he.response)
@@ -824,6 +1066,7 @@ def sf_create_customer(request: HttpRequest):
 # ---------- fin AJOUT ----------
 
 @csrf_exempt
+@idempotent("sf_create_job")
 def sf_create_job(request: HttpRequest):
     if request.method != "POST":
         return JsonResponse({"error": "Method not allowed"}, status=405)
@@ -833,172 +1076,216 @@ def sf_create_job(request: HttpRequest):
     except Exception:
         return JsonResponse({"error": "Invalid JSON"}, status=400)
 
-    try:
-        # 1) Générer les notes RAG AVANT la création du job
-        customer_name = _norm(payload.get("customer_name"))
-        category = payload.get("category") or payload.get("category_ui") or ""
-        priority = payload.get("priority") or "Normal"
-        problem = payload.get("problem_details") or ""
-        
-        print(f"\n🤖 ===== RAG GENERATION BEFORE CREATION ======")
-        llm = call_llm(customer_name or "Client", f"{category}/{priority}", problem)
-        links, rag = llm.get("links", {}), llm.get("rag_url")
-       
-        # Prepare technician notes
-        tech_notes = None
-        if rag or links:
-            try:
-                # Try JSON content first which is easier to read
-                json_url = links.get("json")
-                if json_url:
-                    response = requests.get(json_url, timeout=30)
-                    response.raise_for_status()
-                    json_content = response.text
-                    print(f"📄 JSON content retrieved: {json_content[:200]}...")
-                    
-                    # Extract only the 'reply' field content from JSON
-                    try:
-                        json_data = json.loads(json_content)
-                        reply_content = json_data.get('reply', json_content)
-                        tech_notes = f"AI ANALYSIS & RECOMMENDATIONS:\n\n{reply_content}\n\nComplete document sent by email with attachments."
-                    except Exception as json_error:
-                        print(f"⚠️ JSON parsing error: {json_error}")
-                        # Fallback if JSON parsing fails
-                        tech_notes = f"AI ANALYSIS & RECOMMENDATIONS:\n\n{json_content}\n\nComplete document sent by email with attachments."
-                else:
-                    # Fallback to .docx document
-                    rag_content = get_rag_document_content(rag)
-                    tech_notes = f"AI ANALYSIS & RECOMMENDATIONS:\n\n{rag_content}\n\nComplete document sent by email with attachments."
-                
-                print(f"📝 Tech Notes prepared: {tech_notes[:100]}...")
-            except Exception as e:
-                print(f"❌ Error during RAG notes generation: {e}")
-                tech_notes = f"AI ANALYSIS & RECOMMENDATIONS:\n\nTechnical document available: {rag}\n\nComplete document sent by email with attachments."
-        
-        print(f"🤖 ===========================================\n")
+    customer_name = _norm(payload.get("customer_name"))
+    category = payload.get("category") or payload.get("category_ui") or ""
+    priority = payload.get("priority") or "Normal"
+    problem = payload.get("problem_details") or ""
 
-        # 2) Create job with RAG notes included
-        print(f"\n🚀 ===== SENDING TO SERVICE FUSION ======")
-        print(f"📤 Sending payload to Service Fusion API...")
-        job_resp = api_job_create_strict(payload, tech_notes)
-        print(f"📥 Response received from Service Fusion:")
-        
-        job_id = _safe_get(job_resp, "id") or _safe_get(job_resp, "job_id") or _safe_get(job_resp, "data", "id")
-        job_number = _safe_get(job_resp, "number") or _safe_get(job_resp, "data", "number")
-        job_api_url = f"{API_BASE}/{API_VERSION}/jobs/{job_id}" if job_id else None
-        
-        print(f"✅ JOB CREATED SUCCESSFULLY!")
-        print(f"🆔 Job ID: {job_id}")
-        print(f"🔢 Job Number: {job_number}")
-        print(f"🔗 Job URL: {job_api_url}")
-        
-        # Check if tech_notes are present in the response
-        tech_notes_in_response = _safe_get(job_resp, 'tech_notes')
-        if tech_notes_in_response:
-            print(f"📝 Tech Notes in response: {tech_notes_in_response[:100]}...")
-        else:
-            print(f"⚠️ Tech Notes not found in Service Fusion response")
-        
-        # Force verification via GET to ensure tech_notes are properly saved
-        if job_id and tech_notes:
-            try:
-                print(f"🔍 Final verification of tech_notes via GET /jobs/{job_id}")
-                job_details = api_job_by_id(job_id)
-                tech_notes_verified = _safe_get(job_details, 'tech_notes')
-                if tech_notes_verified:
-                    print(f"✅ Tech Notes confirmed via GET: {tech_notes_verified[:100]}...")
-                    print(f"🎯 Tech notes are properly saved in Service Fusion!")
-                else:
-                    print(f"❌ Tech Notes still missing after GET verification")
-                    print(f"🔍 Available fields in GET response: {list(job_details.keys()) if isinstance(job_details, dict) else 'Not a dict'}")
-            except Exception as e:
-                print(f"❌ Error during final verification: {e}")
-                import traceback
-                print(f"🔍 Full traceback: {traceback.format_exc()}")
-        
-        print(f"🚀 ======================================\n")
-
-        # 3) Add RAG notes and documents (to enrich description)
-        if job_id and (rag or links):
-            extras = []
-            if rag: extras.append(f"RAG: {rag}")
-            if links.get("docx"): extras.append(f"Doc: {links['docx']}")
-            if extras:
-                try:
-                    cur_desc = _safe_get(job_resp, "description") or problem or ""
-                    new_desc = (cur_desc + "\n\n" + "\n".join(extras)).strip()
-                    api_job_patch_description(job_id, new_desc)
-                except Exception:
-                    pass
-                
-                # Créer une note formatée pour la section notes
-                note_parts = ["🔍 AI-Generated Analysis & Resources:"]
-                if rag: 
-                    note_parts.append(f"📊 RAG Analysis: {rag}")
-                if links.get("docx"): 
-                    note_parts.append(f"📄 Document: {links['docx']}")
-                
-                # Ajouter des informations sur l'assignation du technicien
-                from datetime import datetime
-                current_hour = datetime.now().hour
-                if 8 <= current_hour < 17:
-                    note_parts.append("⏰ Assigned during business hours (8am-5pm) - Visible on dispatch grid")
-                else:
-                    note_parts.append("🌙 Assigned after hours - Will appear on next business day dispatch")
-                
-                api_job_add_note(job_id, "\n".join(note_parts))
+    # Dependency graph: oauth ∥ llm → tech_notes → job, then (verify ∥ describe ∥ note ∥ email)
+    def _job(r):
+        job_resp = api_job_create_strict(payload, r["tech_notes"])
+        job_id, job_number, job_api_url = _job_refs(job_resp)
+        log.info("Job created: id=%s number=%s url=%s", job_id, job_number, job_api_url)
+        return job_resp
 
-        # 3) Email HTML
-        to_email = _safe_get(payload, "email", "to")
-        ctx = {
-            "type": "job_created",
-            "brand": {"name": "BlueCollar AI"},
-            "job": {
-                "id": job_id,
-                "number": job_number,
-                "status": _safe_get(job_resp, "status"),
-                "priority": _safe_get(job_resp, "priority") or payload.get("priority"),
-                "category": _safe_get(job_resp, "category") or payload.get("category"),
-                "created_at": _safe_get(job_resp, "created_at"),
-                "api_url": job_api_url,
-                "description": problem or "(empty)",
-            },
-            "customer": {
-                "name": _norm(payload.get("customer_name")),
-                "contact": _safe_get(payload, "contact") or {},
-            },
-            "location": {
-                "name": _safe_get(payload, "service_location", "name") or "",
-                "address": _safe_get(payload, "service_location", "address") or "",
-            },
-            "links": {
-                "docx": links.get("docx"),
-                "json": links.get("json"),
-                "rag": rag,
-            },
-        }
-        html = _render_email(ctx)
-        email_ok = _send_html_email(
-            subject=f"[Work Order] {ctx['customer']['name']} — {category}/{priority}",
-            html=html,
-            to_email=to_email or getattr(settings, "WORKORDER_RECIPIENT", "")
-        )
-
-        return JsonResponse({
-            "ok": True,
-            "job_id": job_id,
-            "job_number": job_number,
-            "job_api_url": job_api_url,
-            "email_status": "sent" if email_ok else "unknown",
-            "links": links, "rag_url": rag,
-            "service_fusion": job_resp,
-        }, status=200)
+    p = Pipeline()
+    p.stage("oauth", lambda r: _get_oauth_token())
+    p.stage("llm", lambda r: call_llm(customer_name or "Client", f"{category}/{priority}", problem))
+    p.stage("tech_notes", lambda r: _prepare_tech_notes(r["llm"].get("links", {}), r["llm"].get("rag_url")), after=("llm",))
+    p.stage("job", _job, after=("oauth", "tech_notes"))
 
+    try:
+        r = p.run()
     except requests.HTTPError as he:
         return _json_error(he, "jobs", he.response)
     except Exception as e:
         return _json_error(e, "jobs")
 
+    # The agent only needs the job id: enrichment goes to the background queue (202).
+    data = _enrichment_data(payload, r, category, priority)
+    task_id = _schedule_enrichment(data)
+    if task_id:
+        return _job_response(data, p.timings, task_id=task_id)
+
+    e = _enrichment_pipeline(data)
+    e.run()
+    return _job_response(data, _merge_timings(p.timings, e.timings), email_ok=bool(e.results.get("email")))
+
+# ===================== Bulk intake (POST /sf/jobs/bulk) =====================
+def _exact_customer(items: list[dict], name: str) -> Optional[dict]:
+    key = name.lower()
+    return next((c for c in items if c.get("id") and _norm(c.get("customer_name")).lower() == key), None)
+
+def _resolve_customer(name: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Exact (case-insensitive) name match from the index, then from the cached
+    Service Fusion search; otherwise the customer is created with the item's
+    location. Called once per distinct name of a batch (bulk.Once).
+    """
+    found = _exact_customer(_index_search(name), name) or _exact_customer(
+        response_cache().get_or_fetch("customers_search", (_search_key(name),), lambda: _fetch_customers_search(name)), name)
+    if found:
+        return {"id": found["id"], "created": False}
+    cust = api_customer_create_minimal(name)
+    cust_id = _safe_get(cust, "id") or _safe_get(cust, "customer_id")
+    if not cust_id:
+        raise RuntimeError(f"Create customer failed for {name!r}")
+    loc = payload.get("service_location") or {}
+    if loc:
+        api_location_create_for_customer(cust_id, loc)
+    _index_customers([{"id": cust_id, "customer_name": name}])
+    log.info("Bulk intake: customer %r created (id=%s)", name, cust_id)
+    return {"id": cust_id, "created": True}
+
+def _bulk_job(payload: Dict[str, Any], customers: bulk.Once, digests: Dict[str, list], lock) -> Dict[str, Any]:
+    """
+    One item: customer (once per name) ∥ llm → tech_notes → job, then the
+    enrichment without its email; the email context joins its recipient's digest.
+    """
+    customer_name = _norm(payload.get("customer_name"))
+    if not customer_name:
+        raise ValueError("customer_name is required")
+    category = payload.get("category") or payload.get("category_ui") or ""
+    priority = payload.get("priority") or "Normal"
+    problem = payload.get("problem_details") or ""
+
+    p = Pipeline()
+    p.stage("customer", lambda r: customers.get(customer_name.lower(), lambda: _resolve_customer(customer_name, payload)))
+    p.stage("llm", lambda r: call_llm(customer_name, f"{category}/{priority}", problem))
+    p.stage("tech_notes", lambda r: _prepare_tech_notes(r["llm"].get("links", {}), r["llm"].get("rag_url")), after=("llm",))
+    p.stage("job", lambda r: api_job_create_strict(payload, r["tech_notes"]), after=("customer", "tech_notes"))
+    r = p.run()
+
+    data = _enrichment_data(payload, r, category, priority)
+    data["notify"] = False
+    task_id = _schedule_enrichment(data)
+    if not task_id:
+        _enrichment_pipeline(data).run()
+
+    recipient = (_safe_get(payload, "email", "to") or getattr(settings, "WORKORDER_RECIPIENT", "")).strip()
+    with lock:
+        digests.setdefault(recipient, []).append(_job_email_ctx(payload, data["job_resp"], data["links"], data["rag"]))
+    job_id, job_number, _ = _job_refs(data["job_resp"])
+    return {"job_id": job_id, "job_number": job_number, "customer_id": r["customer"]["id"], "task_id": task_id}
+
+def _send_digests(digests: Dict[str, list]) -> list[dict]:
+    """
+    One outbox message per recipient holding all of its work orders (not waited for).
+    """
+    from_email, from_headers = _resolve_from_addresses()
+    sent = []
+    for recipient, contexts in digests.items():
+        if not recipient:
+            log.warning("No recipient for %d bulk work order(s); skip email.", len(contexts))
+            continue
+        subject = f"[Work Orders] {len(contexts)} created" if len(contexts) > 1 else _job_email_subject(
+            contexts[0], contexts[0]["job"]["category"], contexts[0]["job"]["priority"])
+        try:
+            rec = get_outbox().send(subject, email_renderer().render_digest(contexts), [recipient], from_email, from_headers)
+            sent.append({"to": recipient, "jobs": len(contexts), "email_id": rec["id"],
+                         "status_url": reverse("sf_email_status", args=[rec["id"]])})
+        except Exception as e:
+            log.error("Bulk digest to %s failed: %s", recipient, e)
+            sent.append({"to": recipient, "jobs": len(contexts), "error": str(e)})
+    return sent
+
+def _bulk_items(request: HttpRequest) -> tuple[Optional[list], Optional[JsonResponse]]:
+    """
+    (items, None) or (None, error response); shared with the async view.
+    """
+    if request.method != "POST":
+        return None, JsonResponse({"error": "Method not allowed"}, status=405)
+    try:
+        items = bulk.parse(request.body, request.content_type or "")
+    except bulk.BatchTooLarge as e:
+        return None, JsonResponse({"error": f"Batch too large: {e}"}, status=413)
+    except ValueError:
+        return None, JsonResponse({"error": "Invalid JSON"}, status=400)
+    if not items:
+        return None, JsonResponse({"error": "No items"}, status=400)
+    return items, None
+
+def _bulk_lines(items: list) -> Iterator[bytes]:
+    customers = bulk.Once()
+    digests: Dict[str, list] = {}
+    lock = threading.Lock()
+
+    def _finish(results: list[dict]) -> Dict[str, Any]:
+        resolved = customers.results().values()
+        return {
+            "customers": {"resolved": len(resolved), "created": sum(1 for c in resolved if c["created"])},
+            "emails": _send_digests(digests),
+        }
+
+    return bulk.run(items, lambda payload: _bulk_job(payload, customers, digests, lock), _finish)
+
+@csrf_exempt
+def sf_create_jobs_bulk(request: HttpRequest):
+    """
+    Batch intake: a JSON array or NDJSON of /sf/jobs payloads; per-item results
+    stream back as NDJSON (fusion/bulk.py).
+    """
+    items, error = _bulk_items(request)
+    if error is not None:
+        return error
+    return bulk.response(_bulk_lines(items))
+
+def sf_stats(request: HttpRequest):
+    """
+    Runtime counters of the fusion layers (cache hit/miss...).
+    """
+    bucket, policy = get_limiter()
+    stats: Dict[str, Any] = {
+        "cache": response_cache().stats(),
+        "coalescing": _INFLIGHT_GETS.stats(),
+        "rate_limit": dict(bucket.stats() if bucket else {"rate": None}, retries=policy.retries),
+    }
+    if index_enabled():
+        stats["customer_index"] = customer_index().stats()
+    if llm_cache():
+        stats["llm_cache"] = llm_cache().stats()
+    stats["artifacts"] = artifact_store().stats()
+    stats["outbox"] = get_outbox().stats()
+    stats["pages"] = page_cache().stats()
+    stats["typeahead"] = typeahead.sessions().stats()
+    stats["idempotency"] = idempotency().stats()
+    return JsonResponse(stats)
+
+def healthz(request: HttpRequest):
+    """
+    Load balancer probe: circuit breaker states; 503 while a critical one is open.
+    """
+    h = health()
+    return JsonResponse(h, status=503 if h["status"] == "down" else 200)
+
+def metrics(request: HttpRequest):
+    """
+    Prometheus scrape endpoint (latency histograms / error counters, fusion/metrics.py).
+    """
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+def sf_task_status(request: HttpRequest, task_id: str):
+    """
+    Progress of a background task (e.g. the enrichment queued by /sf/jobs).
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    rec = get_queue().status(task_id)
+    if rec is None:
+        return JsonResponse({"error": "Unknown task", "task_id": task_id}, status=404)
+    return JsonResponse(rec)
+
+def sf_email_status(request: HttpRequest, email_id: str):
+    """
+    Delivery status of an outbox message (queued / sending / sent / failed).
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    rec = get_outbox().status(email_id)
+    if rec is None:
+        return JsonResponse({"error": "Unknown email", "email_id": email_id}, status=404)
+    return JsonResponse(rec)
+
 # ===================== Page HTML simple (form) =====================
 def fsm_wizard(request: HttpRequest):
     ctx = {
@@ -1009,18 +1296,17 @@ def fsm_wizard(request: HttpRequest):
     return render(request, "fsm_platform_server.html", ctx)
 
 def platform_server(request: HttpRequest):
-    return render(request, "fsm_platform_server.html")
+    return render_cached(request, "fsm_platform_server.html")
 
 def bluecollar_main_platform(request: HttpRequest):
-    return render(request, "bluecollar_main_platform.html")
+    return render_cached(request, page_template("bluecollar_main_platform.html"))
 
 # ===================== Debug =====================
 def sf_oauth_test(request: HttpRequest):
     try:
         tok = _get_oauth_token()
-        ping = requests.get(f"{API_BASE}/{API_VERSION}/customers",
-                            headers={"Authorization": f"Bearer {tok}", "Accept": "application/json"},
-                            timeout=_timeout())
+        ping = get_client().request("GET", _url("/customers"),
+                                    headers={"Authorization": f"Bearer {tok}", "Accept": "application/json"})
         return JsonResponse({"ok": True, "token_prefix": tok[:12] + "...", "ping_status": ping.status_code})
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)}, status=400)
\ No newline at end of file
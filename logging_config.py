@@ -1,43 +1,9 @@
-import logging
+"""
+Legacy entry point: the logging configuration now lives in fusion/log.py and is
+applied through settings.LOGGING (LOGGING_CONFIG = "fusion.log.configure").
+"""
 import os
 
-# Configuration des logs Django
-LOGGING = {
-    'version': 1,
-    'disable_existing_loggers': False,
-    'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
-            'style': '{',
-        },
-        'simple': {
-            'format': '{levelname} {message}',
-            'style': '{',
-        },
-    },
-    'handlers': {
-        'file': {
-            'level': 'DEBUG',
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(os.path.dirname(__file__), 'django_debug.log'),
-            'formatter': 'verbose',
-        },
-        'console': {
-            'level': 'DEBUG',
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple',
-        },
-    },
-    'loggers': {
-        'django': {
-            'handlers': ['file', 'console'],
-            'level': 'DEBUG',
-            'propagate': True,
-        },
-        'fusion.views': {
-            'handlers': ['file', 'console'],
-            'level': 'DEBUG',
-            'propagate': True,
-        },
-    },
-}
+from fusion.log import build_logging
+
+LOGGING = build_logging(os.getenv("LOG_LEVEL", "INFO"), os.path.join(os.path.dirname(__file__), "django_debug.log"))